@@ -1,83 +1,85 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.database import get_db
 from app.models import Workspace, Task, Notification
 from app.schemas.common import ResponseModel
+from app.utils.snapshot_cache import SnapshotCache
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
-@router.get("/overview", response_model=ResponseModel[dict])
-def get_dashboard_overview(
-    db: Session = Depends(get_db)
-):
-    """获取仪表盘概览数据"""
-    # 获取所有工作区
-    workspaces = db.query(Workspace).all()
+# 仪表盘快照：工作区、任务、通知有写入提交时失效
+_overview_cache = SnapshotCache(
+    settings.dashboard_cache_ttl_seconds,
+    tables=["workspaces", "tasks", "notifications"]
+)
 
-    workspace_summary = []
-    for workspace in workspaces:
-        pending_tasks = db.query(Task).filter(
-            Task.workspace_id == workspace.id,
-            Task.status == "pending"
-        ).count()
 
-        progress_tasks = db.query(Task).filter(
-            Task.workspace_id == workspace.id,
-            Task.status == "progress"
-        ).count()
+def _build_overview(db: Session) -> dict:
+    """生成仪表盘概览"""
+    # 所有工作区及各状态任务数（读取工作区上维护的计数）
+    rows = db.query(
+        Workspace.id,
+        Workspace.name,
+        Workspace.icon,
+        Workspace.icon_color,
+        Workspace.project_goal,
+        Workspace.pending_task_count,
+        Workspace.progress_task_count,
+        Workspace.completed_task_count,
+        Workspace.failed_task_count
+    ).order_by(Workspace.created_at).all()
 
-        completed_tasks = db.query(Task).filter(
-            Task.workspace_id == workspace.id,
-            Task.status == "completed"
-        ).count()
-
-        failed_tasks = db.query(Task).filter(
-            Task.workspace_id == workspace.id,
-            Task.status == "failed"
-        ).count()
-
-        workspace_summary.append({
-            "id": workspace.id,
-            "name": workspace.name,
-            "icon": workspace.icon,
-            "icon_color": workspace.icon_color,
-            "project_goal": workspace.project_goal,
-            "pending_tasks": pending_tasks,
-            "progress_tasks": progress_tasks,
-            "completed_tasks": completed_tasks,
-            "failed_tasks": failed_tasks
-        })
+    workspace_summary = [
+        {
+            "id": row[0],
+            "name": row[1],
+            "icon": row[2],
+            "icon_color": row[3],
+            "project_goal": row[4],
+            "pending_tasks": row[5],
+            "progress_tasks": row[6],
+            "completed_tasks": row[7],
+            "failed_tasks": row[8]
+        }
+        for row in rows
+    ]
 
-    # 获取最近活动（最近的通知）
-    recent_activities = db.query(Notification).order_by(
+    # 获取最近活动（最近的通知），关联查询所属工作区名称
+    recent_activities = db.query(Notification, Workspace.name).outerjoin(
+        Task, Task.id == Notification.related_task_id
+    ).outerjoin(
+        Workspace, Workspace.id == Task.workspace_id
+    ).order_by(
         Notification.created_at.desc()
     ).limit(10).all()
 
-    activities = []
-    for activity in recent_activities:
-        workspace_name = None
-        if activity.related_task_id:
-            task = db.query(Task).filter(Task.id == activity.related_task_id).first()
-            if task:
-                workspace = db.query(Workspace).filter(Workspace.id == task.workspace_id).first()
-                if workspace:
-                    workspace_name = workspace.name
-
-        activities.append({
+    activities = [
+        {
             "id": activity.id,
             "type": activity.type,
             "title": activity.title,
             "workspace_name": workspace_name,
             "status": "completed" if activity.type == "task-completion" else "failed",
             "created_at": activity.created_at
-        })
+        }
+        for activity, workspace_name in recent_activities
+    ]
+
+    return {
+        "workspace_summary": workspace_summary,
+        "recent_activities": activities
+    }
 
+
+@router.get("/overview", response_model=ResponseModel[dict])
+def get_dashboard_overview(
+    db: Session = Depends(get_db)
+):
+    """获取仪表盘概览数据（短时缓存，相关数据变更时立即刷新）"""
     return ResponseModel(
         code=200,
         message="获取成功",
-        data={
-            "workspace_summary": workspace_summary,
-            "recent_activities": activities
-        }
+        data=_overview_cache.get_or_build(lambda: _build_overview(db))
     )
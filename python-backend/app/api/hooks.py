@@ -0,0 +1,235 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime
+import uuid
+
+from app.database import get_db
+from app.models import HookConfig, HookDelivery, HookDestination, Task, Workspace
+from app.schemas.hook import (
+    HookConfigCreate,
+    HookConfigUpdate,
+    HookConfigResponse,
+    HookConfigListResponse,
+    HookDestinationResponse,
+    HookDestinationReset
+)
+from app.schemas.common import ResponseModel
+from app.services.hook_delivery import hook_dispatcher
+from app.services.hook_engine import parse_hook_target
+from app.services.hook_health import reset_destination
+
+router = APIRouter(prefix="/hooks", tags=["hooks"])
+
+
+def _validate_curl_command(curl_command: str):
+    try:
+        parse_hook_target(curl_command)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/workspaces/{workspace_id}", response_model=ResponseModel[HookConfigListResponse])
+def get_workspace_hooks(
+    workspace_id: str,
+    type: Optional[str] = Query(None, regex="^(start|stop)$"),
+    scope: Optional[str] = Query(None, regex="^(workspace|task)$", description="workspace: 工作区级，task: 任务级，不传返回全部"),
+    task_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """获取工作区的 hook 规则（工作区级规则对工作区内所有任务生效）"""
+    workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    if not workspace:
+        raise HTTPException(status_code=404, detail="工作区不存在")
+
+    query = db.query(HookConfig).filter(HookConfig.workspace_id == workspace_id)
+    if type:
+        query = query.filter(HookConfig.type == type)
+    if scope == "workspace":
+        query = query.filter(HookConfig.task_id.is_(None))
+    elif scope == "task":
+        query = query.filter(HookConfig.task_id.isnot(None))
+    if task_id:
+        query = query.filter(HookConfig.task_id == task_id)
+
+    hooks = query.order_by(HookConfig.created_at).all()
+
+    return ResponseModel(
+        code=200,
+        message="获取成功",
+        data={"hooks": [HookConfigResponse.model_validate(hook) for hook in hooks]}
+    )
+
+
+@router.post("/workspaces/{workspace_id}", response_model=ResponseModel[HookConfigResponse])
+def create_hook(
+    workspace_id: str,
+    hook: HookConfigCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    创建 hook 规则
+    不传 task_id 时为工作区级规则，对工作区内所有任务的执行生效
+    curl_command 可以是 URL 或 curl 命令（读取 -X、-H 和地址，请求体为 hook 内容）
+    """
+    workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    if not workspace:
+        raise HTTPException(status_code=404, detail="工作区不存在")
+    if hook.task_id:
+        task = db.query(Task).filter(Task.id == hook.task_id, Task.workspace_id == workspace_id).first()
+        if not task:
+            raise HTTPException(status_code=404, detail="任务不存在")
+    _validate_curl_command(hook.curl_command)
+
+    db_hook = HookConfig(
+        id=str(uuid.uuid4()),
+        workspace_id=workspace_id,
+        task_id=hook.task_id,
+        name=hook.name,
+        type=hook.type.value,
+        curl_command=hook.curl_command,
+        trigger_condition=hook.trigger_condition.value,
+        enabled=1 if hook.enabled else 0
+    )
+    db.add(db_hook)
+    db.commit()
+    db.refresh(db_hook)
+
+    return ResponseModel(
+        code=200,
+        message="创建成功",
+        data=HookConfigResponse.model_validate(db_hook)
+    )
+
+
+def _destination_response(row: HookDestination, pending: int) -> HookDestinationResponse:
+    response = HookDestinationResponse.model_validate(row)
+    total = (row.total_successes or 0) + (row.total_failures or 0)
+    response.success_rate = round(row.total_successes / total, 4) if total else None
+    response.pending_deliveries = pending
+    return response
+
+
+@router.get("/destinations", response_model=ResponseModel[List[HookDestinationResponse]])
+def get_hook_destinations(
+    state: Optional[str] = Query(None, regex="^(closed|open|half_open)$"),
+    db: Session = Depends(get_db)
+):
+    """获取 hook 接收地址的健康状况（成功率、平均耗时、熔断状态和等待中的投递数）"""
+    query = db.query(HookDestination)
+    if state:
+        query = query.filter(HookDestination.state == state)
+    rows = query.order_by(HookDestination.destination).all()
+
+    pending = dict(
+        db.query(HookDelivery.destination, func.count(HookDelivery.id))
+        .filter(HookDelivery.status.in_(("pending", "delivering")))
+        .group_by(HookDelivery.destination)
+        .all()
+    )
+
+    return ResponseModel(
+        code=200,
+        message="获取成功",
+        data=[_destination_response(row, pending.get(row.destination, 0)) for row in rows]
+    )
+
+
+@router.post("/destinations/reset", response_model=ResponseModel[HookDestinationResponse])
+def reset_hook_destination(
+    request: HookDestinationReset,
+    db: Session = Depends(get_db)
+):
+    """手动恢复熔断的接收地址，等待中的投递立即重新发送"""
+    row = reset_destination(db, request.destination)
+    if row is None:
+        raise HTTPException(status_code=404, detail="接收地址不存在")
+
+    # 熔断期间推迟的投递立即到期
+    db.query(HookDelivery).filter(
+        HookDelivery.destination == request.destination,
+        HookDelivery.status == "pending"
+    ).update({HookDelivery.next_attempt_at: datetime.now()}, synchronize_session=False)
+    db.commit()
+    hook_dispatcher.notify()
+
+    pending = db.query(func.count(HookDelivery.id)).filter(
+        HookDelivery.destination == request.destination,
+        HookDelivery.status.in_(("pending", "delivering"))
+    ).scalar()
+    return ResponseModel(
+        code=200,
+        message="接收地址已恢复",
+        data=_destination_response(row, pending)
+    )
+
+
+@router.get("/{hook_id}", response_model=ResponseModel[HookConfigResponse])
+def get_hook(
+    hook_id: str,
+    db: Session = Depends(get_db)
+):
+    """获取 hook 规则详情"""
+    db_hook = db.query(HookConfig).filter(HookConfig.id == hook_id).first()
+    if not db_hook:
+        raise HTTPException(status_code=404, detail="Hook 不存在")
+
+    return ResponseModel(
+        code=200,
+        message="获取成功",
+        data=HookConfigResponse.model_validate(db_hook)
+    )
+
+
+@router.put("/{hook_id}", response_model=ResponseModel[HookConfigResponse])
+def update_hook(
+    hook_id: str,
+    hook: HookConfigUpdate,
+    db: Session = Depends(get_db)
+):
+    """更新 hook 规则（修改后新开始的执行立即使用新规则）"""
+    db_hook = db.query(HookConfig).filter(HookConfig.id == hook_id).first()
+    if not db_hook:
+        raise HTTPException(status_code=404, detail="Hook 不存在")
+
+    update_data = hook.model_dump(exclude_unset=True)
+    if update_data.get("curl_command") is not None:
+        _validate_curl_command(update_data["curl_command"])
+    for key, value in update_data.items():
+        if value is None:
+            continue
+        if key == "enabled":
+            value = 1 if value else 0
+        elif hasattr(value, "value"):
+            value = value.value
+        setattr(db_hook, key, value)
+
+    db.commit()
+    db.refresh(db_hook)
+
+    return ResponseModel(
+        code=200,
+        message="更新成功",
+        data=HookConfigResponse.model_validate(db_hook)
+    )
+
+
+@router.delete("/{hook_id}", response_model=ResponseModel[dict])
+def delete_hook(
+    hook_id: str,
+    db: Session = Depends(get_db)
+):
+    """删除 hook 规则（已写入发件箱的投递仍会发送）"""
+    db_hook = db.query(HookConfig).filter(HookConfig.id == hook_id).first()
+    if not db_hook:
+        raise HTTPException(status_code=404, detail="Hook 不存在")
+
+    db.delete(db_hook)
+    db.commit()
+
+    return ResponseModel(
+        code=200,
+        message="删除成功",
+        data={}
+    )
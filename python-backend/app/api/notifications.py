@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import literal_column
 from typing import Optional
 import uuid
 
@@ -13,6 +14,8 @@ from app.schemas.notification import (
     UnreadCountResponse
 )
 from app.schemas.common import ResponseModel
+from app.services.search import fts_rowids
+from app.utils.pagination import paginate
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
@@ -23,9 +26,14 @@ def get_notifications(
     type: Optional[str] = Query(None, regex="^(task-completion|task-failure|system-alert)$"),
     is_read: Optional[bool] = None,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     db: Session = Depends(get_db)
 ):
-    """获取通知列表"""
+    """
+    获取通知列表
+    传入上一页返回的 cursor 时按游标翻页（忽略 page）；include_total=false 时不统计总数
+    """
     query = db.query(Notification)
 
     # 筛选
@@ -34,25 +42,31 @@ def get_notifications(
     if is_read is not None:
         query = query.filter(Notification.is_read == (1 if is_read else 0))
     if search:
-        query = query.filter(Notification.title.contains(search))
-
-    # 按创建时间倒序
-    query = query.order_by(Notification.created_at.desc())
-
-    total = query.count()
-    notifications = query.offset((page - 1) * page_size).limit(page_size).all()
+        # 优先使用全文索引，检索词过短时回退到模糊匹配
+        rowids = fts_rowids("notifications_fts", search, column="title")
+        if rowids is not None:
+            query = query.filter(literal_column("notifications.rowid").in_(rowids))
+        else:
+            query = query.filter(Notification.title.contains(search))
+
+    total = query.count() if include_total else None
+
+    # 按创建时间倒序，同时关联查询任务名称
+    notifications, next_cursor = paginate(
+        query.outerjoin(Task, Task.id == Notification.related_task_id).add_columns(Task.title),
+        [Notification.created_at, Notification.id],
+        descending=True,
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        sort_key="created_at:desc"
+    )
 
     # 计算未读数量
     unread_count = db.query(Notification).filter(Notification.is_read == 0).count()
 
     notification_responses = []
-    for notification in notifications:
-        task_name = None
-        if notification.related_task_id:
-            task = db.query(Task).filter(Task.id == notification.related_task_id).first()
-            if task:
-                task_name = task.title
-
+    for notification, task_name in notifications:
         notif_dict = {
             "id": notification.id,
             "type": notification.type,
@@ -74,7 +88,8 @@ def get_notifications(
             unread_count=unread_count,
             page=page,
             page_size=page_size,
-            notifications=notification_responses
+            notifications=notification_responses,
+            next_cursor=next_cursor
         )
     )
 
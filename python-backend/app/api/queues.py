@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from sqlalchemy import case, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 import uuid
 import json
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models import TaskQueue, QueueTask, Task
 from app.schemas.queue import (
     TaskQueueCreate,
@@ -14,13 +16,58 @@ from app.schemas.queue import (
     TaskQueueListResponse,
     QueueTaskResponse,
     AddTasksToQueueRequest,
+    ExecuteQueueRequest,
     QueueStatusEnum,
     TaskStatusEnum
 )
 from app.schemas.common import ResponseModel
+from app.services.queue_runner import prepare_queue_run, queue_runner
+from app.utils.pagination import paginate
 
 router = APIRouter(prefix="/queues", tags=["queues"])
 
+def _validate_dependencies(
+    task_ids: list[str],
+    dependencies: Optional[dict[str, list[str]]],
+    existing_dependencies: Optional[dict[str, list[str]]] = None
+) -> dict[str, list[str]]:
+    """校验任务依赖：依赖的任务必须在队列中，且不能形成环"""
+    existing_dependencies = existing_dependencies or {}
+    dependencies = dependencies or {}
+    known_ids = set(existing_dependencies.keys()) | set(task_ids)
+
+    for task_id, depends_on in dependencies.items():
+        if task_id not in task_ids:
+            raise HTTPException(status_code=400, detail=f"依赖声明中的任务 {task_id} 不在本次添加的任务中")
+        for dep_id in depends_on:
+            if dep_id not in known_ids:
+                raise HTTPException(status_code=400, detail=f"任务 {task_id} 依赖的任务 {dep_id} 不在队列中")
+            if dep_id == task_id:
+                raise HTTPException(status_code=400, detail=f"任务 {task_id} 不能依赖自身")
+
+    # 拓扑排序检查环
+    graph = {**existing_dependencies, **{task_id: dependencies.get(task_id, []) for task_id in task_ids}}
+    visiting, visited = set(), set()
+
+    def visit(node: str):
+        if node in visited:
+            return
+        if node in visiting:
+            raise HTTPException(status_code=400, detail="任务依赖存在循环")
+        visiting.add(node)
+        for dep in graph.get(node, []):
+            visit(dep)
+        visiting.remove(node)
+        visited.add(node)
+
+    for node in graph:
+        visit(node)
+
+    return {task_id: list(dict.fromkeys(dependencies.get(task_id, []))) for task_id in task_ids}
+
+def _load_depends_on(queue_task: QueueTask) -> list[str]:
+    return json.loads(queue_task.depends_on) if queue_task.depends_on else []
+
 # 创建队列
 @router.post("/workspaces/{workspace_id}", response_model=ResponseModel[TaskQueueResponse])
 def create_queue(
@@ -38,13 +85,17 @@ def create_queue(
     if len(tasks) != len(queue_data.task_ids):
         raise HTTPException(status_code=400, detail="部分任务不存在或不属于该工作区")
 
+    dependencies = _validate_dependencies(queue_data.task_ids, queue_data.dependencies)
+
     # 创建队列
     queue_id = str(uuid.uuid4())
     new_queue = TaskQueue(
         id=queue_id,
         workspace_id=workspace_id,
         name=queue_data.name,
-        status=QueueStatusEnum.pending.value
+        status=QueueStatusEnum.pending.value,
+        max_parallelism=queue_data.max_parallelism,
+        failure_policy=queue_data.failure_policy.value
     )
     db.add(new_queue)
 
@@ -55,7 +106,8 @@ def create_queue(
             queue_id=queue_id,
             task_id=task_id,
             order_index=index,
-            status=TaskStatusEnum.pending.value
+            status=TaskStatusEnum.pending.value,
+            depends_on=json.dumps(dependencies[task_id]) if dependencies[task_id] else None
         )
         db.add(queue_task)
 
@@ -73,6 +125,8 @@ def create_queue(
             id=new_queue.id,
             name=new_queue.name,
             status=new_queue.status,
+            max_parallelism=new_queue.max_parallelism,
+            failure_policy=new_queue.failure_policy,
             progress=0,
             total_tasks=total_tasks,
             completed_tasks=completed_tasks,
@@ -88,31 +142,55 @@ def get_queues(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     db: Session = Depends(get_db)
 ):
-    """获取工作区的队列列表"""
+    """
+    获取工作区的队列列表
+    传入上一页返回的 cursor 时按游标翻页（忽略 page）；include_total=false 时不统计总数
+    """
     query = db.query(TaskQueue).filter(TaskQueue.workspace_id == workspace_id)
 
     if status:
         query = query.filter(TaskQueue.status == status)
 
-    query = query.order_by(TaskQueue.created_at.desc())
+    total = query.count() if include_total else None
 
-    total = query.count()
-    queues = query.offset((page - 1) * page_size).limit(page_size).all()
+    queues, next_cursor = paginate(
+        query,
+        [TaskQueue.created_at, TaskQueue.id],
+        descending=True,
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        sort_key="created_at:desc"
+    )
 
-    # 构建响应数据，计算每个队列的统计信息
+    # 用一次 GROUP BY 统计当前页所有队列的任务数，避免逐个队列查询
+    stats = {
+        queue_id: (total_tasks, completed_tasks or 0)
+        for queue_id, total_tasks, completed_tasks in db.query(
+            QueueTask.queue_id,
+            func.count(QueueTask.id),
+            func.sum(case((QueueTask.status == TaskStatusEnum.completed.value, 1), else_=0))
+        ).filter(
+            QueueTask.queue_id.in_([queue.id for queue in queues])
+        ).group_by(QueueTask.queue_id).all()
+    } if queues else {}
+
+    # 构建响应数据
     queue_responses = []
     for queue in queues:
-        queue_tasks = db.query(QueueTask).filter(QueueTask.queue_id == queue.id).all()
-        total_tasks = len(queue_tasks)
-        completed_tasks = sum(1 for qt in queue_tasks if qt.status == TaskStatusEnum.completed.value)
+        total_tasks, completed_tasks = stats.get(queue.id, (0, 0))
         progress = int((completed_tasks / total_tasks * 100)) if total_tasks > 0 else 0
 
         queue_responses.append(TaskQueueResponse(
             id=queue.id,
             name=queue.name,
             status=queue.status,
+            max_parallelism=queue.max_parallelism,
+            failure_policy=queue.failure_policy,
             progress=progress,
             total_tasks=total_tasks,
             completed_tasks=completed_tasks,
@@ -127,7 +205,8 @@ def get_queues(
             total=total,
             page=page,
             page_size=page_size,
-            queues=queue_responses
+            queues=queue_responses,
+            next_cursor=next_cursor
         )
     )
 
@@ -142,28 +221,30 @@ def get_queue_detail(
     if not queue:
         raise HTTPException(status_code=404, detail="队列不存在")
 
-    # 获取队列中的任务
-    queue_tasks = db.query(QueueTask).filter(
+    # 获取队列中的任务，同时关联查询任务标题
+    queue_tasks = db.query(QueueTask, Task.title).outerjoin(
+        Task, Task.id == QueueTask.task_id
+    ).filter(
         QueueTask.queue_id == queue_id
     ).order_by(QueueTask.order_index).all()
 
-    # 构建任务列表响应
+    # 构建任务列表响应（跳过任务已被删除的队列任务）
     tasks_response = []
-    for qt in queue_tasks:
-        task = db.query(Task).filter(Task.id == qt.task_id).first()
-        if task:
+    for qt, title in queue_tasks:
+        if title is not None:
             tasks_response.append(QueueTaskResponse(
                 id=qt.id,
                 task_id=qt.task_id,
                 order_index=qt.order_index,
-                name=task.title,
+                name=title,
                 status=qt.status,
-                error_reason=qt.error_reason
+                error_reason=qt.error_reason,
+                depends_on=_load_depends_on(qt)
             ))
 
     # 计算统计数据
     total_tasks = len(queue_tasks)
-    completed_tasks = sum(1 for qt in queue_tasks if qt.status == TaskStatusEnum.completed.value)
+    completed_tasks = sum(1 for qt, _ in queue_tasks if qt.status == TaskStatusEnum.completed.value)
     progress = int((completed_tasks / total_tasks * 100)) if total_tasks > 0 else 0
 
     return ResponseModel(
@@ -173,6 +254,8 @@ def get_queue_detail(
             id=queue.id,
             name=queue.name,
             status=queue.status,
+            max_parallelism=queue.max_parallelism,
+            failure_policy=queue.failure_policy,
             progress=progress,
             total_tasks=total_tasks,
             completed_tasks=completed_tasks,
@@ -186,133 +269,44 @@ def get_queue_detail(
 @router.post("/{queue_id}/execute", response_model=ResponseModel[dict])
 async def execute_queue(
     queue_id: str,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    request: Optional[ExecuteQueueRequest] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """执行队列中的任务（依次调用dispatch接口）"""
-    queue = db.query(TaskQueue).filter(TaskQueue.id == queue_id).first()
+    """
+    执行队列中的任务（按依赖关系调度，无依赖的任务在并行度上限内同时执行）
+    默认恢复执行：跳过已完成的任务，从失败 / 中断的任务继续；mode=restart 时从头执行全部任务
+    """
+    queue = await db.get(TaskQueue, queue_id)
     if not queue:
         raise HTTPException(status_code=404, detail="队列不存在")
 
-    if queue.status == QueueStatusEnum.running.value:
+    # 执行进程已退出（租约过期）的 running 队列可以重新执行
+    lease_alive = queue.lease_expires_at is not None and queue.lease_expires_at >= datetime.now()
+    if (queue.status == QueueStatusEnum.running.value and lease_alive) or queue_runner.is_running(queue_id):
         raise HTTPException(status_code=400, detail="队列正在执行中")
 
-    # 更新队列状态为运行中
-    queue.status = QueueStatusEnum.running.value
-    db.commit()
+    mode = (request or ExecuteQueueRequest()).mode.value
 
-    # 获取队列中的所有任务，按顺序排列
-    queue_tasks = db.query(QueueTask).filter(
-        QueueTask.queue_id == queue_id
-    ).order_by(QueueTask.order_index).all()
+    # 重置需要执行的队列任务，并更新队列状态为运行中
+    run_stats = await db.run_sync(prepare_queue_run, queue_id, mode)
+    queue.status = QueueStatusEnum.running.value
+    queue_runner.take_ownership(queue)
+    await db.commit()
 
-    # 添加后台任务执行队列（不传递db session）
-    background_tasks.add_task(execute_queue_tasks, queue_id)
+    # 在后台执行队列（不传递db session）
+    queue_runner.start(queue_id)
 
     return ResponseModel(
         code=200,
-        message="队列开始执行",
+        message="队列开始执行" if mode == "restart" or not run_stats["skipped_tasks"] else "队列恢复执行",
         data={
             "queue_id": queue_id,
-            "total_tasks": len(queue_tasks),
+            "mode": mode,
+            **run_stats,
             "status": "running"
         }
     )
 
-# 后台执行队列任务的函数
-def execute_queue_tasks(queue_id: str):
-    """后台执行队列中的任务"""
-    from app.database import SessionLocal
-    import httpx
-    import time
-
-    # 创建新的数据库会话
-    db = SessionLocal()
-
-    try:
-        success_count = 0
-        failed_count = 0
-
-        # 获取队列中的所有任务
-        queue_tasks = db.query(QueueTask).filter(
-            QueueTask.queue_id == queue_id
-        ).order_by(QueueTask.order_index).all()
-
-        for queue_task in queue_tasks:
-            # 更新任务状态为运行中
-            queue_task.status = TaskStatusEnum.progress.value
-            db.commit()
-
-            try:
-                # 获取任务信息
-                task = db.query(Task).filter(Task.id == queue_task.task_id).first()
-                if task:
-                    # 调用dispatch接口执行任务
-                    with httpx.Client(timeout=30.0) as client:
-                        response = client.post(
-                            f"http://localhost:10101/api/tasks/{task.id}/dispatch",
-                            json={"execution_params": {}}
-                        )
-
-                        if response.status_code == 200:
-                            # Dispatch成功，等待任务完成
-                            # 轮询任务状态直到完成或失败
-                            max_wait_time = 600  # 最多等待10分钟
-                            start_time = time.time()
-
-                            while time.time() - start_time < max_wait_time:
-                                # 刷新任务状态
-                                db.refresh(task)
-
-                                if task.status == "completed":
-                                    queue_task.status = TaskStatusEnum.completed.value
-                                    success_count += 1
-                                    break
-                                elif task.status == "failed":
-                                    queue_task.status = TaskStatusEnum.failed.value
-                                    queue_task.error_reason = task.error_message or "任务执行失败"
-                                    failed_count += 1
-                                    break
-                                elif task.status == "progress":
-                                    # 仍在执行中，等待3秒后再检查
-                                    time.sleep(3)
-                                else:
-                                    # 未知状态
-                                    time.sleep(3)
-                            else:
-                                # 超时
-                                queue_task.status = TaskStatusEnum.failed.value
-                                queue_task.error_reason = "任务执行超时"
-                                failed_count += 1
-                        else:
-                            queue_task.status = TaskStatusEnum.failed.value
-                            queue_task.error_reason = f"Dispatch失败: {response.text}"
-                            failed_count += 1
-                else:
-                    queue_task.status = TaskStatusEnum.failed.value
-                    queue_task.error_reason = "任务不存在"
-                    failed_count += 1
-            except Exception as e:
-                queue_task.status = TaskStatusEnum.failed.value
-                queue_task.error_reason = str(e)
-                failed_count += 1
-
-            db.commit()
-
-        # 更新队列状态
-        queue = db.query(TaskQueue).filter(TaskQueue.id == queue_id).first()
-        if queue:
-            if failed_count == 0:
-                queue.status = QueueStatusEnum.completed.value
-            elif success_count == 0:
-                queue.status = QueueStatusEnum.failed.value
-            else:
-                queue.status = QueueStatusEnum.completed.value  # 部分成功也标记为完成
-            db.commit()
-    finally:
-        # 关闭数据库会话
-        db.close()
-
 # 向队列添加任务
 @router.post("/{queue_id}/tasks", response_model=ResponseModel[dict])
 def add_tasks_to_queue(
@@ -325,10 +319,11 @@ def add_tasks_to_queue(
     if not queue:
         raise HTTPException(status_code=404, detail="队列不存在")
 
-    # 获取当前队列中的最大order_index
-    max_order = db.query(QueueTask).filter(
+    # 获取当前队列中的任务及最大order_index
+    existing_queue_tasks = db.query(QueueTask).filter(
         QueueTask.queue_id == queue_id
-    ).count()
+    ).all()
+    max_order = len(existing_queue_tasks)
 
     # 验证任务是否存在
     tasks = db.query(Task).filter(
@@ -339,6 +334,12 @@ def add_tasks_to_queue(
     if len(tasks) != len(request.task_ids):
         raise HTTPException(status_code=400, detail="部分任务不存在或不属于该工作区")
 
+    dependencies = _validate_dependencies(
+        request.task_ids,
+        request.dependencies,
+        {qt.task_id: _load_depends_on(qt) for qt in existing_queue_tasks}
+    )
+
     # 添加任务到队列
     for index, task_id in enumerate(request.task_ids):
         queue_task = QueueTask(
@@ -346,7 +347,8 @@ def add_tasks_to_queue(
             queue_id=queue_id,
             task_id=task_id,
             order_index=max_order + index,
-            status=TaskStatusEnum.pending.value
+            status=TaskStatusEnum.pending.value,
+            depends_on=json.dumps(dependencies[task_id]) if dependencies[task_id] else None
         )
         db.add(queue_task)
 
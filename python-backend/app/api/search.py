@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.models import Task, Notification
+from app.schemas.search import SearchResponse, RebuildSearchIndexRequest
+from app.schemas.common import ResponseModel
+from app.services import search as search_service
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+SEARCH_SCOPES = ("tasks", "notifications", "logs")
+
+@router.get("", response_model=ResponseModel[SearchResponse])
+def search(
+    q: str = Query(..., min_length=1),
+    scope: Optional[str] = Query(None, description="逗号分隔：tasks,notifications,logs，默认全部"),
+    workspace_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """全文搜索任务、通知和执行日志，按相关度排序并返回命中片段"""
+    scopes = [s.strip() for s in scope.split(",") if s.strip()] if scope else list(SEARCH_SCOPES)
+    unknown = [s for s in scopes if s not in SEARCH_SCOPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的搜索范围: {', '.join(unknown)}")
+
+    match = search_service.build_match_query(q) if search_service.search_available else None
+    tasks, notifications, execution_logs = [], [], []
+
+    if match is not None:
+        if "tasks" in scopes:
+            tasks = search_service.search_tasks(db, match, workspace_id, limit)
+        if "notifications" in scopes:
+            notifications = search_service.search_notifications(db, match, workspace_id, limit)
+        if "logs" in scopes:
+            execution_logs = search_service.search_execution_logs(db, match, workspace_id, limit)
+    else:
+        # 检索词过短或不支持 FTS5 时退化为标题模糊匹配（不搜索执行日志）
+        if "tasks" in scopes:
+            query = db.query(Task).filter(Task.title.contains(q))
+            if workspace_id:
+                query = query.filter(Task.workspace_id == workspace_id)
+            tasks = [
+                {
+                    "id": task.id,
+                    "workspace_id": task.workspace_id,
+                    "title": task.title,
+                    "status": task.status,
+                    "priority": task.priority,
+                    "created_at": task.created_at
+                }
+                for task in query.order_by(Task.created_at.desc()).limit(limit).all()
+            ]
+        if "notifications" in scopes:
+            query = db.query(Notification).filter(Notification.title.contains(q))
+            if workspace_id:
+                query = query.join(Task, Task.id == Notification.related_task_id).filter(Task.workspace_id == workspace_id)
+            notifications = [
+                {
+                    "id": notification.id,
+                    "type": notification.type,
+                    "title": notification.title,
+                    "related_task_id": notification.related_task_id,
+                    "is_read": bool(notification.is_read),
+                    "created_at": notification.created_at
+                }
+                for notification in query.order_by(Notification.created_at.desc()).limit(limit).all()
+            ]
+
+    return ResponseModel(
+        code=200,
+        message="搜索成功",
+        data=SearchResponse(
+            query=q,
+            fulltext=match is not None,
+            tasks=tasks,
+            notifications=notifications,
+            execution_logs=execution_logs
+        )
+    )
+
+@router.post("/rebuild", response_model=ResponseModel[dict])
+def rebuild_search_index(
+    request: Optional[RebuildSearchIndexRequest] = None,
+    db: Session = Depends(get_db)
+):
+    """从源表重建全文索引，不指定 indexes 时重建全部"""
+    if not search_service.search_available:
+        raise HTTPException(status_code=503, detail="当前 SQLite 不支持 FTS5，全文搜索不可用")
+
+    try:
+        rebuilt = search_service.rebuild_search_index(db, request.indexes if request else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return ResponseModel(
+        code=200,
+        message="索引重建完成",
+        data={"indexes": rebuilt}
+    )
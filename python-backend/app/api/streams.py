@@ -0,0 +1,111 @@
+"""
+多路消息流
+一个 SSE 连接同时订阅多个任务或整个工作区的执行消息，每条消息带有所属任务；
+连接建立后推送的第一条消息包含 connection_id，之后通过 PUT /streams/{connection_id} 随时修改订阅范围，无需重新连接。
+多进程部署时 PUT 请求可能到达其它进程，由消息代理转发给持有连接的进程；变更生效后连接上推送 subscription_updated 消息。
+"""
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.schemas.common import ResponseModel
+from app.schemas.stream import StreamSubscriptionUpdate, StreamSubscription
+from app.utils.message_stream import message_stream_manager, format_event_id, STREAM_OVERFLOW, SUBSCRIPTION_UPDATED
+
+router = APIRouter(prefix="/streams", tags=["streams"])
+
+
+def _split_ids(value: Optional[str]) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+
+def _subscription(subscriber) -> StreamSubscription:
+    return StreamSubscription(
+        connection_id=subscriber.connection_id,
+        task_ids=sorted(subscriber.task_ids),
+        workspace_ids=sorted(subscriber.workspace_ids)
+    )
+
+
+def _sse_data(payload: dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@router.get("")
+async def multiplexed_stream(
+    task_ids: Optional[str] = Query(None, description="逗号分隔的任务 ID"),
+    workspace_ids: Optional[str] = Query(None, description="逗号分隔的工作区 ID，订阅其中所有任务")
+):
+    """
+    多路实时消息流 (SSE)
+    每条消息为 {"task_id", "event_id", "message"}；订阅时每个执行中的任务先推送一条最新消息作为当前状态。
+    任务结束不会关闭连接，断线后重新连接即可（不补发断开期间的消息，需要完整消息时使用单任务消息流或执行日志）
+    """
+    subscriber = message_stream_manager.open_connection(_split_ids(task_ids), _split_ids(workspace_ids))
+
+    async def event_generator():
+        try:
+            yield _sse_data({"type": "stream_connected", **_subscription(subscriber).model_dump()})
+            while True:
+                try:
+                    task_id, event_id, message = await asyncio.wait_for(subscriber.get(), timeout=30.0)
+                except asyncio.TimeoutError:
+                    yield f": heartbeat\n\n"
+                    continue
+
+                # 消费过慢被断开（disconnect 策略），由客户端重新连接
+                if message.get("type") == STREAM_OVERFLOW:
+                    yield _sse_data(message)
+                    break
+                if message.get("type") == SUBSCRIPTION_UPDATED:
+                    yield _sse_data(message)
+                    continue
+                yield _sse_data({
+                    "task_id": task_id,
+                    "event_id": format_event_id(event_id) if event_id is not None else None,
+                    "message": message
+                })
+        except asyncio.CancelledError:
+            pass
+        finally:
+            message_stream_manager.close_connection(subscriber.connection_id)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.put("/{connection_id}", response_model=ResponseModel[StreamSubscription])
+async def update_stream_subscription(connection_id: str, subscription: StreamSubscriptionUpdate):
+    """
+    替换多路连接订阅的任务和工作区
+    在事件循环中执行：订阅表和订阅者队列只在事件循环中修改，变更后推送的消息能立即唤醒连接
+    连接不在当前进程时经消息代理转发给持有连接的进程（forwarded=true）；单进程部署（memory 代理）时返回 404
+    """
+    subscriber = message_stream_manager.update_connection(
+        connection_id, subscription.task_ids, subscription.workspace_ids
+    )
+    if subscriber is not None:
+        return ResponseModel(data=_subscription(subscriber))
+    if not message_stream_manager.forward_subscription(
+        connection_id, subscription.task_ids, subscription.workspace_ids
+    ):
+        raise HTTPException(status_code=404, detail="流连接不存在或已断开")
+    return ResponseModel(
+        message="订阅变更已转发给持有连接的进程",
+        data=StreamSubscription(
+            connection_id=connection_id,
+            task_ids=sorted(set(subscription.task_ids)),
+            workspace_ids=sorted(set(subscription.workspace_ids)),
+            forwarded=True
+        )
+    )
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Header
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import func, literal_column, select
 from typing import Optional
 from datetime import datetime
 import uuid
@@ -9,8 +10,8 @@ import asyncio
 import os
 import json
 
-from app.database import get_db
-from app.models import Task, Workspace, TaskExecutionLog
+from app.database import get_db, get_async_db, AsyncSessionLocal
+from app.models import Task, Workspace, TaskExecutionLog, ExecutionJob, HookDelivery
 from app.schemas.task import (
     TaskCreate,
     TaskUpdate,
@@ -21,271 +22,25 @@ from app.schemas.task import (
 )
 from app.schemas.task_execution_log import (
     TaskExecutionLogCreate,
+    TaskExecutionLogSummary,
     TaskExecutionLog as TaskExecutionLogSchema
 )
+from app.schemas.hook import HookDeliveryResponse
 from app.schemas.common import ResponseModel
 from app.config import settings
+from app.services.executor import agent_executor, ExecutionAlreadyActiveError, ExecutorBacklogFullError
+from app.services.job_queue import enqueue_task_execution, get_active_job, get_queue_position, cancel_task_execution
+from app.services.task_counters import COUNTER_COLUMNS
+from app.services.db_writer import db_writer
+from app.services.hook_delivery import hook_dispatcher
+from app.services.search import fts_rowids
+from app.services.execution_log_store import create_execution_log, append_messages, load_messages, load_stream_events
+from app.utils.message_stream import message_stream_manager, STREAM_OVERFLOW, EventId, format_event_id, parse_event_id
+from app.utils.pagination import paginate
 
 router = APIRouter(tags=["tasks"])
 
-async def execute_claude_agent_task_async(task_id: str, workspace_path: str, task_description: str):
-    """
-    使用 Claude Agent SDK 异步执行任务，支持 hooks 回调和实时消息流
-    """
-    from app.database import SessionLocal
-    from claude_agent_sdk import query, ClaudeAgentOptions, ResultMessage, SystemMessage, AssistantMessage, UserMessage
-    from app.utils.message_stream import message_stream_manager
-    import logging
-    import httpx
-
-    logger = logging.getLogger(__name__)
-    db = SessionLocal()
-
-    try:
-        # 检查 API Key
-        if not settings.anthropic_api_key:
-            raise ValueError("ANTHROPIC_API_KEY 未配置，请在 .env 文件中设置")
-
-        # 设置环境变量
-        os.environ["ANTHROPIC_API_KEY"] = settings.anthropic_api_key
-
-        # 获取任务信息（包括 hooks）
-        task = db.query(Task).filter(Task.id == task_id).first()
-        if not task:
-            logger.error(f"任务 {task_id} 不存在")
-            return
-
-        start_hook_url = task.start_hook_curl
-        stop_hook_url = task.stop_hook_curl
-
-        # 执行开始 hook
-        if start_hook_url:
-            try:
-                logger.info(f"执行开始 hook: {start_hook_url}")
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    response = await client.post(
-                        start_hook_url,
-                        json={
-                            "task_id": task_id,
-                            "execution_id": task.execution_id,
-                            "status": "started",
-                            "workspace_path": workspace_path
-                        }
-                    )
-                    logger.info(f"开始 hook 响应: {response.status_code}")
-            except Exception as e:
-                logger.warning(f"开始 hook 执行失败: {str(e)}")
-
-        # 配置 Agent 选项
-        options = ClaudeAgentOptions(
-            allowed_tools=["Read", "Write", "Edit", "Bash"],
-            permission_mode='acceptEdits',  # 自动接受编辑
-            cwd=workspace_path  # 设置工作目录
-        )
-
-        logger.info(f"开始执行任务 {task_id}: {task_description}")
-        logger.info(f"工作目录: {workspace_path}")
-
-        # 推送初始消息
-        await message_stream_manager.add_message(task_id, {
-            "type": "init",
-            "message": f"任务开始执行: {task_description}",
-            "workspace": workspace_path
-        })
-
-        # 收集输出和状态
-        output_lines = []
-        all_messages = []  # 收集所有消息用于保存到执行日志
-        task_status = "completed"
-        error_message = None
-        is_task_started = False
-        message_count = 0
-        progress = 0
-
-        # 使用 Claude Agent SDK 执行任务
-        async for message in query(
-            prompt=task_description,
-            options=options
-        ):
-            # 记录消息
-            output_lines.append(str(message))
-            logger.info(f"Agent 消息类型: {type(message).__name__}")
-            message_count += 1
-
-            # 构建推送消息
-            stream_message = {
-                "type": type(message).__name__,
-                "raw": str(message)[:500]  # 限制长度
-            }
-
-            # 根据消息类型添加额外信息并计算进度
-            if isinstance(message, SystemMessage):
-                if hasattr(message, 'subtype'):
-                    stream_message["subtype"] = message.subtype
-                    if message.subtype == 'init':
-                        is_task_started = True
-                        stream_message["message"] = "Claude Agent 已初始化"
-                        progress = 10
-                        stream_message["progress"] = progress
-
-            elif isinstance(message, AssistantMessage):
-                # 提取文本内容
-                texts = []
-                for block in message.content:
-                    if hasattr(block, 'text'):
-                        texts.append(block.text)
-                if texts:
-                    stream_message["text"] = "\n".join(texts)
-                # 根据消息数量动态增加进度（10% - 90%之间）
-                progress = min(10 + (message_count * 8), 90)
-                stream_message["progress"] = progress
-
-            elif isinstance(message, ResultMessage):
-                stream_message["is_error"] = message.is_error
-                stream_message["duration_ms"] = getattr(message, 'duration_ms', 0)
-                stream_message["cost_usd"] = getattr(message, 'total_cost_usd', 0)
-
-                # 判断任务状态
-                if message.is_error:
-                    task_status = "failed"
-                    error_message = getattr(message, 'result', '执行失败')
-                    stream_message["message"] = f"任务执行失败: {error_message}"
-                    logger.error(f"任务 {task_id} 执行失败: {error_message}")
-                    progress = 100
-                    stream_message["progress"] = progress
-                else:
-                    task_status = "completed"
-                    stream_message["message"] = "任务执行成功"
-                    logger.info(f"任务 {task_id} 执行成功")
-                    progress = 100
-                    stream_message["progress"] = progress
-
-                # 执行结束 hook
-                if stop_hook_url:
-                    try:
-                        logger.info(f"执行结束 hook: {stop_hook_url}")
-                        async with httpx.AsyncClient(timeout=10.0) as client:
-                            response = await client.post(
-                                stop_hook_url,
-                                json={
-                                    "task_id": task_id,
-                                    "execution_id": task.execution_id,
-                                    "status": task_status,
-                                    "is_error": message.is_error,
-                                    "duration_ms": getattr(message, 'duration_ms', 0),
-                                    "total_cost_usd": getattr(message, 'total_cost_usd', 0),
-                                    "error_message": error_message
-                                }
-                            )
-                            logger.info(f"结束 hook 响应: {response.status_code}")
-                    except Exception as e:
-                        logger.warning(f"结束 hook 执行失败: {str(e)}")
-
-            # 推送消息到流
-            await message_stream_manager.add_message(task_id, stream_message)
-            # 收集消息用于保存到执行日志
-            all_messages.append(stream_message)
-
-        # 合并输出
-        full_output = "\n".join(output_lines)
-
-        # 更新任务状态
-        task = db.query(Task).filter(Task.id == task_id).first()
-        if task:
-            task.status = task_status
-            task.execution_output = full_output[:5000] if full_output else None
-            task.error_message = error_message
-            db.commit()
-            logger.info(f"任务 {task_id} 最终状态: {task_status}")
-
-    except ValueError as e:
-        # API Key 未配置
-        logger.error(f"任务 {task_id} 配置错误: {str(e)}")
-        task = db.query(Task).filter(Task.id == task_id).first()
-        if task:
-            task.status = "failed"
-            task.error_message = str(e)
-            db.commit()
-
-        # 执行结束 hook（失败）
-        if task and task.stop_hook_curl:
-            try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    await client.post(
-                        task.stop_hook_curl,
-                        json={
-                            "task_id": task_id,
-                            "execution_id": task.execution_id,
-                            "status": "failed",
-                            "is_error": True,
-                            "error_message": str(e)
-                        }
-                    )
-            except Exception as hook_error:
-                logger.warning(f"结束 hook 执行失败: {str(hook_error)}")
-
-    except Exception as e:
-        # 其他错误
-        logger.error(f"任务 {task_id} 执行异常: {str(e)}", exc_info=True)
-        task = db.query(Task).filter(Task.id == task_id).first()
-        if task:
-            task.status = "failed"
-            task.error_message = f"执行异常: {str(e)}"
-            db.commit()
-
-        # 执行结束 hook（失败）
-        if task and task.stop_hook_curl:
-            try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    await client.post(
-                        task.stop_hook_curl,
-                        json={
-                            "task_id": task_id,
-                            "execution_id": task.execution_id,
-                            "status": "failed",
-                            "is_error": True,
-                            "error_message": str(e)
-                        }
-                    )
-            except Exception as hook_error:
-                logger.warning(f"结束 hook 执行失败: {str(hook_error)}")
-
-    finally:
-        # 保存执行日志到数据库
-        try:
-            task = db.query(Task).filter(Task.id == task_id).first()
-            if task and len(all_messages) > 0:
-                # 获取该任务的最大执行次数
-                max_execution = db.query(TaskExecutionLog).filter(
-                    TaskExecutionLog.task_id == task_id
-                ).order_by(TaskExecutionLog.execution_number.desc()).first()
-
-                execution_number = (max_execution.execution_number + 1) if max_execution else 1
-
-                # 序列化所有消息
-                messages_json = json.dumps(all_messages, ensure_ascii=False)
-
-                # 创建执行日志记录
-                execution_log = TaskExecutionLog(
-                    id=str(uuid.uuid4()),
-                    task_id=task_id,
-                    execution_number=execution_number,
-                    response_type=task_status,  # 使用任务最终状态作为response_type
-                    response_content=messages_json,
-                    status='completed'
-                )
-
-                db.add(execution_log)
-                db.commit()
-                logger.info(f"任务 {task_id} 执行日志已保存 (第 {execution_number} 次执行)")
-        except Exception as log_error:
-            logger.error(f"保存执行日志失败: {str(log_error)}")
-        finally:
-            db.close()
-            logger.info(f"任务 {task_id} 执行流程结束")
-
-
-# execute_claude_code_task 已废弃，现在直接使用 asyncio.create_task 调用 execute_claude_agent_task_async
+# execute_claude_code_task 已废弃，任务通过 execution_jobs 持久化队列由 JobWorker 调用 execute_claude_agent_task_async
 
 @router.get("/workspaces/{workspace_id}/tasks", response_model=ResponseModel[TaskListResponse])
 def get_tasks(
@@ -298,9 +53,14 @@ def get_tasks(
     source: Optional[str] = Query(None, regex="^(api|manual)$"),
     sort_by: Optional[str] = Query("created_at", regex="^(title|priority|status|created_at)$"),
     sort_order: Optional[str] = Query("desc", regex="^(asc|desc)$"),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     db: Session = Depends(get_db)
 ):
-    """获取任务列表"""
+    """
+    获取任务列表
+    传入上一页返回的 cursor 时按游标翻页（忽略 page）；include_total=false 时不统计总数
+    """
     # 验证工作区是否存在
     workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
     if not workspace:
@@ -308,9 +68,13 @@ def get_tasks(
 
     query = db.query(Task).filter(Task.workspace_id == workspace_id)
 
-    # 搜索
+    # 搜索（优先使用全文索引，检索词过短时回退到模糊匹配）
     if search:
-        query = query.filter(Task.title.contains(search))
+        rowids = fts_rowids("tasks_fts", search, column="title")
+        if rowids is not None:
+            query = query.filter(literal_column("tasks.rowid").in_(rowids))
+        else:
+            query = query.filter(Task.title.contains(search))
 
     # 筛选
     if status:
@@ -320,28 +84,38 @@ def get_tasks(
     if source:
         query = query.filter(Task.source == source)
 
-    # 排序
+    # 排序（以 id 作为相同排序值时的次序，保证游标翻页稳定）
     if sort_by == "priority":
         # 优先级排序：使用CASE将字符串映射为数字
         from sqlalchemy import case
-        priority_order = case(
+        sort_column = case(
             (Task.priority == 'high', 1),
             (Task.priority == 'medium', 2),
             (Task.priority == 'low', 3),
             else_=4
         )
-        if sort_order == "asc":
-            query = query.order_by(priority_order.asc())
-        else:
-            query = query.order_by(priority_order.desc())
     else:
-        if sort_order == "asc":
-            query = query.order_by(getattr(Task, sort_by).asc())
-        else:
-            query = query.order_by(getattr(Task, sort_by).desc())
+        sort_column = getattr(Task, sort_by)
 
-    total = query.count()
-    tasks = query.offset((page - 1) * page_size).limit(page_size).all()
+    # 总数：没有搜索和优先级 / 来源筛选时直接读取工作区上维护的任务计数
+    total = None
+    if not search and not priority and not source:
+        if status:
+            total = getattr(workspace, COUNTER_COLUMNS[status])
+        else:
+            total = sum(getattr(workspace, column) for column in COUNTER_COLUMNS.values())
+    elif include_total:
+        total = query.count()
+
+    tasks, next_cursor = paginate(
+        query,
+        [sort_column, Task.id],
+        descending=sort_order != "asc",
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        sort_key=f"{sort_by}:{sort_order}"
+    )
 
     task_responses = []
     for task in tasks:
@@ -374,7 +148,8 @@ def get_tasks(
             total=total,
             page=page,
             page_size=page_size,
-            tasks=task_responses
+            tasks=task_responses,
+            next_cursor=next_cursor
         )
     )
 
@@ -527,17 +302,18 @@ def update_task(
     )
 
 @router.delete("/tasks/{task_id}", response_model=ResponseModel[dict])
-def delete_task(
+async def delete_task(
     task_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """删除任务"""
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+    """删除任务（在事件循环中执行，消息流管理器只在事件循环中修改）"""
+    db_task = await db.get(Task, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    db.delete(db_task)
-    db.commit()
+    await db.delete(db_task)
+    await db.commit()
+    message_stream_manager.clear_task(task_id)
 
     return ResponseModel(
         code=200,
@@ -549,15 +325,15 @@ def delete_task(
 async def dispatch_task(
     task_id: str,
     request: TaskDispatchRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """下发任务（异步立即返回）"""
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+    db_task = await db.get(Task, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
     # 获取工作空间信息
-    workspace = db.query(Workspace).filter(Workspace.id == db_task.workspace_id).first()
+    workspace = await db.get(Workspace, db_task.workspace_id)
     if not workspace:
         raise HTTPException(status_code=404, detail="工作区不存在")
 
@@ -569,39 +345,32 @@ async def dispatch_task(
     if not os.path.exists(workspace.path):
         raise HTTPException(status_code=400, detail=f"工作区路径不存在: {workspace.path}")
 
-    # 生成执行ID
-    execution_id = f"exec-sys-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{str(uuid.uuid4())[:8]}"
-
-    # 更新任务状态为 progress (running)
-    db_task.status = "progress"
-    db_task.execution_id = execution_id
-    db_task.dispatch_time = datetime.now()
-
-    db.commit()
-    db.refresh(db_task)
-
-    # 使用 asyncio.create_task 在后台执行任务（非阻塞）
-    asyncio.create_task(
-        execute_claude_agent_task_async(task_id, workspace.path, db_task.description)
-    )
+    # 更新任务状态为 progress 并写入持久化执行队列（非阻塞），执行池满时作业在队列中等待
+    try:
+        job, queue_position = await db.run_sync(enqueue_task_execution, db_task, "dispatch", request.execution_params)
+    except ExecutionAlreadyActiveError:
+        raise HTTPException(status_code=400, detail="任务正在执行或排队中")
+    except ExecutorBacklogFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     return ResponseModel(
         code=200,
-        message="下发成功",
+        message="下发成功" if queue_position == 0 else f"已加入执行队列，排队位置 {queue_position}",
         data=TaskDispatchResponse(
-            execution_id=execution_id,
+            execution_id=job.execution_id,
             dispatch_time=db_task.dispatch_time,
-            status=db_task.status
+            status=db_task.status,
+            queue_position=queue_position
         )
     )
 
 @router.post("/tasks/{task_id}/retry", response_model=ResponseModel[TaskDispatchResponse])
 async def retry_task(
     task_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """重试任务（异步立即返回）"""
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+    db_task = await db.get(Task, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
@@ -609,34 +378,82 @@ async def retry_task(
         raise HTTPException(status_code=400, detail="只能重试失败的任务")
 
     # 获取工作空间信息
-    workspace = db.query(Workspace).filter(Workspace.id == db_task.workspace_id).first()
+    workspace = await db.get(Workspace, db_task.workspace_id)
     if not workspace:
         raise HTTPException(status_code=404, detail="工作区不存在")
 
-    # 生成新的执行ID
-    execution_id = f"exec-sys-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{str(uuid.uuid4())[:8]}"
+    # 更新任务状态为 progress 并写入持久化执行队列（非阻塞），执行池满时作业在队列中等待
+    try:
+        job, queue_position = await db.run_sync(enqueue_task_execution, db_task, "retry", None)
+    except ExecutionAlreadyActiveError:
+        raise HTTPException(status_code=400, detail="任务正在执行或排队中")
+    except ExecutorBacklogFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-    # 更新任务状态
-    db_task.status = "progress"
-    db_task.execution_id = execution_id
-    db_task.dispatch_time = datetime.now()
+    return ResponseModel(
+        code=200,
+        message="重试成功" if queue_position == 0 else f"已加入执行队列，排队位置 {queue_position}",
+        data=TaskDispatchResponse(
+            execution_id=job.execution_id,
+            dispatch_time=db_task.dispatch_time,
+            status=db_task.status,
+            queue_position=queue_position
+        )
+    )
 
-    db.commit()
-    db.refresh(db_task)
+@router.post("/tasks/{task_id}/cancel", response_model=ResponseModel[dict])
+async def cancel_task(
+    task_id: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """取消任务执行（排队中的直接取消，执行中的终止 Agent 进程并保存已产生的日志）"""
+    db_task = await db.get(Task, task_id)
+    if not db_task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    result = await db.run_sync(cancel_task_execution, db_task, "用户取消")
+    if result == "none":
+        raise HTTPException(status_code=400, detail="任务未在执行中")
 
-    # 使用 asyncio.create_task 在后台执行任务（非阻塞）
-    asyncio.create_task(
-        execute_claude_agent_task_async(task_id, workspace.path, db_task.description)
+    return ResponseModel(
+        code=200,
+        message="任务已取消" if result == "cancelled" else "正在取消任务",
+        data={
+            "task_id": task_id,
+            "execution_id": db_task.execution_id,
+            "result": result
+        }
     )
 
+@router.get("/executor/status", response_model=ResponseModel[dict])
+async def get_executor_status(db: AsyncSession = Depends(get_async_db)):
+    """查询执行池状态（消息流统计会回收过期消息流，需在事件循环中执行）"""
+    job_counts = dict((await db.execute(
+        select(ExecutionJob.status, func.count(ExecutionJob.id)).group_by(ExecutionJob.status)
+    )).all())
+
     return ResponseModel(
         code=200,
-        message="重试成功",
-        data=TaskDispatchResponse(
-            execution_id=execution_id,
-            dispatch_time=db_task.dispatch_time,
-            status=db_task.status
-        )
+        message="获取成功",
+        data={
+            **agent_executor.stats(),
+            # 排队由持久化执行队列负责，等待中的作业数以 execution_jobs 为准
+            "pending": job_counts.get("pending", 0),
+            "max_pending": settings.max_pending_executions,
+            "jobs": job_counts,
+            "message_streams": message_stream_manager.stats(),
+            "db_writer": db_writer.stats(),
+            "hook_delivery": hook_dispatcher.stats()
+        }
+    )
+
+@router.get("/executor/stream-subscribers", response_model=ResponseModel[list[dict]])
+async def get_stream_subscribers():
+    """查询实时消息流订阅者的积压（lag）和丢弃情况"""
+    return ResponseModel(
+        code=200,
+        message="获取成功",
+        data=message_stream_manager.subscriber_stats()
     )
 
 @router.get("/tasks/{task_id}/status", response_model=ResponseModel[dict])
@@ -649,8 +466,9 @@ def get_task_status(
     if not db_task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    # TODO: 实现实际的状态轮询逻辑
-    # 这里应该调用外部系统的 API 查询任务状态
+    # 排队中的作业返回排队位置
+    active_job = get_active_job(db, task_id)
+    queue_position = get_queue_position(db, active_job) if active_job else 0
 
     return ResponseModel(
         code=200,
@@ -660,55 +478,124 @@ def get_task_status(
             "execution_id": db_task.execution_id,
             "status": db_task.status,
             "progress": 100 if db_task.status == "completed" else 50,
+            "queue_position": queue_position,
             "result": {},
             "error_message": None,
             "updated_at": db_task.updated_at
         }
     )
 
-@router.get("/tasks/{task_id}/stream")
-async def task_message_stream(task_id: str, db: Session = Depends(get_db)):
-    """SSE endpoint: 实时推送任务执行消息流"""
-    from app.utils.message_stream import message_stream_manager
+def _sse_event(event_id: Optional[EventId], message: dict) -> str:
+    frame = f"data: {json.dumps(message, ensure_ascii=False)}\n\n"
+    if event_id is not None:
+        frame = f"id: {format_event_id(event_id)}\n" + frame
+    return frame
+
 
+@router.get("/tasks/{task_id}/stream")
+async def task_message_stream(
+    task_id: str,
+    last_event_id: Optional[str] = Header(None),
+    after: Optional[str] = Query(None, description="已收到的最后一条事件 ID，与 Last-Event-ID 请求头相同"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    SSE endpoint: 实时推送任务执行消息流
+    每条消息带有 id（执行次数.消息序号），断线重连时浏览器会携带 Last-Event-ID，只补发之后的消息；
+    内存缓冲中已回收的部分从执行日志补发
+    """
     # 验证任务是否存在（验证后立即释放连接，避免SSE长连接占用数据库连接）
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = await db.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
+    last = parse_event_id(after or last_event_id)
+    if last is None and task.status == "progress":
+        # 首次连接：从本次执行的第一条消息开始推送（内存缓冲只保留最近的消息）
+        running_log = (await db.execute(
+            select(TaskExecutionLog.execution_number).where(
+                TaskExecutionLog.task_id == task_id,
+                TaskExecutionLog.status == "running"
+            ).order_by(TaskExecutionLog.execution_number.desc()).limit(1)
+        )).first()
+        if running_log:
+            last = (running_log.execution_number, -1)
+    elif last is not None and task.status != "progress":
+        # 任务已不在执行：补发缺失的消息后结束，没有缺失时返回 204，浏览器收到后不再重连
+        events = await db.run_sync(load_stream_events, task_id, last)
+        sent = events[-1][0] if events else last
+        events += message_stream_manager.get_events(task_id, after=sent)
+        await db.close()
+        if not events:
+            return Response(status_code=204)
+
+        async def replay_generator():
+            for event_id, message in events:
+                yield _sse_event(event_id, message)
+
+        return StreamingResponse(
+            replay_generator(),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                "X-Accel-Buffering": "no"
+            }
+        )
+
     # 立即关闭数据库连接
-    db.close()
+    await db.close()
 
     async def event_generator():
         """生成SSE事件流"""
-        queue = await message_stream_manager.subscribe(task_id)
+        subscriber = await message_stream_manager.subscribe(task_id, after=last)
+        sent = last
 
         try:
+            if last is not None:
+                # 内存缓冲中第一条消息之前缺失的部分从执行日志补发
+                async with AsyncSessionLocal() as replay_db:
+                    missed = await replay_db.run_sync(
+                        load_stream_events, task_id, last, before=subscriber.first_event_id()
+                    )
+                for event_id, message in missed:
+                    yield _sse_event(event_id, message)
+                    sent = event_id
+                if missed and missed[-1][1].get('type') == 'ResultMessage' and subscriber.empty():
+                    return
+
             while True:
                 # 等待新消息 (最多30秒)
                 try:
-                    message = await asyncio.wait_for(queue.get(), timeout=30.0)
-                    yield f"data: {json.dumps(message, ensure_ascii=False)}\n\n"
-
-                    # 如果收到ResultMessage，说明任务已结束
-                    if message.get('type') == 'ResultMessage':
-                        # 发送剩余消息
-                        try:
-                            while not queue.empty():
-                                msg = await asyncio.wait_for(queue.get(), timeout=0.1)
-                                yield f"data: {json.dumps(msg, ensure_ascii=False)}\n\n"
-                        except asyncio.TimeoutError:
-                            pass
-                        break
-
+                    _, event_id, message = await asyncio.wait_for(subscriber.get(), timeout=30.0)
                 except asyncio.TimeoutError:
                     # 发送心跳保持连接
                     yield f": heartbeat\n\n"
+                    continue
+
+                # 已从执行日志补发过的消息
+                if event_id is not None and sent is not None and event_id <= sent:
+                    continue
+                yield _sse_event(event_id, message)
+                if event_id is not None:
+                    sent = event_id
+
+                # 消费过慢被断开（disconnect 策略），由客户端携带 Last-Event-ID 重新连接
+                if message.get('type') == STREAM_OVERFLOW:
+                    break
+
+                # 如果收到ResultMessage，说明任务已结束
+                if message.get('type') == 'ResultMessage':
+                    # 发送剩余消息
+                    while not subscriber.empty():
+                        _, event_id, message = await subscriber.get()
+                        yield _sse_event(event_id, message)
+                    break
 
         except asyncio.CancelledError:
             pass
         finally:
-            await message_stream_manager.unsubscribe(task_id, queue)
+            message_stream_manager.unsubscribe(task_id, subscriber)
 
     return StreamingResponse(
         event_generator(),
@@ -721,36 +608,101 @@ async def task_message_stream(task_id: str, db: Session = Depends(get_db)):
     )
 
 
-@router.get("/tasks/{task_id}/execution-logs", response_model=ResponseModel[list[TaskExecutionLogSchema]])
+def _execution_log_summary(log: TaskExecutionLog) -> dict:
+    return {
+        "id": log.id,
+        "task_id": log.task_id,
+        "execution_number": log.execution_number,
+        "response_type": log.response_type,
+        "status": log.status,
+        "thread_id": log.thread_id,
+        "thread_number": log.thread_number,
+        "message_count": log.message_count or 0,
+        "content_bytes": log.content_bytes or 0,
+        "cost_usd": log.cost_usd,
+        "created_at": log.created_at,
+        "updated_at": log.updated_at
+    }
+
+
+@router.get("/tasks/{task_id}/execution-logs", response_model=ResponseModel[list[TaskExecutionLogSummary]])
 def get_task_execution_logs(
     task_id: str,
     db: Session = Depends(get_db)
 ):
-    """获取任务的所有执行日志"""
+    """获取任务的所有执行日志摘要（不含消息内容，内容通过 /execution-logs/{execution_number} 获取）"""
     # 验证任务是否存在
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
     # 查询该任务的所有执行日志，按执行次数倒序排列
-    logs = db.query(TaskExecutionLog).filter(
+    logs = db.query(TaskExecutionLog).options(
+        defer(TaskExecutionLog.response_content)
+    ).filter(
         TaskExecutionLog.task_id == task_id
     ).order_by(TaskExecutionLog.execution_number.desc()).all()
 
     return ResponseModel(
         success=True,
         message="获取执行日志成功",
-        data=logs
+        data=[_execution_log_summary(log) for log in logs]
     )
 
 
-@router.get("/tasks/{task_id}/execution-logs/{execution_number}", response_model=ResponseModel[TaskExecutionLogSchema])
-def get_task_execution_log_by_number(
+@router.get("/tasks/{task_id}/hook-deliveries", response_model=ResponseModel[list[HookDeliveryResponse]])
+def get_task_hook_deliveries(
     task_id: str,
-    execution_number: int,
+    limit: int = Query(50, ge=1, le=500, description="返回的最近投递记录数"),
+    db: Session = Depends(get_db)
+):
+    """获取任务最近的 hook 投递记录（状态、尝试次数、最后一次响应或错误）"""
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    deliveries = db.query(HookDelivery).filter(
+        HookDelivery.task_id == task_id
+    ).order_by(HookDelivery.created_at.desc()).limit(limit).all()
+
+    return ResponseModel(
+        code=200,
+        message="获取成功",
+        data=[HookDeliveryResponse.model_validate(delivery) for delivery in deliveries]
+    )
+
+
+@router.post("/tasks/{task_id}/hook-deliveries/{delivery_id}/redeliver", response_model=ResponseModel[HookDeliveryResponse])
+def redeliver_hook(
+    task_id: str,
+    delivery_id: str,
     db: Session = Depends(get_db)
 ):
-    """获取任务的特定执行日志"""
+    """重新投递已失败的 hook（重置尝试次数，立即进入投递队列）"""
+    delivery = db.query(HookDelivery).filter(
+        HookDelivery.id == delivery_id,
+        HookDelivery.task_id == task_id
+    ).first()
+    if not delivery:
+        raise HTTPException(status_code=404, detail="投递记录不存在")
+    if delivery.status != "failed":
+        raise HTTPException(status_code=400, detail="只能重新投递失败的 hook")
+
+    delivery.status = "pending"
+    delivery.attempts = 0
+    delivery.next_attempt_at = datetime.now()
+    db.commit()
+    db.refresh(delivery)
+    hook_dispatcher.notify()
+
+    return ResponseModel(
+        code=200,
+        message="已重新加入投递队列",
+        data=HookDeliveryResponse.model_validate(delivery)
+    )
+
+
+def _get_execution_log(db: Session, task_id: str, execution_number: int) -> TaskExecutionLog:
     # 验证任务是否存在
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
@@ -764,11 +716,53 @@ def get_task_execution_log_by_number(
 
     if not log:
         raise HTTPException(status_code=404, detail=f"第 {execution_number} 次执行日志不存在")
+    return log
+
+
+@router.get("/tasks/{task_id}/execution-logs/{execution_number}", response_model=ResponseModel[TaskExecutionLogSchema])
+def get_task_execution_log_by_number(
+    task_id: str,
+    execution_number: int,
+    offset: int = Query(0, ge=0, description="起始消息序号"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="最多返回的消息数，默认全部"),
+    db: Session = Depends(get_db)
+):
+    """获取任务的特定执行日志及其消息内容，可按消息序号范围分段读取"""
+    log = _get_execution_log(db, task_id, execution_number)
+    messages = load_messages(db, log, offset=offset, limit=limit)
 
     return ResponseModel(
         success=True,
         message="获取执行日志成功",
-        data=log
+        data={
+            **_execution_log_summary(log),
+            "response_content": json.dumps(messages, ensure_ascii=False),
+            "offset": offset
+        }
+    )
+
+
+@router.get("/tasks/{task_id}/execution-logs/{execution_number}/messages", response_model=ResponseModel[dict])
+def get_task_execution_log_messages(
+    task_id: str,
+    execution_number: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """按消息序号分页读取执行日志"""
+    log = _get_execution_log(db, task_id, execution_number)
+    messages = load_messages(db, log, offset=offset, limit=limit)
+
+    return ResponseModel(
+        code=200,
+        message="获取执行日志成功",
+        data={
+            "execution_number": log.execution_number,
+            "total_messages": log.message_count,
+            "offset": offset,
+            "messages": messages
+        }
     )
 
 
@@ -887,13 +881,13 @@ def get_task_diff(
 async def generate_tasks(
     workspace_id: str,
     request: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """使用Claude生成任务列表"""
-    from anthropic import Anthropic
+    from anthropic import AsyncAnthropic
 
     # 验证工作区是否存在
-    workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    workspace = await db.get(Workspace, workspace_id)
     if not workspace:
         raise HTTPException(status_code=404, detail="工作区不存在")
 
@@ -907,7 +901,7 @@ async def generate_tasks(
         raise HTTPException(status_code=400, detail="请提供任务描述")
 
     try:
-        client = Anthropic(api_key=settings.anthropic_api_key)
+        client = AsyncAnthropic(api_key=settings.anthropic_api_key)
 
         # 构建system prompt - 任务生成专用
         system_prompt = f"""你是一个专业的项目任务规划助手。根据用户提供的需求描述，生成详细的任务分解列表。
@@ -932,7 +926,7 @@ async def generate_tasks(
 只返回JSON数组，不要添加其他说明文字。"""
 
         # 调用Claude API
-        response = client.messages.create(
+        response = await client.messages.create(
             model="claude-3-5-sonnet-20241022",
             max_tokens=4000,
             system=system_prompt,
@@ -982,18 +976,18 @@ async def generate_tasks(
 async def stream_task_chat(
     task_id: str,
     request: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """流式对话接口，使用Claude Agent SDK，支持工具调用"""
-    from claude_agent_sdk import ClaudeSDKClient, ClaudeAgentOptions, AssistantMessage, TextBlock
+    from claude_agent_sdk import ClaudeSDKClient, ClaudeAgentOptions, AssistantMessage, ResultMessage, TextBlock
 
     # 验证task是否存在
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = await db.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
     # 获取workspace信息
-    workspace = db.query(Workspace).filter(Workspace.id == task.workspace_id).first()
+    workspace = await db.get(Workspace, task.workspace_id)
     workspace_path = workspace.path if workspace else None
 
     # 获取用户消息（只取最后一条用户消息作为prompt）
@@ -1030,6 +1024,53 @@ async def stream_task_chat(
         permission_mode='acceptEdits'
     )
 
+    def save_chat_log(log_db: Session, chat_history: list):
+        """保存对话日志：提供 execution_number 时追加到已有记录，否则创建新记录"""
+        execution_log = None
+        if execution_number is not None:
+            # 更新模式：只追加本轮新增的消息，不重写已保存的对话
+            execution_log = log_db.query(TaskExecutionLog).filter(
+                TaskExecutionLog.task_id == task_id,
+                TaskExecutionLog.execution_number == execution_number
+            ).first()
+            if not execution_log:
+                print(f"Warning: execution_number {execution_number} not found, will create new log")
+
+        if execution_log:
+            saved_count = execution_log.message_count or 0
+            if len(chat_history) > saved_count:
+                new_messages = chat_history[saved_count:]
+            else:
+                # 客户端提交的历史与已保存的不一致时，只追加最后一条用户消息和本轮回复
+                new_messages = chat_history[-2:]
+            append_messages(log_db, execution_log, new_messages)
+            execution_log.status = 'completed'
+            execution_log.thread_number = thread_number
+        else:
+            # 创建模式（或找不到要更新的记录）：创建新的执行记录
+            create_execution_log(
+                log_db,
+                task_id,
+                response_type='chat',
+                status='completed',
+                messages=chat_history,
+                thread_id=thread_id,
+                thread_number=thread_number
+            )
+        log_db.commit()
+
+    def save_error_log(log_db: Session, error_detail: str):
+        create_execution_log(
+            log_db,
+            task_id,
+            response_type='chat_error',
+            status='failed',
+            messages=[{"type": "error", "message": error_detail}],
+            thread_id=thread_id,
+            thread_number=thread_number
+        )
+        log_db.commit()
+
     async def generate():
         all_messages = []
         accumulated_text = ""
@@ -1068,62 +1109,23 @@ async def stream_task_chat(
                         "text": msg.get('content')
                     })
 
-                # 添加AI的新回复
-                chat_history.append({
+                # 添加AI的新回复（附带本轮费用，计入执行日志的 cost_usd）
+                reply = {
                     "type": "AssistantMessage",
                     "role": "assistant",
                     "content": accumulated_text,
                     "text": accumulated_text
-                })
+                }
+                cost_usd = sum(
+                    getattr(msg, 'total_cost_usd', 0) or 0
+                    for msg in all_messages if isinstance(msg, ResultMessage)
+                )
+                if cost_usd:
+                    reply["cost_usd"] = cost_usd
+                chat_history.append(reply)
 
-                if execution_number is not None:
-                    # 更新模式：更新现有的执行记录
-                    execution_log = db.query(TaskExecutionLog).filter(
-                        TaskExecutionLog.task_id == task_id,
-                        TaskExecutionLog.execution_number == execution_number
-                    ).first()
-
-                    if execution_log:
-                        execution_log.response_content = json.dumps(chat_history, ensure_ascii=False)
-                        execution_log.status = 'completed'
-                        execution_log.thread_number = thread_number
-                        db.commit()
-                    else:
-                        print(f"Warning: execution_number {execution_number} not found, will create new log")
-                        # 如果找不到，仍然创建新记录
-                        max_execution = db.query(func.max(TaskExecutionLog.execution_number)).filter(
-                            TaskExecutionLog.task_id == task_id
-                        ).scalar() or 0
-                        execution_log = TaskExecutionLog(
-                            id=str(uuid.uuid4()),
-                            task_id=task_id,
-                            execution_number=max_execution + 1,
-                            response_type='chat',
-                            response_content=json.dumps(chat_history, ensure_ascii=False),
-                            status='completed',
-                            thread_id=thread_id,
-                            thread_number=thread_number
-                        )
-                        db.add(execution_log)
-                        db.commit()
-                else:
-                    # 创建模式：创建新的执行记录
-                    max_execution = db.query(func.max(TaskExecutionLog.execution_number)).filter(
-                        TaskExecutionLog.task_id == task_id
-                    ).scalar() or 0
-
-                    execution_log = TaskExecutionLog(
-                        id=str(uuid.uuid4()),
-                        task_id=task_id,
-                        execution_number=max_execution + 1,
-                        response_type='chat',
-                        response_content=json.dumps(chat_history, ensure_ascii=False),
-                        status='completed',
-                        thread_id=thread_id,
-                        thread_number=thread_number
-                    )
-                    db.add(execution_log)
-                    db.commit()
+                async with AsyncSessionLocal() as log_db:
+                    await log_db.run_sync(save_chat_log, chat_history)
             except Exception as log_error:
                 print(f"Failed to save execution log: {log_error}")
 
@@ -1136,22 +1138,8 @@ async def stream_task_chat(
 
             # 保存错误日志
             try:
-                max_execution = db.query(func.max(TaskExecutionLog.execution_number)).filter(
-                    TaskExecutionLog.task_id == task_id
-                ).scalar() or 0
-
-                execution_log = TaskExecutionLog(
-                    id=str(uuid.uuid4()),
-                    task_id=task_id,
-                    execution_number=max_execution + 1,
-                    response_type='chat_error',
-                    response_content=error_detail,
-                    status='failed',
-                    thread_id=thread_id,
-                    thread_number=thread_number
-                )
-                db.add(execution_log)
-                db.commit()
+                async with AsyncSessionLocal() as log_db:
+                    await log_db.run_sync(save_error_log, error_detail)
             except Exception as log_error:
                 print(f"Failed to save error log: {log_error}")
 
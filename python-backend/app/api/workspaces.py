@@ -5,7 +5,7 @@ from typing import Optional
 import uuid
 
 from app.database import get_db
-from app.models import Workspace, Task
+from app.models import Workspace
 from app.schemas.workspace import (
     WorkspaceCreate,
     WorkspaceUpdate,
@@ -13,6 +13,8 @@ from app.schemas.workspace import (
     WorkspaceListResponse
 )
 from app.schemas.common import ResponseModel
+from app.services.task_counters import recount_workspace_task_counters
+from app.utils.pagination import paginate
 
 router = APIRouter(prefix="/workspaces", tags=["workspaces"])
 
@@ -23,36 +25,35 @@ def get_workspaces(
     search: Optional[str] = None,
     sort_by: Optional[str] = Query("created_at", regex="^(name|created_at)$"),
     sort_order: Optional[str] = Query("desc", regex="^(asc|desc)$"),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     db: Session = Depends(get_db)
 ):
-    """获取工作区列表"""
+    """
+    获取工作区列表
+    传入上一页返回的 cursor 时按游标翻页（忽略 page）；include_total=false 时不统计总数
+    """
     query = db.query(Workspace)
 
     if search:
         query = query.filter(Workspace.name.contains(search))
 
-    # 排序
-    if sort_order == "asc":
-        query = query.order_by(getattr(Workspace, sort_by).asc())
-    else:
-        query = query.order_by(getattr(Workspace, sort_by).desc())
-
-    total = query.count()
-    workspaces = query.offset((page - 1) * page_size).limit(page_size).all()
+    total = query.count() if include_total else None
+
+    # 排序（以 id 作为相同排序值时的次序，保证游标翻页稳定）
+    workspaces, next_cursor = paginate(
+        query,
+        [getattr(Workspace, sort_by), Workspace.id],
+        descending=sort_order != "asc",
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        sort_key=f"{sort_by}:{sort_order}"
+    )
 
-    # 计算每个工作区的任务统计
+    # 任务统计直接读取工作区上维护的计数
     workspace_responses = []
     for workspace in workspaces:
-        active_tasks = db.query(Task).filter(
-            Task.workspace_id == workspace.id,
-            Task.status.in_(["pending", "progress"])
-        ).count()
-
-        completed_tasks = db.query(Task).filter(
-            Task.workspace_id == workspace.id,
-            Task.status == "completed"
-        ).count()
-
         workspace_dict = {
             "id": workspace.id,
             "name": workspace.name,
@@ -63,8 +64,8 @@ def get_workspaces(
             "icon_color": workspace.icon_color,
             "created_at": workspace.created_at,
             "updated_at": workspace.updated_at,
-            "active_tasks": active_tasks,
-            "completed_tasks": completed_tasks
+            "active_tasks": workspace.pending_task_count + workspace.progress_task_count,
+            "completed_tasks": workspace.completed_task_count
         }
         workspace_responses.append(workspace_dict)
 
@@ -75,7 +76,8 @@ def get_workspaces(
             total=total,
             page=page,
             page_size=page_size,
-            workspaces=workspace_responses
+            workspaces=workspace_responses,
+            next_cursor=next_cursor
         )
     )
 
@@ -89,16 +91,6 @@ def get_workspace(
     if not workspace:
         raise HTTPException(status_code=404, detail="工作区不存在")
 
-    active_tasks = db.query(Task).filter(
-        Task.workspace_id == workspace.id,
-        Task.status.in_(["pending", "progress"])
-    ).count()
-
-    completed_tasks = db.query(Task).filter(
-        Task.workspace_id == workspace.id,
-        Task.status == "completed"
-    ).count()
-
     workspace_dict = {
         "id": workspace.id,
         "name": workspace.name,
@@ -109,8 +101,8 @@ def get_workspace(
         "icon_color": workspace.icon_color,
         "created_at": workspace.created_at,
         "updated_at": workspace.updated_at,
-        "active_tasks": active_tasks,
-        "completed_tasks": completed_tasks
+        "active_tasks": workspace.pending_task_count + workspace.progress_task_count,
+        "completed_tasks": workspace.completed_task_count
     }
 
     return ResponseModel(
@@ -177,16 +169,6 @@ def update_workspace(
     db.commit()
     db.refresh(db_workspace)
 
-    active_tasks = db.query(Task).filter(
-        Task.workspace_id == db_workspace.id,
-        Task.status.in_(["pending", "progress"])
-    ).count()
-
-    completed_tasks = db.query(Task).filter(
-        Task.workspace_id == db_workspace.id,
-        Task.status == "completed"
-    ).count()
-
     workspace_dict = {
         "id": db_workspace.id,
         "name": db_workspace.name,
@@ -197,8 +179,8 @@ def update_workspace(
         "icon_color": db_workspace.icon_color,
         "created_at": db_workspace.created_at,
         "updated_at": db_workspace.updated_at,
-        "active_tasks": active_tasks,
-        "completed_tasks": completed_tasks
+        "active_tasks": db_workspace.pending_task_count + db_workspace.progress_task_count,
+        "completed_tasks": db_workspace.completed_task_count
     }
 
     return ResponseModel(
@@ -225,3 +207,16 @@ def delete_workspace(
         message="删除成功",
         data={}
     )
+
+@router.post("/task-counters/recount", response_model=ResponseModel[dict])
+def recount_task_counters(
+    workspace_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """按任务表重新统计工作区任务计数（修复计数偏差，不指定 workspace_id 时统计全部工作区）"""
+    updated = recount_workspace_task_counters(db, workspace_id)
+    return ResponseModel(
+        code=200,
+        message="统计完成",
+        data={"updated_workspaces": updated}
+    )
@@ -3,6 +3,18 @@ from typing import Optional
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./axis.db"
+
+    # SQLite 存储配置：performance 在每个连接上设置下面的 PRAGMA，default 保持 SQLite 默认设置
+    sqlite_profile: str = "performance"  # performance / default
+    sqlite_journal_mode: str = "wal"  # WAL 模式下读写互不阻塞
+    sqlite_synchronous: str = "normal"  # WAL 模式下 normal 只在检查点时同步，断电可能丢失最近的提交但不会损坏数据库
+    sqlite_busy_timeout_ms: int = 5000  # 等待写锁的最长时间
+    sqlite_mmap_size_bytes: int = 256 * 1024 * 1024  # 内存映射读取的大小，0 表示不使用
+    sqlite_cache_size_kib: int = 64 * 1024  # 每个连接的页缓存大小
+    # 单一写入线程：执行日志等小写入由一个线程合并提交（组提交），减少并发执行时的写锁争用
+    sqlite_writer_enabled: bool = False
+    sqlite_writer_batch_size: int = 64  # 每次提交最多合并的写操作数
+    sqlite_writer_max_delay_ms: float = 5.0  # 等待更多写操作合并的最长时间
     api_prefix: str = "/api"
     port: int = 10101
     host: str = "0.0.0.0"
@@ -10,6 +22,60 @@ class Settings(BaseSettings):
     # Claude Agent SDK 配置
     anthropic_api_key: Optional[str] = None
 
+    # Agent 执行池配置
+    max_concurrent_executions: int = 4  # 全局同时执行的任务数上限
+    max_concurrent_executions_per_workspace: int = 2  # 每个工作区同时执行的任务数上限
+    max_pending_executions: int = 1000  # 等待队列长度上限
+
+    # 持久化执行队列配置
+    run_embedded_worker: bool = True  # API 进程内是否运行作业 worker，独立部署 worker.py 时可设为 False
+    job_poll_interval_seconds: float = 2.0  # worker 轮询作业表的间隔
+    job_lease_seconds: int = 60  # 作业租约时长，超过未续约视为 worker 失联
+    job_max_attempts: int = 3  # 作业最多被认领次数
+    job_completion_poll_seconds: float = 30.0  # 等待其它 worker 进程执行的作业结束时的兜底轮询间隔
+    orphan_execution_policy: str = "fail"  # 中断执行的处理策略：fail - 标记失败，requeue - 重新入队
+
+    # 执行限制（全局默认值，可通过 dispatch 的 execution_params 按任务覆盖，0 表示不限制）
+    execution_timeout_seconds: int = 3600  # 单次执行的最长运行时间
+    execution_max_messages: int = 0  # 单次执行的最大消息数
+    execution_max_cost_usd: float = 0  # 单次执行的最大费用
+    execution_watchdog_interval_seconds: float = 5.0  # 超时检查间隔
+
+    # 执行日志增量写入：消息攒够条数时提交一批，执行中没有新消息时缓存的消息最多等待间隔秒数（定时提交）
+    execution_log_flush_batch_size: int = 20
+    execution_log_flush_interval_seconds: float = 1.0
+
+    # 实时消息流内存缓冲（完整日志以数据库为准）
+    message_stream_buffer_size: int = 500  # 每个任务保留的最近消息数
+    message_stream_finished_ttl_seconds: float = 300.0  # 执行结束后消息保留时长
+    message_stream_memory_budget_bytes: int = 64 * 1024 * 1024  # 所有任务保留消息的总大小上限
+    message_stream_subscriber_queue_size: int = 1000  # 每个 SSE 订阅者最多积压的消息数
+    message_stream_slow_consumer_policy: str = "drop_oldest"  # 订阅者积压满时：drop_oldest / coalesce / disconnect
+
+    # 消息流跨进程转发（多个 API worker 进程或独立部署作业 worker 时使用 sqlite 或 redis）
+    message_broker: str = "memory"  # memory / sqlite / redis
+    message_broker_url: str = "redis://localhost:6379/0"  # redis 代理地址，支持 redis:// 和 unix://
+    message_broker_sqlite_path: str = "./axis_stream.db"  # sqlite 代理的变更流文件（所有进程共用）
+    message_broker_poll_interval_seconds: float = 0.05  # sqlite 代理轮询变更的间隔
+
+    # hook 投递：执行过程只把请求写入 hook_deliveries 发件箱，由后台投递器发送并失败重试
+    hook_timeout_seconds: float = 10.0  # 单次请求超时
+    hook_max_attempts: int = 6  # 最多尝试次数，用完后标记为 failed
+    hook_retry_base_seconds: float = 2.0  # 重试间隔按指数退避：base * 2^(已尝试次数-1)
+    hook_retry_max_seconds: float = 600.0  # 重试间隔上限
+    hook_max_connections: int = 100  # 共享 HTTP 连接池的连接数上限
+    hook_max_concurrency_per_destination: int = 4  # 同一接收地址（协议 + 主机 + 端口）同时进行的请求数
+    hook_poll_interval_seconds: float = 2.0  # 投递器轮询发件箱的间隔（本进程写入时会立即唤醒）
+    hook_delivery_lease_seconds: int = 60  # 投递租约，进程退出后到期的投递由其它进程接管
+    hook_delivery_retention_days: float = 7.0  # 投递成功的记录保留天数
+    hook_circuit_failure_threshold: int = 5  # 同一接收地址连续失败多少次后熔断，熔断期间暂停投递（不消耗尝试次数）
+    hook_circuit_open_seconds: float = 30.0  # 首次熔断时长，熔断结束后先发送一个探测请求，失败则熔断时长翻倍
+    hook_circuit_max_open_seconds: float = 900.0  # 熔断时长上限
+    hook_rules_cache_ttl_seconds: float = 30.0  # 工作区 / 任务级 hook 规则的缓存时长（本进程修改规则时立即失效）
+
+    # 仪表盘快照缓存（相关数据写入时立即失效，TTL 兜底其它进程的写入，0 表示不缓存）
+    dashboard_cache_ttl_seconds: float = 5.0
+
     class Config:
         env_file = ".env"
 
@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -10,6 +12,58 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def sqlite_pragmas(profile: str = None) -> list:
+    """SQLite 存储配置对应的 PRAGMA 语句，default 不修改任何设置"""
+    if (profile or settings.sqlite_profile) != "performance":
+        return []
+    return [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}",
+        f"PRAGMA mmap_size={int(settings.sqlite_mmap_size_bytes)}",
+        # 负数表示以 KiB 为单位
+        f"PRAGMA cache_size={-int(settings.sqlite_cache_size_kib)}",
+        "PRAGMA temp_store=memory",
+    ]
+
+
+def configure_sqlite(target_engine, profile: str = None):
+    """在引擎的每个新连接上执行 SQLite 存储配置（非 SQLite 数据库不处理）"""
+    if target_engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(profile)
+    if not pragmas:
+        return
+
+    @event.listens_for(target_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+configure_sqlite(engine)
+
+
+def _async_database_url(url: str) -> str:
+    """把同步驱动的数据库地址转换为异步驱动（SQLite 使用 aiosqlite），已指定异步驱动时保持不变"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.get_driver_name() == "pysqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+# 异步引擎：供 async def 的接口和 Agent 执行使用，数据库 IO 在驱动线程中进行，不阻塞事件循环
+async_engine = create_async_engine(_async_database_url(settings.database_url))
+configure_sqlite(async_engine.sync_engine)
+
+# 提交后不过期对象，避免在事件循环中访问属性时触发隐式的同步加载
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -20,6 +74,45 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """异步数据库会话依赖，同步的 ORM 辅助函数通过 await db.run_sync(fn, ...) 调用"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """初始化数据库"""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _add_missing_indexes()
+
+    from app.services.search import init_search_index
+    init_search_index(engine)
+
+def _add_missing_columns():
+    """为已存在的表补齐模型中新增的列（create_all 不会修改已有表）"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if isinstance(default, str):
+                    ddl += " DEFAULT '" + default.replace("'", "''") + "'"
+                elif isinstance(default, (int, float)):
+                    ddl += f" DEFAULT {default}"
+                if not column.nullable and default is not None:
+                    ddl += " NOT NULL"
+                conn.execute(text(ddl))
+
+def _add_missing_indexes():
+    """为已存在的表补齐模型中新增的索引"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -3,8 +3,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.config import settings
-from app.database import init_db
-from app.api import workspaces, tasks, notifications, dashboard, queues
+from app.database import init_db, SessionLocal, async_engine
+from app.services.reconciler import reconcile_orphaned_executions
+from app.services.task_counters import recount_workspace_task_counters
+from app.services.execution_log_store import migrate_legacy_logs, backfill_execution_costs
+from app.services.job_queue import job_worker
+from app.services.db_writer import db_writer
+from app.services.hook_delivery import hook_dispatcher
+from app.utils.message_stream import message_stream_manager
+from app.api import workspaces, tasks, notifications, dashboard, queues, search, streams, hooks
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -13,9 +20,37 @@ async def lifespan(app: FastAPI):
     print("Initializing database...")
     init_db()
     print("Database initialized successfully")
+    # 修复上次进程退出时中断的任务和队列
+    db = SessionLocal()
+    try:
+        stats = reconcile_orphaned_executions(db)
+        print(f"Reconciled orphaned executions: {stats}")
+        # 修复后重新统计工作区任务计数（同时补齐新增计数列前已有的数据）
+        recount_workspace_task_counters(db)
+        # 把旧版整段保存的执行日志拆分为逐条压缩消息
+        migrate_legacy_logs(db)
+        backfill_execution_costs(db)
+    finally:
+        db.close()
+    # 执行日志的小写入由单一写入线程合并提交
+    if settings.sqlite_writer_enabled:
+        db_writer.start()
+    # 多进程部署时接收其它进程转发的实时消息，并定期回收过期的消息流
+    await message_stream_manager.start()
+    # 后台发送执行过程中写入发件箱的 hooks
+    hook_dispatcher.start()
+    # 启动进程内的作业 worker（独立部署 worker.py 时可通过 RUN_EMBEDDED_WORKER=false 关闭）
+    if settings.run_embedded_worker:
+        job_worker.start()
     yield
     # 关闭时的清理操作
     print("Shutting down...")
+    if settings.run_embedded_worker:
+        await job_worker.stop()
+    await hook_dispatcher.stop()
+    await message_stream_manager.stop()
+    db_writer.stop()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Axis API",
@@ -39,6 +74,9 @@ app.include_router(tasks.router, prefix=settings.api_prefix)
 app.include_router(notifications.router, prefix=settings.api_prefix)
 app.include_router(dashboard.router, prefix=settings.api_prefix)
 app.include_router(queues.router, prefix=settings.api_prefix)
+app.include_router(search.router, prefix=settings.api_prefix)
+app.include_router(streams.router, prefix=settings.api_prefix)
+app.include_router(hooks.router, prefix=settings.api_prefix)
 
 @app.get("/")
 def read_root():
@@ -4,6 +4,10 @@ from app.models.hook import HookConfig
 from app.models.queue import TaskQueue, QueueTask
 from app.models.notification import Notification
 from app.models.task_execution_log import TaskExecutionLog
+from app.models.task_execution_message import TaskExecutionMessage
+from app.models.execution_job import ExecutionJob
+from app.models.hook_delivery import HookDelivery
+from app.models.hook_destination import HookDestination
 
 __all__ = [
     "Workspace",
@@ -12,5 +16,9 @@ __all__ = [
     "TaskQueue",
     "QueueTask",
     "Notification",
-    "TaskExecutionLog"
+    "TaskExecutionLog",
+    "TaskExecutionMessage",
+    "ExecutionJob",
+    "HookDelivery",
+    "HookDestination"
 ]
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+class ExecutionJob(Base):
+    """任务执行作业表 - 持久化的执行队列，支持认领/租约/心跳"""
+    __tablename__ = "execution_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    task_id = Column(String, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
+    workspace_id = Column(String, nullable=False, index=True)
+    kind = Column(String, nullable=False)  # dispatch, retry, queue
+    execution_id = Column(Text)
+    status = Column(String, default='pending', nullable=False, index=True)  # pending, running, completed, failed, cancelled
+    payload = Column(Text)  # 执行参数 JSON
+    worker_id = Column(String, index=True)  # 认领该作业的 worker
+    attempts = Column(Integer, default=0, nullable=False)  # 已认领次数
+    lease_expires_at = Column(TIMESTAMP, index=True)  # 租约到期时间，到期未续约视为 worker 已失联
+    heartbeat_at = Column(TIMESTAMP)
+    error_message = Column(Text)
+    cancel_requested = Column(Integer, default=0, nullable=False)  # 跨进程取消请求，由执行该作业的 worker 处理
+    cancel_reason = Column(Text)
+    started_at = Column(TIMESTAMP)
+    finished_at = Column(TIMESTAMP)
+    created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    task = relationship("Task", back_populates="execution_jobs")
+
+    # 认领时按状态 + 创建时间顺序扫描
+    __table_args__ = (
+        Index('idx_job_status_created', 'status', 'created_at'),
+    )
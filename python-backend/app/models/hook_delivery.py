@@ -0,0 +1,37 @@
+from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+class HookDelivery(Base):
+    """hook 投递发件箱 - 与任务状态在同一事务中写入，由后台投递器发送并失败重试"""
+    __tablename__ = "hook_deliveries"
+
+    id = Column(String, primary_key=True, index=True)
+    task_id = Column(String, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
+    execution_id = Column(Text)
+    hook_config_id = Column(String, index=True)  # 来自 HookConfig 规则时的规则 ID，任务自身的 hook 为空
+    event = Column(String, nullable=False)  # start, stop
+    method = Column(String, default='POST', nullable=False)
+    url = Column(Text, nullable=False)
+    destination = Column(String, index=True)  # 接收地址（协议 + 主机 + 端口），并发限制和熔断按接收地址计算
+    headers = Column(Text)  # 额外的请求头 JSON
+    payload = Column(Text, nullable=False)  # 请求体 JSON
+    status = Column(String, default='pending', nullable=False, index=True)  # pending, delivering, delivered, failed
+    attempts = Column(Integer, default=0, nullable=False)  # 已尝试次数
+    next_attempt_at = Column(TIMESTAMP, nullable=False)  # 最早可投递时间（重试退避）
+    worker_id = Column(String)  # 正在投递的进程
+    lease_expires_at = Column(TIMESTAMP)  # 投递租约到期时间，到期未完成视为进程已退出
+    last_status_code = Column(Integer)
+    last_error = Column(Text)
+    delivered_at = Column(TIMESTAMP)
+    created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    task = relationship("Task", back_populates="hook_deliveries")
+
+    # 投递器按状态 + 可投递时间扫描
+    __table_args__ = (
+        Index('idx_hook_delivery_status_next', 'status', 'next_attempt_at'),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, Text, Integer, Float, TIMESTAMP
+from sqlalchemy.sql import func
+from app.database import Base
+
+class HookDestination(Base):
+    """hook 接收地址的健康状态和熔断器（协议 + 主机 + 端口），所有投递进程共享"""
+    __tablename__ = "hook_destinations"
+
+    destination = Column(String, primary_key=True)
+    state = Column(String, default='closed', nullable=False, index=True)  # closed, open, half_open
+    consecutive_failures = Column(Integer, default=0, nullable=False)
+    open_count = Column(Integer, default=0, nullable=False)  # 连续熔断次数，决定下一次熔断时长
+    open_until = Column(TIMESTAMP)  # open: 熔断结束时间；half_open: 探测请求的截止时间
+    total_successes = Column(Integer, default=0, nullable=False)
+    total_failures = Column(Integer, default=0, nullable=False)
+    avg_latency_ms = Column(Float)  # 响应耗时的指数移动平均
+    last_latency_ms = Column(Float)
+    last_status_code = Column(Integer)
+    last_error = Column(Text)
+    last_success_at = Column(TIMESTAMP)
+    last_failure_at = Column(TIMESTAMP)
+    opened_at = Column(TIMESTAMP)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -17,3 +17,8 @@ class Notification(Base):
 
     # Relationships
     task = relationship("Task", back_populates="notifications")
+
+    # 通知列表按创建时间做游标分页
+    __table_args__ = (
+        Index('idx_notification_created', 'created_at', 'id'),
+    )
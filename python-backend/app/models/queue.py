@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -10,6 +10,10 @@ class TaskQueue(Base):
     workspace_id = Column(String, ForeignKey("workspaces.id", ondelete="CASCADE"), nullable=False, index=True)
     name = Column(String, nullable=False)
     status = Column(String, default='pending', nullable=False, index=True)
+    max_parallelism = Column(Integer, default=1, nullable=False)  # 同时执行的队列任务数上限
+    failure_policy = Column(String, default='continue', nullable=False)  # continue - 失败后继续执行其它任务，stop - 第一个失败后停止
+    runner_id = Column(String)  # 正在执行该队列的进程
+    lease_expires_at = Column(TIMESTAMP)  # 执行租约到期时间，到期未续约视为执行进程已退出
     created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
@@ -17,6 +21,11 @@ class TaskQueue(Base):
     workspace = relationship("Workspace", back_populates="queues")
     queue_tasks = relationship("QueueTask", back_populates="queue", cascade="all, delete-orphan")
 
+    # 队列列表按工作区 + 创建时间做游标分页
+    __table_args__ = (
+        Index('idx_queue_workspace_created', 'workspace_id', 'created_at', 'id'),
+    )
+
 
 class QueueTask(Base):
     __tablename__ = "queue_tasks"
@@ -26,6 +35,7 @@ class QueueTask(Base):
     task_id = Column(String, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
     order_index = Column(Integer, nullable=False, index=True)
     status = Column(String, default='pending', nullable=False)
+    depends_on = Column(Text)  # 依赖的任务ID列表 JSON，依赖全部完成后才会执行
     execution_log = Column(Text)
     error_reason = Column(Text)
     created_at = Column(TIMESTAMP, server_default=func.now())
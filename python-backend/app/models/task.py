@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -32,3 +32,11 @@ class Task(Base):
     queue_tasks = relationship("QueueTask", back_populates="task", cascade="all, delete-orphan")
     notifications = relationship("Notification", back_populates="task")
     execution_logs = relationship("TaskExecutionLog", back_populates="task", cascade="all, delete-orphan")
+    execution_jobs = relationship("ExecutionJob", back_populates="task", cascade="all, delete-orphan")
+    hook_deliveries = relationship("HookDelivery", back_populates="task", cascade="all, delete-orphan")
+
+    # 任务列表按工作区 + 创建时间做游标分页
+    __table_args__ = (
+        Index('idx_task_workspace_created', 'workspace_id', 'created_at', 'id'),
+    )
+
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Integer, TIMESTAMP, ForeignKey, Index
+from sqlalchemy import Column, String, Text, Integer, Float, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -11,15 +11,24 @@ class TaskExecutionLog(Base):
     task_id = Column(String, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
     execution_number = Column(Integer, nullable=False, index=True)  # 第几次执行
     response_type = Column(String)  # response的类型
-    response_content = Column(Text)  # response的完整内容，可能非常大
+    response_content = Column(Text)  # 旧版整段保存的内容，新的日志按消息保存在 task_execution_messages 中
     status = Column(String, default='running')  # running, completed, failed
     thread_id = Column(String, index=True)  # 对话线程ID
     thread_number = Column(Integer)  # 第几次对话
+    message_count = Column(Integer, default=0, nullable=False)  # 已保存的消息数
+    content_bytes = Column(Integer, default=0, nullable=False)  # 消息未压缩时的总字节数
+    cost_usd = Column(Float)  # 执行费用（美元），取自 ResultMessage；为空表示尚未统计
     created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
     # Relationships
     task = relationship("Task", back_populates="execution_logs")
+    messages = relationship(
+        "TaskExecutionMessage",
+        back_populates="execution_log",
+        order_by="TaskExecutionMessage.seq",
+        passive_deletes=True  # 由数据库触发器删除
+    )
 
     # 创建复合索引，方便查询某个任务的所有执行记录
     __table_args__ = (
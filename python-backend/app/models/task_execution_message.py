@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, Integer, LargeBinary, TIMESTAMP, ForeignKey, Index, DDL, event
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+class TaskExecutionMessage(Base):
+    """执行日志消息表 - 按消息逐条追加保存执行过程，内容经 zlib 压缩"""
+    __tablename__ = "task_execution_messages"
+    __table_args__ = (
+        # 按执行记录 + 序号顺序读取和分页
+        Index('idx_execution_message_seq', 'execution_log_id', 'seq', unique=True),
+        {'sqlite_autoincrement': True},  # id 不复用，全文索引中已删除消息的残留条目不会指向新消息
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    execution_log_id = Column(String, ForeignKey("task_execution_logs.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 在本次执行中的序号，从 0 开始
+    message_type = Column(String)  # 消息类型，如 AssistantMessage、ResultMessage
+    payload = Column(LargeBinary, nullable=False)  # zlib 压缩后的消息 JSON
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    # Relationships
+    execution_log = relationship("TaskExecutionLog", back_populates="messages")
+
+
+# SQLite 默认不启用外键约束，删除执行日志时由触发器删除其消息
+event.listen(
+    TaskExecutionMessage.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER IF NOT EXISTS task_execution_logs_delete_messages "
+        "AFTER DELETE ON task_execution_logs BEGIN "
+        "DELETE FROM task_execution_messages WHERE execution_log_id = old.id; END"
+    )
+)
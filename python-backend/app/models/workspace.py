@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, TIMESTAMP
+from sqlalchemy import Column, String, Text, Integer, TIMESTAMP
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -13,6 +13,11 @@ class Workspace(Base):
     path = Column(Text)  # 工作空间的文件系统路径
     icon = Column(String, default='fas fa-folder')
     icon_color = Column(String, default='bg-primary')
+    # 各状态任务数，由 app.services.task_counters 在任务写入时维护
+    pending_task_count = Column(Integer, default=0, nullable=False)
+    progress_task_count = Column(Integer, default=0, nullable=False)
+    completed_task_count = Column(Integer, default=0, nullable=False)
+    failed_task_count = Column(Integer, default=0, nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
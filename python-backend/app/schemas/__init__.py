@@ -16,7 +16,10 @@ from app.schemas.hook import (
     HookConfigCreate,
     HookConfigUpdate,
     HookConfigResponse,
-    HookConfigListResponse
+    HookConfigListResponse,
+    HookDeliveryResponse,
+    HookDestinationResponse,
+    HookDestinationReset
 )
 from app.schemas.queue import (
     TaskQueueCreate,
@@ -24,7 +27,8 @@ from app.schemas.queue import (
     TaskQueueDetailResponse,
     TaskQueueListResponse,
     AddTasksToQueueRequest,
-    ReorderTasksRequest
+    ReorderTasksRequest,
+    ExecuteQueueRequest
 )
 from app.schemas.notification import (
     NotificationCreate,
@@ -36,8 +40,17 @@ from app.schemas.notification import (
 from app.schemas.task_execution_log import (
     TaskExecutionLogCreate,
     TaskExecutionLogUpdate,
+    TaskExecutionLogSummary,
     TaskExecutionLog
 )
+from app.schemas.search import (
+    SearchResponse,
+    RebuildSearchIndexRequest
+)
+from app.schemas.stream import (
+    StreamSubscriptionUpdate,
+    StreamSubscription
+)
 
 __all__ = [
     "WorkspaceCreate",
@@ -54,12 +67,16 @@ __all__ = [
     "HookConfigUpdate",
     "HookConfigResponse",
     "HookConfigListResponse",
+    "HookDeliveryResponse",
+    "HookDestinationResponse",
+    "HookDestinationReset",
     "TaskQueueCreate",
     "TaskQueueResponse",
     "TaskQueueDetailResponse",
     "TaskQueueListResponse",
     "AddTasksToQueueRequest",
     "ReorderTasksRequest",
+    "ExecuteQueueRequest",
     "NotificationCreate",
     "NotificationResponse",
     "NotificationListResponse",
@@ -67,5 +84,10 @@ __all__ = [
     "UnreadCountResponse",
     "TaskExecutionLogCreate",
     "TaskExecutionLogUpdate",
-    "TaskExecutionLog"
+    "TaskExecutionLogSummary",
+    "TaskExecutionLog",
+    "SearchResponse",
+    "RebuildSearchIndexRequest",
+    "StreamSubscriptionUpdate",
+    "StreamSubscription"
 ]
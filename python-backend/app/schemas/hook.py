@@ -41,3 +41,50 @@ class HookConfigResponse(HookConfigBase):
 
 class HookConfigListResponse(BaseModel):
     hooks: list[HookConfigResponse]
+
+class HookDeliveryResponse(BaseModel):
+    """hook 投递记录（请求体见 payload）"""
+    id: str
+    task_id: str
+    execution_id: Optional[str] = None
+    hook_config_id: Optional[str] = None
+    event: str
+    method: str = "POST"
+    url: str
+    payload: str
+    status: str
+    attempts: int = 0
+    next_attempt_at: Optional[datetime] = None
+    last_status_code: Optional[int] = None
+    last_error: Optional[str] = None
+    delivered_at: Optional[datetime] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class HookDestinationResponse(BaseModel):
+    """hook 接收地址的健康状况和熔断状态"""
+    destination: str
+    state: str  # closed, open, half_open
+    consecutive_failures: int = 0
+    open_count: int = 0
+    open_until: Optional[datetime] = None
+    total_successes: int = 0
+    total_failures: int = 0
+    success_rate: Optional[float] = None
+    avg_latency_ms: Optional[float] = None
+    last_latency_ms: Optional[float] = None
+    last_status_code: Optional[int] = None
+    last_error: Optional[str] = None
+    last_success_at: Optional[datetime] = None
+    last_failure_at: Optional[datetime] = None
+    opened_at: Optional[datetime] = None
+    pending_deliveries: int = 0
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class HookDestinationReset(BaseModel):
+    destination: str = Field(..., description="接收地址，例如 https://example.com:443")
@@ -28,11 +28,12 @@ class NotificationResponse(NotificationBase):
         from_attributes = True
 
 class NotificationListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # include_total=false 时不统计
     unread_count: int
     page: int
     page_size: int
     notifications: list[NotificationResponse]
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多数据时为空
 
 class BatchReadRequest(BaseModel):
     notification_ids: list[str] = Field(..., min_items=1)
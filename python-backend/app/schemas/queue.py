@@ -15,15 +15,29 @@ class TaskStatusEnum(str, Enum):
     completed = "completed"
     failed = "failed"
 
+class FailurePolicyEnum(str, Enum):
+    continue_ = "continue"
+    stop = "stop"
+
+class ExecuteModeEnum(str, Enum):
+    resume = "resume"
+    restart = "restart"
+
 class TaskQueueBase(BaseModel):
     name: str = Field(..., min_length=1)
 
 class TaskQueueCreate(TaskQueueBase):
     task_ids: list[str] = Field(..., min_items=1)
+    # 任务依赖 {task_id: [依赖的 task_id]}，未声明依赖的任务可以并行执行
+    dependencies: Optional[dict[str, list[str]]] = None
+    max_parallelism: int = Field(1, ge=1)
+    failure_policy: FailurePolicyEnum = FailurePolicyEnum.continue_
 
 class TaskQueueResponse(TaskQueueBase):
     id: str
     status: QueueStatusEnum
+    max_parallelism: int = 1
+    failure_policy: FailurePolicyEnum = FailurePolicyEnum.continue_
     progress: int = 0
     total_tasks: int
     completed_tasks: int
@@ -40,6 +54,7 @@ class QueueTaskResponse(BaseModel):
     name: str
     status: TaskStatusEnum
     error_reason: Optional[str] = None
+    depends_on: list[str] = []
 
     class Config:
         from_attributes = True
@@ -48,13 +63,20 @@ class TaskQueueDetailResponse(TaskQueueResponse):
     tasks: list[QueueTaskResponse]
 
 class TaskQueueListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # include_total=false 时不统计
     page: int
     page_size: int
     queues: list[TaskQueueResponse]
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多数据时为空
+
+class ExecuteQueueRequest(BaseModel):
+    # resume - 跳过已完成的任务，重试失败 / 中断的任务并继续未执行的任务；restart - 从头执行全部任务
+    mode: ExecuteModeEnum = ExecuteModeEnum.resume
 
 class AddTasksToQueueRequest(BaseModel):
     task_ids: list[str] = Field(..., min_items=1)
+    # 新增任务的依赖，可以依赖队列中已有的任务
+    dependencies: Optional[dict[str, list[str]]] = None
 
 class ReorderTasksRequest(BaseModel):
     task_orders: list[dict[str, int]] = Field(..., min_items=1)
@@ -0,0 +1,45 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class TaskSearchHit(BaseModel):
+    id: str
+    workspace_id: str
+    title: str
+    status: str
+    priority: str
+    snippet: Optional[str] = None
+    rank: float = 0
+    created_at: Optional[datetime] = None
+
+class NotificationSearchHit(BaseModel):
+    id: str
+    type: str
+    title: str
+    related_task_id: Optional[str] = None
+    is_read: bool
+    snippet: Optional[str] = None
+    rank: float = 0
+    created_at: Optional[datetime] = None
+
+class ExecutionLogSearchHit(BaseModel):
+    task_id: str
+    task_title: str
+    workspace_id: str
+    execution_number: int
+    seq: int  # 命中的消息序号
+    response_type: Optional[str] = None
+    snippet: Optional[str] = None
+    rank: float = 0
+    created_at: Optional[datetime] = None
+
+class SearchResponse(BaseModel):
+    query: str
+    # 检索词过短（少于 3 个字符）时退化为标题模糊匹配，不搜索执行日志
+    fulltext: bool = True
+    tasks: list[TaskSearchHit] = []
+    notifications: list[NotificationSearchHit] = []
+    execution_logs: list[ExecutionLogSearchHit] = []
+
+class RebuildSearchIndexRequest(BaseModel):
+    indexes: Optional[list[str]] = None
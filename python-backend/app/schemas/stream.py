@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+class StreamSubscriptionUpdate(BaseModel):
+    # 替换连接的订阅范围（不是增量），两者都为空时连接保持但不再推送消息
+    task_ids: list[str] = []
+    workspace_ids: list[str] = []
+
+class StreamSubscription(BaseModel):
+    connection_id: str
+    task_ids: list[str] = []
+    workspace_ids: list[str] = []
+    forwarded: bool = False  # 连接不在处理请求的进程中，变更已经消息代理转发，生效后连接上会推送 subscription_updated
@@ -59,15 +59,18 @@ class TaskResponse(TaskBase):
         from_attributes = True
 
 class TaskListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # include_total=false 时不统计
     page: int
     page_size: int
     tasks: list[TaskResponse]
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多数据时为空
 
 class TaskDispatchRequest(BaseModel):
+    # 支持 timeout_seconds / max_messages / max_cost_usd 覆盖全局执行限制（不传使用全局默认值，0 表示不限制）
     execution_params: Optional[dict] = None
 
 class TaskDispatchResponse(BaseModel):
     execution_id: str
     dispatch_time: datetime
     status: StatusEnum
+    queue_position: int = 0  # 0 表示已开始执行，N 表示在执行队列中排第 N 位
@@ -17,10 +17,24 @@ class TaskExecutionLogUpdate(BaseModel):
     response_content: Optional[str] = None
     status: Optional[str] = None
 
-class TaskExecutionLog(TaskExecutionLogBase):
+class TaskExecutionLogSummary(BaseModel):
+    """执行日志列表项，不包含消息内容"""
     id: str
+    task_id: str
+    execution_number: int
+    response_type: Optional[str] = None
+    status: Optional[str] = None
+    thread_id: Optional[str] = None
+    thread_number: Optional[int] = None
+    message_count: int = 0
+    content_bytes: int = 0  # 消息未压缩时的总字节数
+    cost_usd: Optional[float] = None
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
+
+class TaskExecutionLog(TaskExecutionLogSummary):
+    response_content: Optional[str] = None  # 消息列表（JSON），按 offset / limit 读取时只包含该范围
+    offset: int = 0
@@ -32,7 +32,8 @@ class WorkspaceResponse(WorkspaceBase):
         from_attributes = True
 
 class WorkspaceListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # include_total=false 时不统计
     page: int
     page_size: int
     workspaces: list[WorkspaceResponse]
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多数据时为空
@@ -0,0 +1,354 @@
+"""
+Claude Agent 任务执行器
+负责调用 Claude Agent SDK 执行任务、推送实时消息流、触发 hooks 并保存执行日志
+hooks 在执行开始时按规则解析一次（app.services.hook_engine），写入投递发件箱后由后台投递器发送，接收方响应慢不影响执行
+"""
+import os
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config import settings
+from app.models import Task
+from app.services.execution_log_store import open_execution_log_writer
+from app.services.hook_engine import ExecutionHooks, resolve_execution_hooks
+
+# task.execution_output 保存的输出长度上限
+EXECUTION_OUTPUT_LIMIT = 5000
+
+
+@dataclass
+class ExecutionLimits:
+    """单次执行的限制，0 表示不限制"""
+    timeout_seconds: float = 0
+    max_messages: int = 0
+    max_cost_usd: float = 0
+
+
+class ExecutionLimitExceeded(Exception):
+    """执行超出消息数 / 费用限制"""
+
+
+def resolve_execution_limits(execution_params: Optional[dict] = None) -> ExecutionLimits:
+    """
+    合并全局默认限制与任务级覆盖（execution_params 中的 timeout_seconds / max_messages / max_cost_usd）
+    未设置（None）时使用全局默认值，设置为 0 表示该任务不限制
+    """
+    params = execution_params or {}
+
+    def override(key: str, default):
+        value = params.get(key)
+        return default if value is None else value
+
+    return ExecutionLimits(
+        timeout_seconds=float(override("timeout_seconds", settings.execution_timeout_seconds)),
+        max_messages=int(override("max_messages", settings.execution_max_messages)),
+        max_cost_usd=float(override("max_cost_usd", settings.execution_max_cost_usd))
+    )
+
+
+def _failed_stop_hook_payload(task: Task, task_id: str, error_message: str, cancelled: bool = False) -> dict:
+    """执行失败 / 取消时结束 hook 的内容"""
+    return {
+        "task_id": task_id,
+        "execution_id": task.execution_id,
+        "status": "failed",
+        "is_error": True,
+        "cancelled": cancelled,
+        "error_message": error_message
+    }
+
+
+async def execute_claude_agent_task_async(
+    task_id: str,
+    workspace_path: str,
+    task_description: str,
+    limits: Optional[ExecutionLimits] = None
+):
+    """
+    使用 Claude Agent SDK 异步执行任务，支持 hooks 回调和实时消息流
+    被取消（用户取消 / 执行超时）或超出消息数、费用限制时，会终止 Agent 子进程、触发结束 hook 并保存已产生的日志
+    数据库读写使用异步会话，执行日志提交时不阻塞事件循环（其它执行和 SSE 推送）
+    """
+    from app.database import AsyncSessionLocal
+    from app.services.executor import agent_executor
+    from app.utils.message_stream import message_stream_manager
+    import logging
+
+    logger = logging.getLogger(__name__)
+    db = AsyncSessionLocal()
+    limits = limits or resolve_execution_limits()
+
+    # 收集输出和状态（输出只保留 execution_output 需要的前 EXECUTION_OUTPUT_LIMIT 个字符）
+    output_lines = []
+    output_size = 0
+    log_writer = open_execution_log_writer(task_id)  # 消息分批写入执行日志，不在内存中累积
+    task_status = "completed"
+    error_message = None
+    workspace_id = None  # 加载任务后设置，用于推送给订阅整个工作区的多路连接
+    hooks: Optional[ExecutionHooks] = None  # 本次执行适用的 hooks，加载任务后解析一次
+    stop_hook_payload = None  # 收到 ResultMessage 时生成，与任务最终状态一起写入投递发件箱
+
+    async def publish(stream_message: dict):
+        """写入执行日志并推送到实时消息流，事件 ID 为消息在执行日志中的位置"""
+        event_id = await log_writer.add(stream_message)
+        await message_stream_manager.add_message(
+            task_id, stream_message, event_id=event_id, workspace_id=workspace_id
+        )
+
+    async def load_task() -> Optional[Task]:
+        """从数据库重新读取任务（会话提交后不过期对象，需要显式刷新）"""
+        return await db.get(Task, task_id, populate_existing=True)
+
+    async def enqueue_hooks(task: Task, hook_type: str, payload: dict, status: Optional[str] = None):
+        """为匹配的 hooks 写入投递（由调用方与任务状态一起提交）"""
+        nonlocal hooks
+        if hooks is None:
+            hooks = await db.run_sync(resolve_execution_hooks, task)
+        count = await db.run_sync(hooks.enqueue, hook_type, payload, status)
+        if count:
+            logger.info(f"任务 {task_id} 写入 {count} 个{'开始' if hook_type == 'start' else '结束'} hook")
+
+    async def fail_execution(message: str, cancelled: bool = False):
+        """标记任务失败并写入结束 hook，推送结束消息"""
+        nonlocal task_status
+        task_status = "failed"
+        task = await load_task()
+        if task:
+            task.status = "failed"
+            task.error_message = message
+            await enqueue_hooks(task, "stop", _failed_stop_hook_payload(task, task_id, message, cancelled), "failed")
+            await db.commit()
+
+        stream_message = {
+            "type": "ResultMessage",
+            "is_error": True,
+            "cancelled": cancelled,
+            "message": message,
+            "progress": 100
+        }
+        await publish(stream_message)
+
+    try:
+        from claude_agent_sdk import query, ClaudeAgentOptions, ResultMessage, SystemMessage, AssistantMessage, UserMessage
+
+        # 检查 API Key
+        if not settings.anthropic_api_key:
+            raise ValueError("ANTHROPIC_API_KEY 未配置，请在 .env 文件中设置")
+
+        # 设置环境变量
+        os.environ["ANTHROPIC_API_KEY"] = settings.anthropic_api_key
+
+        # 获取任务信息（包括 hooks）
+        task = await load_task()
+        if not task:
+            logger.error(f"任务 {task_id} 不存在")
+            return
+
+        workspace_id = task.workspace_id
+        # 解析工作区级、任务级 hooks 和任务自身的 start / stop hook
+        hooks = await db.run_sync(resolve_execution_hooks, task)
+
+        # 执行开始 hook（写入投递发件箱，由后台投递器发送）
+        if hooks.has("start"):
+            await enqueue_hooks(task, "start", {
+                "task_id": task_id,
+                "execution_id": task.execution_id,
+                "status": "started",
+                "workspace_path": workspace_path
+            })
+            await db.commit()
+
+        # 配置 Agent 选项
+        options = ClaudeAgentOptions(
+            allowed_tools=["Read", "Write", "Edit", "Bash"],
+            permission_mode='acceptEdits',  # 自动接受编辑
+            cwd=workspace_path  # 设置工作目录
+        )
+
+        logger.info(f"开始执行任务 {task_id}: {task_description}")
+        logger.info(f"工作目录: {workspace_path}")
+
+        # 推送初始消息
+        await publish({
+            "type": "init",
+            "message": f"任务开始执行: {task_description}",
+            "workspace": workspace_path
+        })
+
+        is_task_started = False
+        message_count = 0
+        progress = 0
+
+        # 使用 Claude Agent SDK 执行任务
+        # 显式持有消息迭代器，取消或超限时通过 aclose() 关闭，由 SDK 终止 Agent 子进程
+        agent_stream = query(
+            prompt=task_description,
+            options=options
+        )
+        try:
+            async for message in agent_stream:
+                # 记录消息
+                if output_size < EXECUTION_OUTPUT_LIMIT:
+                    output_lines.append(str(message))
+                    output_size += len(output_lines[-1]) + 1
+                logger.info(f"Agent 消息类型: {type(message).__name__}")
+                message_count += 1
+
+                # 构建推送消息
+                stream_message = {
+                    "type": type(message).__name__,
+                    "raw": str(message)[:500]  # 限制长度
+                }
+
+                # 根据消息类型添加额外信息并计算进度
+                if isinstance(message, SystemMessage):
+                    if hasattr(message, 'subtype'):
+                        stream_message["subtype"] = message.subtype
+                        if message.subtype == 'init':
+                            is_task_started = True
+                            stream_message["message"] = "Claude Agent 已初始化"
+                            progress = 10
+                            stream_message["progress"] = progress
+
+                elif isinstance(message, AssistantMessage):
+                    # 提取文本内容
+                    texts = []
+                    for block in message.content:
+                        if hasattr(block, 'text'):
+                            texts.append(block.text)
+                    if texts:
+                        stream_message["text"] = "\n".join(texts)
+                    # 根据消息数量动态增加进度（10% - 90%之间）
+                    progress = min(10 + (message_count * 8), 90)
+                    stream_message["progress"] = progress
+
+                elif isinstance(message, ResultMessage):
+                    cost = getattr(message, 'total_cost_usd', None) or 0
+                    # 费用只在 ResultMessage 中给出，超出限制时执行视为失败
+                    cost_exceeded = bool(limits.max_cost_usd) and cost >= limits.max_cost_usd
+                    stream_message["is_error"] = message.is_error or cost_exceeded
+                    stream_message["duration_ms"] = getattr(message, 'duration_ms', 0)
+                    stream_message["cost_usd"] = cost
+
+                    # 判断任务状态
+                    if cost_exceeded:
+                        task_status = "failed"
+                        error_message = f"任务已终止: 超出费用限制（${limits.max_cost_usd}，实际 ${cost}）"
+                        stream_message["limit_exceeded"] = True
+                        stream_message["message"] = error_message
+                        logger.warning(f"任务 {task_id} 超出执行限制: {error_message}")
+                        progress = 100
+                        stream_message["progress"] = progress
+                    elif message.is_error:
+                        task_status = "failed"
+                        error_message = getattr(message, 'result', '执行失败')
+                        stream_message["message"] = f"任务执行失败: {error_message}"
+                        logger.error(f"任务 {task_id} 执行失败: {error_message}")
+                        progress = 100
+                        stream_message["progress"] = progress
+                    else:
+                        task_status = "completed"
+                        stream_message["message"] = "任务执行成功"
+                        logger.info(f"任务 {task_id} 执行成功")
+                        progress = 100
+                        stream_message["progress"] = progress
+
+                    # 执行结束 hook，保存任务最终状态时写入投递发件箱
+                    if hooks.has("stop"):
+                        stop_hook_payload = {
+                            "task_id": task_id,
+                            "execution_id": task.execution_id,
+                            "status": task_status,
+                            "is_error": stream_message["is_error"],
+                            "duration_ms": getattr(message, 'duration_ms', 0),
+                            "total_cost_usd": getattr(message, 'total_cost_usd', 0),
+                            "error_message": error_message
+                        }
+
+                # 写入执行日志（分批提交）并推送消息到流
+                await publish(stream_message)
+
+                # 检查消息数限制（ResultMessage 表示执行已结束，费用限制在上面按其中的总费用判断）
+                if not isinstance(message, ResultMessage):
+                    if limits.max_messages and message_count >= limits.max_messages:
+                        raise ExecutionLimitExceeded(f"超出消息数限制（{limits.max_messages} 条）")
+        finally:
+            await agent_stream.aclose()
+
+        # 合并输出
+        full_output = "\n".join(output_lines)
+
+        # 更新任务状态
+        task = await load_task()
+        if task:
+            task.status = task_status
+            task.execution_output = full_output[:EXECUTION_OUTPUT_LIMIT] if full_output else None
+            task.error_message = error_message
+            if stop_hook_payload:
+                await enqueue_hooks(task, "stop", stop_hook_payload, task_status)
+            await db.commit()
+            logger.info(f"任务 {task_id} 最终状态: {task_status}")
+
+    except asyncio.CancelledError:
+        if agent_executor.is_interrupted(task_id):
+            # 进程退出：任务保持 progress，作业交还给执行队列，由其它 worker 或重启后的进程重新执行
+            task_status = "interrupted"
+            logger.warning(f"任务 {task_id} 的执行因服务停止中断")
+            await publish({"type": "interrupted", "message": "服务停止，执行已中断，任务将重新执行"})
+            raise
+        # 用户取消或执行超时（由执行池 watchdog 触发）
+        reason = agent_executor.get_cancel_reason(task_id) or "执行被取消"
+        logger.warning(f"任务 {task_id} 已取消: {reason}")
+        await fail_execution(f"任务已取消: {reason}", cancelled=True)
+        raise
+
+    except ExecutionLimitExceeded as e:
+        logger.warning(f"任务 {task_id} 超出执行限制: {str(e)}")
+        await fail_execution(f"任务已终止: {str(e)}")
+
+    except ValueError as e:
+        # API Key 未配置
+        logger.error(f"任务 {task_id} 配置错误: {str(e)}")
+        task = await load_task()
+        if task:
+            task.status = "failed"
+            task.error_message = str(e)
+            # 执行结束 hook（失败）
+            await enqueue_hooks(task, "stop", _failed_stop_hook_payload(task, task_id, str(e)), "failed")
+            await db.commit()
+
+    except Exception as e:
+        # 其他错误
+        logger.error(f"任务 {task_id} 执行异常: {str(e)}", exc_info=True)
+        task = await load_task()
+        if task:
+            task.status = "failed"
+            task.error_message = f"执行异常: {str(e)}"
+            # 执行结束 hook（失败）
+            await enqueue_hooks(task, "stop", _failed_stop_hook_payload(task, task_id, str(e)), "failed")
+            await db.commit()
+
+    finally:
+        # 写入剩余消息并结束执行日志（取消或超限时保留已产生的部分日志）
+        try:
+            task = await load_task()
+            if task and task_status == "failed" and output_lines and not task.execution_output:
+                task.execution_output = "\n".join(output_lines)[:EXECUTION_OUTPUT_LIMIT]
+
+            await db.commit()
+
+            # 使用任务最终状态作为response_type，中断的执行日志标记为失败
+            execution_number = await log_writer.finish(
+                response_type=task_status,
+                status="failed" if task_status == "interrupted" else "completed"
+            )
+            if execution_number:
+                logger.info(f"任务 {task_id} 执行日志已保存 (第 {execution_number} 次执行)")
+        except Exception as log_error:
+            logger.error(f"保存执行日志失败: {str(log_error)}")
+        finally:
+            await log_writer.close()
+            await db.close()
+            message_stream_manager.finish_task(task_id)
+            logger.info(f"任务 {task_id} 执行流程结束")
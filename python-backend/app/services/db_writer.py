@@ -0,0 +1,156 @@
+"""
+数据库单一写入线程（组提交）
+SQLite 同一时刻只允许一个写事务，大量并发执行各自提交小写入时会反复争抢写锁并产生 "database is locked"。
+开启 SQLITE_WRITER_ENABLED 后，执行日志等小写入交给唯一的写入线程：线程把队列中的写操作合并到同一个事务，
+攒够 batch_size 个或等待超过 max_delay 后一次提交，多个执行的写入共享一次提交（组提交）。
+写操作是 fn(session, *args) 形式的同步函数，在写入线程中执行，返回值应为普通数据（提交后会话即关闭，不要返回 ORM 对象）。
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+WriteJob = Tuple[Callable[..., Any], tuple, Future]
+
+
+class DatabaseWriterStopped(Exception):
+    """写入线程未启动或已停止"""
+
+
+class DatabaseWriter:
+    """单一写入线程：合并并发的小写入，一次事务提交一批"""
+
+    def __init__(self, batch_size: Optional[int] = None, max_delay_ms: Optional[float] = None, bind=None):
+        self.batch_size = max(1, batch_size or settings.sqlite_writer_batch_size)
+        self.max_delay = (max_delay_ms if max_delay_ms is not None else settings.sqlite_writer_max_delay_ms) / 1000
+        self._bind = bind
+        self._session_factory: Optional[sessionmaker] = None
+        self._queue: "queue.Queue[Optional[WriteJob]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.jobs = 0
+        self.commits = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        if self._session_factory is None:
+            from app.database import engine
+
+            self._session_factory = sessionmaker(bind=self._bind or engine, autoflush=False, expire_on_commit=False)
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"数据库写入线程已启动（每批最多 {self.batch_size} 个写操作，最长等待 {self.max_delay * 1000:g} 毫秒）")
+
+    def stop(self, timeout: float = 10.0):
+        """写完队列中剩余的写操作后停止"""
+        if not self.running:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        """提交一个写操作，返回在其所在批次提交后完成的 Future"""
+        if not self.running:
+            raise DatabaseWriterStopped("数据库写入线程未启动")
+        future: Future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """在写入线程中执行写操作并等待提交，不阻塞事件循环"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": self._queue.qsize(),
+            "jobs": self.jobs,
+            "commits": self.commits,
+            "failed": self.failed,
+            "batch_size": self.batch_size,
+            "max_delay_ms": self.max_delay * 1000
+        }
+
+    def _next_batch(self) -> Tuple[List[WriteJob], bool]:
+        """阻塞等待第一个写操作，再在 max_delay 内继续收集，返回 (写操作, 是否收到停止信号)"""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                job = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if job is None:
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            self._commit_batch(self._claim(batch))
+        # 停止信号之后仍提交的写操作
+        remaining = []
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                remaining.append(job)
+        self._commit_batch(self._claim(remaining))
+
+    @staticmethod
+    def _claim(batch: List[WriteJob]) -> List[WriteJob]:
+        """跳过等待方已取消的写操作，其余标记为执行中（之后不能再被取消）"""
+        return [job for job in batch if job[2].set_running_or_notify_cancel()]
+
+    def _commit_batch(self, batch: List[WriteJob]):
+        if not batch:
+            return
+        session: Session = self._session_factory()
+        try:
+            results = [fn(session, *args) for fn, args, _ in batch]
+            session.commit()
+        except Exception as error:
+            session.rollback()
+            if len(batch) > 1:
+                # 逐个重试，只让出错的写操作失败
+                session.close()
+                for job in batch:
+                    self._commit_batch([job])
+                return
+            self.failed += 1
+            logger.error(f"数据库写操作失败: {str(error)}")
+            batch[0][2].set_exception(error)
+            return
+        finally:
+            session.close()
+
+        self.jobs += len(batch)
+        self.commits += 1
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+# 全局写入线程，SQLITE_WRITER_ENABLED 时在启动时开启
+db_writer = DatabaseWriter()
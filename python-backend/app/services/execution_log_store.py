@@ -0,0 +1,476 @@
+"""
+执行日志消息存储
+执行过程按消息逐条追加到 task_execution_messages（zlib 压缩的 JSON），不再把整段对话序列化后反复覆盖写入
+task_execution_logs.response_content；读取时按序号重建或分页。
+Agent 执行中由 ExecutionLogWriter（异步代码中使用 AsyncExecutionLogWriter）分批提交消息，进程崩溃时只丢失未提交的最后一批，其它进程也能读取执行中的日志。
+异步写入器另有定时提交，执行长时间没有新消息（例如耗时的工具调用）时，缓存的消息最多等待 flush_interval 秒。
+开启数据库写入线程时使用 GroupCommitExecutionLogWriter，多个执行的批次由写入线程合并提交。
+旧版整段保存的日志在启动时迁移为逐条消息。
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import time
+import uuid
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import TaskExecutionLog, TaskExecutionMessage
+
+logger = logging.getLogger(__name__)
+
+# Agent 执行（会推送实时消息流）产生的执行日志类型：执行中，或以任务最终状态结束
+STREAMED_RESPONSE_TYPES = ("running", "completed", "failed", "interrupted")
+
+# 写入全文索引时从消息中提取的文本字段
+_TEXT_FIELDS = ("text", "message", "content", "result")
+
+
+def encode_message(message: dict) -> bytes:
+    return zlib.compress(json.dumps(message, ensure_ascii=False).encode("utf-8"))
+
+
+def decode_message(payload: bytes) -> dict:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def message_text(message: dict) -> str:
+    """提取消息中可搜索的文本"""
+    texts = [str(message[field]) for field in _TEXT_FIELDS if isinstance(message.get(field), str) and message[field]]
+    if not texts and message.get("raw"):
+        texts.append(str(message["raw"]))
+    return "\n".join(texts)
+
+
+def next_execution_number(db: Session, task_id: str) -> int:
+    max_execution = db.query(func.max(TaskExecutionLog.execution_number)).filter(
+        TaskExecutionLog.task_id == task_id
+    ).scalar()
+    return (max_execution or 0) + 1
+
+
+def create_execution_log(
+    db: Session,
+    task_id: str,
+    response_type: str,
+    status: str = "completed",
+    messages: Optional[List[dict]] = None,
+    thread_id: Optional[str] = None,
+    thread_number: Optional[int] = None
+) -> TaskExecutionLog:
+    """创建一条执行记录并追加消息（只 flush，由调用方提交事务）"""
+    execution_log = TaskExecutionLog(
+        id=str(uuid.uuid4()),
+        task_id=task_id,
+        execution_number=next_execution_number(db, task_id),
+        response_type=response_type,
+        status=status,
+        thread_id=thread_id,
+        thread_number=thread_number,
+        message_count=0,
+        content_bytes=0,
+        cost_usd=0.0
+    )
+    db.add(execution_log)
+    db.flush()
+    if messages:
+        append_messages(db, execution_log, messages)
+    return execution_log
+
+
+def message_cost(message: dict) -> float:
+    """消息携带的执行费用（ResultMessage 的 cost_usd），没有时为 0"""
+    cost = message.get("cost_usd")
+    return float(cost) if isinstance(cost, (int, float)) else 0.0
+
+
+def append_messages(db: Session, execution_log: TaskExecutionLog, messages: Iterable[dict]):
+    """按顺序追加消息，更新消息数、内容大小和费用并写入全文索引（只 flush，由调用方提交事务）"""
+    from app.services.search import index_execution_messages
+
+    messages = list(messages)
+    rows = []
+    seq = execution_log.message_count or 0
+    size = 0
+    cost = 0.0
+    for message in messages:
+        payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+        size += len(payload)
+        cost += message_cost(message)
+        rows.append(TaskExecutionMessage(
+            execution_log_id=execution_log.id,
+            seq=seq,
+            message_type=message.get("type"),
+            payload=zlib.compress(payload)
+        ))
+        seq += 1
+    if not rows:
+        return
+
+    db.add_all(rows)
+    execution_log.message_count = seq
+    execution_log.content_bytes = (execution_log.content_bytes or 0) + size
+    if cost or execution_log.cost_usd is None:
+        execution_log.cost_usd = (execution_log.cost_usd or 0.0) + cost
+    db.flush()
+
+    index_execution_messages(db, [(row.id, message_text(message)) for row, message in zip(rows, messages)])
+
+
+class ExecutionLogWriter:
+    """
+    执行中的日志分批写入：首条消息到达时创建状态为 running 的执行记录并立即提交（确定执行次数），
+    之后消息先缓存，攒够 batch_size 条或距上次提交超过 flush_interval 秒时追加并提交
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        task_id: str,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ):
+        from app.config import settings
+
+        self.db = db
+        self.task_id = task_id
+        self.batch_size = batch_size or settings.execution_log_flush_batch_size
+        self.flush_interval = flush_interval if flush_interval is not None else settings.execution_log_flush_interval_seconds
+        self.execution_log: Optional[TaskExecutionLog] = None
+        self._pending: List[dict] = []
+        self._last_flush = time.monotonic()
+
+    def add(self, message: dict) -> Tuple[int, int]:
+        """缓存一条消息，返回 (执行次数, 消息序号)，即该消息在执行日志中的位置"""
+        if self.execution_log is None:
+            self.execution_log = create_execution_log(self.db, self.task_id, response_type="running", status="running")
+            self.db.commit()
+        position = (self.execution_log.execution_number, (self.execution_log.message_count or 0) + len(self._pending))
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return position
+
+    def flush(self):
+        """追加缓存的消息并提交"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        append_messages(self.db, self.execution_log, self._pending)
+        self._pending = []
+        self.db.commit()
+
+    def finish(self, response_type: str, status: str = "completed") -> Optional[TaskExecutionLog]:
+        """写入剩余消息并结束执行记录，没有任何消息时不创建记录"""
+        self.flush()
+        if self.execution_log is not None:
+            self.execution_log.response_type = response_type
+            self.execution_log.status = status
+        self.db.commit()
+        return self.execution_log
+
+
+class _FlushTimer:
+    """
+    异步写入器的定时提交：add 只在新消息到达时判断是否提交，首条消息后另起后台任务每隔 flush_interval 秒提交缓存
+    add / flush / finish 与定时提交由 _lock 串行执行
+    """
+
+    flush_interval: float
+    _lock: asyncio.Lock
+    _flush_task: Optional[asyncio.Task] = None
+
+    def _has_pending(self) -> bool:
+        raise NotImplementedError
+
+    def _start_flush_timer(self):
+        if self._flush_task is None and self.flush_interval > 0:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self._has_pending():
+                continue
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"定时写入执行日志失败: {str(e)}")
+
+    async def _stop_flush_timer(self):
+        """停止定时提交（持有锁时取消，不会中断正在进行的写入）"""
+        if self._flush_task is None:
+            return
+        flush_task, self._flush_task = self._flush_task, None
+        async with self._lock:
+            flush_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await flush_task
+
+
+class AsyncExecutionLogWriter(_FlushTimer):
+    """
+    ExecutionLogWriter 的异步版本：写入在 AsyncSession 中进行，提交时不阻塞事件循环
+    db 由写入器独占使用（定时提交在后台任务中使用该会话），不要与执行的其它数据库操作共用
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        task_id: str,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ):
+        self.db = db
+        self._writer = ExecutionLogWriter(db.sync_session, task_id, batch_size, flush_interval)
+        self.flush_interval = self._writer.flush_interval
+        self._lock = asyncio.Lock()
+
+    @property
+    def execution_log(self) -> Optional[TaskExecutionLog]:
+        return self._writer.execution_log
+
+    def _has_pending(self) -> bool:
+        return bool(self._writer._pending)
+
+    async def _run(self, write):
+        async def locked_write():
+            async with self._lock:
+                return await self.db.run_sync(lambda _: write())
+
+        # 等待方被取消（取消执行）时写入仍要完成：中途取消会使会话的事务失效，之后的写入全部失败
+        return await asyncio.shield(locked_write())
+
+    async def add(self, message: dict) -> Tuple[int, int]:
+        position = await self._run(lambda: self._writer.add(message))
+        self._start_flush_timer()
+        return position
+
+    async def flush(self):
+        await self._run(self._writer.flush)
+
+    async def finish(self, response_type: str, status: str = "completed") -> Optional[int]:
+        """写入剩余消息并结束执行记录，返回执行次数，没有任何消息时不创建记录"""
+        await self._stop_flush_timer()
+        execution_log = await self._run(lambda: self._writer.finish(response_type, status))
+        return execution_log.execution_number if execution_log else None
+
+    async def close(self):
+        """停止定时提交并关闭会话（未调用 finish 时缓存的消息不再写入）"""
+        await self._stop_flush_timer()
+        await self.db.close()
+
+
+def _create_running_log(db: Session, task_id: str) -> Tuple[str, int]:
+    execution_log = create_execution_log(db, task_id, response_type="running", status="running")
+    return execution_log.id, execution_log.execution_number
+
+
+def _append_to_log(db: Session, execution_log_id: str, messages: List[dict]):
+    append_messages(db, db.get(TaskExecutionLog, execution_log_id), messages)
+
+
+def _finish_log(db: Session, execution_log_id: str, response_type: str, status: str):
+    execution_log = db.get(TaskExecutionLog, execution_log_id)
+    execution_log.response_type = response_type
+    execution_log.status = status
+
+
+class GroupCommitExecutionLogWriter(_FlushTimer):
+    """
+    经数据库写入线程（app.services.db_writer）写入的执行日志：分批规则与 ExecutionLogWriter 相同，
+    但批次不在执行自己的会话中提交，而是与其它执行的写入合并为一次提交
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        writer=None
+    ):
+        from app.config import settings
+        from app.services.db_writer import db_writer
+
+        self.task_id = task_id
+        self.batch_size = batch_size or settings.execution_log_flush_batch_size
+        self.flush_interval = flush_interval if flush_interval is not None else settings.execution_log_flush_interval_seconds
+        self.execution_log_id: Optional[str] = None
+        self.execution_number: Optional[int] = None
+        self._writer = writer or db_writer
+        self._message_count = 0
+        self._pending: List[dict] = []
+        self._last_flush = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _has_pending(self) -> bool:
+        return bool(self._pending)
+
+    async def add(self, message: dict) -> Tuple[int, int]:
+        """缓存一条消息，返回 (执行次数, 消息序号)"""
+        async with self._lock:
+            if self.execution_log_id is None:
+                self.execution_log_id, self.execution_number = await self._writer.run(_create_running_log, self.task_id)
+            position = (self.execution_number, self._message_count + len(self._pending))
+            self._pending.append(message)
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                await self._flush()
+        self._start_flush_timer()
+        return position
+
+    async def flush(self):
+        """把缓存的消息交给写入线程并等待提交"""
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        messages, self._pending = self._pending, []
+        self._message_count += len(messages)
+        # 写操作已排队，等待方被取消时仍要写入（写入线程按提交顺序执行，后续批次的序号保持连续）
+        await asyncio.shield(self._writer.run(_append_to_log, self.execution_log_id, messages))
+
+    async def finish(self, response_type: str, status: str = "completed") -> Optional[int]:
+        """写入剩余消息并结束执行记录，返回执行次数，没有任何消息时不创建记录"""
+        await self._stop_flush_timer()
+        if self.execution_log_id is None:
+            return None
+        async with self._lock:
+            await self._flush()
+            await self._writer.run(_finish_log, self.execution_log_id, response_type, status)
+        return self.execution_number
+
+    async def close(self):
+        """停止定时提交（未调用 finish 时缓存的消息不再写入）"""
+        await self._stop_flush_timer()
+
+
+def open_execution_log_writer(task_id: str):
+    """
+    Agent 执行使用的日志写入器：开启数据库写入线程时组提交，否则在写入器自己的异步会话中分批提交
+    （定时提交在后台任务中进行，不能与执行共用会话），执行结束后需调用 close
+    """
+    from app.database import AsyncSessionLocal
+    from app.services.db_writer import db_writer
+
+    if db_writer.running:
+        return GroupCommitExecutionLogWriter(task_id)
+    return AsyncExecutionLogWriter(AsyncSessionLocal(), task_id)
+
+
+def load_messages(
+    db: Session,
+    execution_log: TaskExecutionLog,
+    offset: int = 0,
+    limit: Optional[int] = None
+) -> List[dict]:
+    """按序号读取消息，offset / limit 为消息序号范围"""
+    if execution_log.response_content is not None and not execution_log.message_count:
+        # 尚未迁移的旧版日志
+        messages = _parse_legacy_content(execution_log.response_content)
+        return messages[offset:offset + limit if limit is not None else None]
+
+    query = db.query(TaskExecutionMessage.payload).filter(
+        TaskExecutionMessage.execution_log_id == execution_log.id,
+        TaskExecutionMessage.seq >= offset
+    ).order_by(TaskExecutionMessage.seq)
+    if limit is not None:
+        query = query.limit(limit)
+    return [decode_message(payload) for (payload,) in query.all()]
+
+
+def load_stream_events(
+    db: Session,
+    task_id: str,
+    after: Tuple[int, int],
+    before: Optional[Tuple[int, int]] = None
+) -> List[Tuple[Tuple[int, int], dict]]:
+    """
+    从执行日志中读取 Agent 执行推送过的消息，用于实时消息流断线重连时补发内存中已回收的部分
+    after / before 为 (执行次数, 消息序号)，返回两者之间（不含两端）的 [((执行次数, 消息序号), 消息)]
+    """
+    query = db.query(TaskExecutionLog).filter(
+        TaskExecutionLog.task_id == task_id,
+        TaskExecutionLog.response_type.in_(STREAMED_RESPONSE_TYPES),
+        TaskExecutionLog.execution_number >= after[0]
+    )
+    if before is not None:
+        query = query.filter(TaskExecutionLog.execution_number <= before[0])
+
+    events = []
+    for execution_log in query.order_by(TaskExecutionLog.execution_number).all():
+        number = execution_log.execution_number
+        offset = after[1] + 1 if number == after[0] else 0
+        limit = None
+        if before is not None and number == before[0]:
+            limit = before[1] - offset
+            if limit <= 0:
+                continue
+        for index, message in enumerate(load_messages(db, execution_log, offset=offset, limit=limit)):
+            events.append(((number, offset + index), message))
+    return events
+
+
+def _parse_legacy_content(content: str) -> List[dict]:
+    try:
+        messages = json.loads(content)
+    except (TypeError, ValueError):
+        messages = None
+    if isinstance(messages, list) and all(isinstance(m, dict) for m in messages):
+        return messages
+    # 非 JSON 内容（例如对话出错时保存的错误堆栈）作为一条文本消息
+    return [{"type": "text", "text": content}]
+
+
+def migrate_legacy_logs(db: Session, batch_size: int = 200) -> int:
+    """把旧版整段保存在 response_content 中的日志拆分为逐条消息，返回迁移的日志数"""
+    migrated = 0
+    while True:
+        logs = db.query(TaskExecutionLog).filter(
+            TaskExecutionLog.response_content.isnot(None),
+            TaskExecutionLog.message_count == 0
+        ).limit(batch_size).all()
+        if not logs:
+            break
+        for execution_log in logs:
+            append_messages(db, execution_log, _parse_legacy_content(execution_log.response_content))
+            execution_log.response_content = None
+        db.commit()
+        migrated += len(logs)
+
+    if migrated:
+        logger.info(f"已将 {migrated} 条旧版执行日志迁移为逐条消息")
+    return migrated
+
+
+def backfill_execution_costs(db: Session, batch_size: int = 200) -> int:
+    """为新增费用列之前保存的日志统计费用（从其 ResultMessage 中读取），返回处理的日志数"""
+    filled = 0
+    while True:
+        logs = db.query(TaskExecutionLog).filter(
+            TaskExecutionLog.cost_usd.is_(None)
+        ).limit(batch_size).all()
+        if not logs:
+            break
+        costs = {log.id: 0.0 for log in logs}
+        rows = db.query(TaskExecutionMessage.execution_log_id, TaskExecutionMessage.payload).filter(
+            TaskExecutionMessage.execution_log_id.in_(list(costs)),
+            TaskExecutionMessage.message_type == "ResultMessage"
+        ).all()
+        for execution_log_id, payload in rows:
+            costs[execution_log_id] += message_cost(decode_message(payload))
+        for execution_log in logs:
+            execution_log.cost_usd = costs[execution_log.id]
+        db.commit()
+        filled += len(logs)
+
+    if filled:
+        logger.info(f"已为 {filled} 条执行日志补充费用统计")
+    return filled
@@ -0,0 +1,201 @@
+"""
+Agent 执行池
+限制同时运行的 Claude Agent 执行数量（全局上限 + 每个工作区上限）。
+排队由持久化执行队列（execution_jobs，见 job_queue）负责：作业 worker 只在执行池有空闲槽位时认领作业并提交。
+运行中的执行可以被取消，超过最长运行时间的执行由 watchdog 自动取消。
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorError(Exception):
+    """执行池异常基类"""
+
+
+class ExecutionAlreadyActiveError(ExecutorError):
+    """任务已在执行或排队中"""
+
+
+class ExecutorBacklogFullError(ExecutorError):
+    """执行队列已满"""
+
+
+class ExecutorCapacityError(ExecutorError):
+    """执行池（全局或工作区）没有空闲槽位"""
+
+
+@dataclass
+class Execution:
+    """执行池中的一次执行"""
+    task_id: str
+    workspace_id: str
+    factory: Callable[[], Awaitable[None]]
+    timeout_seconds: Optional[float] = None
+    started_at: Optional[datetime] = None
+    deadline: Optional[datetime] = None
+    cancel_reason: Optional[str] = None
+    interrupted: bool = False  # 进程退出时被中断，执行器不标记任务失败
+    future: Optional[asyncio.Task] = None
+
+
+class AgentExecutor:
+    """有界的 Agent 执行池"""
+
+    def __init__(self, max_concurrent: int, max_per_workspace: int):
+        self.max_concurrent = max_concurrent
+        self.max_per_workspace = max_per_workspace
+        # 正在运行的执行 {task_id: Execution}
+        self.running: Dict[str, Execution] = {}
+        # 每个工作区正在运行的数量 {workspace_id: count}
+        self.workspace_running: Dict[str, int] = {}
+        # 执行槽释放时的回调
+        self.release_listeners: List[Callable[[], None]] = []
+        self._watchdog: Optional[asyncio.Task] = None
+
+    def is_active(self, task_id: str) -> bool:
+        """任务是否正在执行"""
+        return task_id in self.running
+
+    def submit(
+        self,
+        task_id: str,
+        workspace_id: str,
+        factory: Callable[[], Awaitable[None]],
+        timeout_seconds: Optional[float] = None
+    ) -> Execution:
+        """
+        立即开始执行并返回执行记录（execution.future 为执行的 asyncio 任务），调用方负责先检查 has_capacity
+        timeout_seconds: 开始执行后的最长运行时间，超时由 watchdog 取消
+        """
+        if self.is_active(task_id):
+            raise ExecutionAlreadyActiveError(f"任务 {task_id} 正在执行")
+        if not self.has_capacity(workspace_id):
+            raise ExecutorCapacityError("执行池没有空闲槽位")
+
+        execution = Execution(
+            task_id=task_id,
+            workspace_id=workspace_id,
+            factory=factory,
+            timeout_seconds=timeout_seconds
+        )
+        self._start(execution)
+        return execution
+
+    def cancel(self, task_id: str, reason: str) -> bool:
+        """取消运行中的执行（取消其 asyncio 任务，由执行器负责清理子进程并保存日志）"""
+        execution = self.running.get(task_id)
+        if not execution or not execution.future or execution.future.done():
+            return False
+
+        if execution.cancel_reason is None:
+            execution.cancel_reason = reason
+        execution.future.cancel()
+        logger.info(f"任务 {task_id} 已请求取消: {reason}")
+        return True
+
+    def interrupt(self, task_id: str) -> Optional[asyncio.Task]:
+        """
+        进程退出时中断运行中的执行：与取消一样终止 Agent 进程，但不把任务标记为失败，
+        作业交还给执行队列重新执行；返回被中断执行的 asyncio 任务，不存在时返回 None
+        """
+        execution = self.running.get(task_id)
+        if not execution or not execution.future or execution.future.done():
+            return None
+        execution.interrupted = True
+        execution.future.cancel()
+        logger.info(f"任务 {task_id} 已中断（进程退出）")
+        return execution.future
+
+    def is_interrupted(self, task_id: str) -> bool:
+        """运行中的执行是否因进程退出被中断"""
+        execution = self.running.get(task_id)
+        return execution.interrupted if execution else False
+
+    def get_cancel_reason(self, task_id: str) -> Optional[str]:
+        """获取运行中执行的取消原因"""
+        execution = self.running.get(task_id)
+        return execution.cancel_reason if execution else None
+
+    def stats(self) -> dict:
+        """执行池状态"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_per_workspace": self.max_per_workspace,
+            "running": len(self.running),
+            "workspaces": dict(self.workspace_running),
+            "running_tasks": [
+                {
+                    "task_id": e.task_id,
+                    "workspace_id": e.workspace_id,
+                    "started_at": e.started_at,
+                    "deadline": e.deadline
+                }
+                for e in self.running.values()
+            ]
+        }
+
+    def add_release_listener(self, callback: Callable[[], None]):
+        """注册执行槽释放回调（例如唤醒作业 worker 认领下一个作业）"""
+        if callback not in self.release_listeners:
+            self.release_listeners.append(callback)
+
+    def has_capacity(self, workspace_id: str) -> bool:
+        """全局和该工作区是否都还有空闲执行槽"""
+        if len(self.running) >= self.max_concurrent:
+            return False
+        return self.workspace_running.get(workspace_id, 0) < self.max_per_workspace
+
+    def _start(self, execution: Execution):
+        execution.started_at = datetime.now()
+        if execution.timeout_seconds:
+            execution.deadline = execution.started_at + timedelta(seconds=execution.timeout_seconds)
+            self._ensure_watchdog()
+        self.running[execution.task_id] = execution
+        self.workspace_running[execution.workspace_id] = self.workspace_running.get(execution.workspace_id, 0) + 1
+        execution.future = asyncio.create_task(execution.factory())
+        execution.future.add_done_callback(lambda _: self._on_done(execution))
+        logger.info(f"任务 {execution.task_id} 开始执行 (运行中: {len(self.running)})")
+
+    def _on_done(self, execution: Execution):
+        self.running.pop(execution.task_id, None)
+        count = self.workspace_running.get(execution.workspace_id, 0) - 1
+        if count > 0:
+            self.workspace_running[execution.workspace_id] = count
+        else:
+            self.workspace_running.pop(execution.workspace_id, None)
+
+        if execution.future and not execution.future.cancelled() and execution.future.exception():
+            logger.error(f"任务 {execution.task_id} 执行异常退出: {execution.future.exception()}")
+
+        for callback in self.release_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"执行槽释放回调失败: {str(e)}")
+
+    def _ensure_watchdog(self):
+        if self._watchdog is None or self._watchdog.done():
+            self._watchdog = asyncio.create_task(self._run_watchdog())
+
+    async def _run_watchdog(self):
+        """定期检查运行中的执行，取消超过最长运行时间的执行"""
+        while any(e.deadline for e in self.running.values()):
+            now = datetime.now()
+            for execution in list(self.running.values()):
+                if execution.deadline and now >= execution.deadline and execution.cancel_reason is None:
+                    self.cancel(execution.task_id, f"执行超时（超过 {int(execution.timeout_seconds)} 秒）")
+            await asyncio.sleep(settings.execution_watchdog_interval_seconds)
+
+
+# 全局实例
+agent_executor = AgentExecutor(
+    max_concurrent=settings.max_concurrent_executions,
+    max_per_workspace=settings.max_concurrent_executions_per_workspace
+)
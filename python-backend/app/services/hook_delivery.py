@@ -0,0 +1,368 @@
+"""
+hook 投递
+执行过程中的开始 / 结束 hook 不在执行路径上直接发送：enqueue_hook 把请求写入 hook_deliveries 发件箱
+（与任务状态在同一事务中提交），由 HookDispatcher 在后台通过共享的连接池发送。
+- 网络错误、超时或非 2xx 响应按指数退避重试，用完 HOOK_MAX_ATTEMPTS 次后标记为 failed
+- 同一接收地址同时进行的请求数受 HOOK_MAX_CONCURRENCY_PER_DESTINATION 限制，慢速接收方不占用其它地址的投递
+- 每个接收地址的健康状况记录在 hook_destinations，连续失败后熔断，熔断期间的投递保持排队（见 hook_health）
+- 投递通过租约认领，多个进程可以同时运行投递器，进程退出后租约到期的投递由其它进程接管
+投递语义为至少一次，接收方可以用请求头 X-Axis-Delivery-Id 去重。
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import HookConfig, HookDelivery
+from app.services.hook_health import acquire_probe, circuit_states, record_result, release_probe
+
+logger = logging.getLogger(__name__)
+
+# 清理过期投递记录的间隔（秒）
+PRUNE_INTERVAL_SECONDS = 600
+
+
+def destination_of(url: str) -> str:
+    """接收地址（协议 + 主机 + 端口），并发限制和熔断按接收地址计算"""
+    parts = urlsplit(url)
+    port = parts.port or {"http": 80, "https": 443}.get(parts.scheme)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+def enqueue_hook(
+    db: Session,
+    task_id: str,
+    execution_id: Optional[str],
+    event_name: str,
+    url: str,
+    payload: dict,
+    method: str = "POST",
+    headers: Optional[dict] = None,
+    hook_config_id: Optional[str] = None
+) -> HookDelivery:
+    """写入一条待投递的 hook（只加入会话，由调用方与任务状态一起提交，提交后唤醒本进程的投递器）"""
+    delivery = HookDelivery(
+        id=str(uuid.uuid4()),
+        task_id=task_id,
+        execution_id=execution_id,
+        hook_config_id=hook_config_id,
+        event=event_name,
+        method=method,
+        url=url,
+        destination=destination_of(url),
+        headers=json.dumps(headers, ensure_ascii=False) if headers else None,
+        payload=json.dumps(payload, ensure_ascii=False),
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.now()
+    )
+    db.add(delivery)
+    event.listen(db, "after_commit", lambda session: hook_dispatcher.notify(), once=True)
+    return delivery
+
+
+def claim_delivery(db: Session, delivery_id: str, worker_id: str) -> bool:
+    """原子地认领投递：仅当投递已到重试时间，或投递中但租约已过期时才能认领成功"""
+    now = datetime.now()
+    claimed = db.query(HookDelivery).filter(
+        HookDelivery.id == delivery_id,
+        or_(
+            # 扫描后可能已被其它进程投递失败并推迟重试
+            (HookDelivery.status == "pending") & (HookDelivery.next_attempt_at <= now),
+            (HookDelivery.status == "delivering") & (HookDelivery.lease_expires_at < now)
+        )
+    ).update({
+        HookDelivery.status: "delivering",
+        HookDelivery.worker_id: worker_id,
+        HookDelivery.attempts: HookDelivery.attempts + 1,
+        HookDelivery.lease_expires_at: now + timedelta(seconds=settings.hook_delivery_lease_seconds)
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """第 attempts 次尝试失败后的重试间隔：指数退避，上下浮动 20% 避免同时重试"""
+    delay = min(settings.hook_retry_base_seconds * (2 ** max(attempts - 1, 0)), settings.hook_retry_max_seconds)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def finish_delivery(
+    db: Session,
+    delivery_id: str,
+    worker_id: str,
+    status_code: Optional[int],
+    error: Optional[str],
+    latency_ms: Optional[float] = None,
+    destination: Optional[str] = None
+) -> Optional[str]:
+    """
+    记录一次投递结果，返回投递的新状态（投递已不归属当前进程时返回 None）
+    接收地址的健康统计与投递状态在同一事务中更新，投递已不归属当前进程时也计入
+    """
+    circuit = None
+    if destination:
+        circuit = record_result(db, destination, error is None, latency_ms, status_code, error)
+
+    delivery = db.query(HookDelivery).filter(
+        HookDelivery.id == delivery_id,
+        HookDelivery.worker_id == worker_id,
+        HookDelivery.status == "delivering"
+    ).first()
+    if delivery is None:
+        db.commit()
+        return None
+
+    now = datetime.now()
+    delivery.last_status_code = status_code
+    delivery.last_error = error
+    delivery.lease_expires_at = None
+    if error is None:
+        delivery.status = "delivered"
+        delivery.delivered_at = now
+        if delivery.hook_config_id:
+            # 通过 Core 语句更新，不触发 hook 规则缓存（依赖 hook_configs 写入）失效
+            hook_configs = HookConfig.__table__
+            db.execute(
+                hook_configs.update().where(hook_configs.c.id == delivery.hook_config_id).values(last_execution=now)
+            )
+    elif delivery.attempts >= settings.hook_max_attempts:
+        delivery.status = "failed"
+    else:
+        delivery.status = "pending"
+        delivery.next_attempt_at = now + timedelta(seconds=retry_delay_seconds(delivery.attempts))
+        if circuit is not None and circuit.state == "open" and circuit.open_until > delivery.next_attempt_at:
+            # 接收地址已熔断，熔断结束前不再重试
+            delivery.next_attempt_at = circuit.open_until
+    db.commit()
+    return delivery.status
+
+
+def prune_delivered(db: Session) -> int:
+    """删除超过保留期的已投递记录"""
+    cutoff = datetime.now() - timedelta(days=settings.hook_delivery_retention_days)
+    deleted = db.query(HookDelivery).filter(
+        HookDelivery.status == "delivered",
+        HookDelivery.delivered_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+class HookDispatcher:
+    """从 hook_deliveries 发件箱中认领到期的投递，并通过共享的 HTTP 连接池在后台发送"""
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{str(uuid.uuid4())[:8]}"
+        # 正在发送的投递 {delivery_id: asyncio.Task}，以及每个接收地址正在发送的数量
+        self.in_flight: dict[str, asyncio.Task] = {}
+        self.destinations: dict[str, int] = {}
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.open_circuits = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._last_prune = 0.0
+
+    def start(self):
+        """在当前事件循环中启动投递器"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._client = httpx.AsyncClient(
+            timeout=settings.hook_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.hook_max_connections,
+                max_keepalive_connections=settings.hook_max_connections
+            )
+        )
+        self._task = asyncio.create_task(self.run())
+        logger.info(f"hook 投递器 {self.worker_id} 已启动")
+
+    async def stop(self):
+        """停止认领新投递，等待正在发送的请求结束（超时后取消，租约到期后由其它进程重新投递）"""
+        self._stopping = True
+        if self._task is not None:
+            self.notify()
+            await self._task
+            self._task = None
+        if self.in_flight:
+            _, pending = await asyncio.wait(list(self.in_flight.values()), timeout=settings.hook_timeout_seconds)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        logger.info(f"hook 投递器 {self.worker_id} 已停止")
+
+    def notify(self):
+        """唤醒投递器立即检查发件箱，可从任意线程调用"""
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "in_flight": len(self.in_flight),
+            "destinations": {destination: count for destination, count in self.destinations.items() if count},
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.failed,
+            "open_circuits": self.open_circuits
+        }
+
+    async def run(self):
+        """主循环：认领到期的投递 -> 等待唤醒或轮询超时"""
+        while not self._stopping:
+            try:
+                await self._claim_due_deliveries()
+                if self._loop.time() - self._last_prune >= PRUNE_INTERVAL_SECONDS:
+                    self._last_prune = self._loop.time()
+                    async with AsyncSessionLocal() as db:
+                        await db.run_sync(prune_delivered)
+            except Exception as e:
+                logger.error(f"hook 投递器循环异常: {str(e)}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.hook_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim_due_deliveries(self):
+        """
+        按到期顺序认领投递，跳过已熔断或已达到并发上限的接收地址；
+        熔断到期的地址每次只放行一个探测投递
+        """
+        capacity = settings.hook_max_connections - len(self.in_flight)
+        if capacity <= 0:
+            return
+        async with AsyncSessionLocal() as db:
+            blocked, probe_ready = await db.run_sync(circuit_states)
+            self.open_circuits = len(blocked) + len(probe_ready)
+            saturated = {
+                destination for destination, count in self.destinations.items()
+                if count >= settings.hook_max_concurrency_per_destination
+            }
+            exclude = blocked | saturated
+
+            now = datetime.now()
+            query = select(
+                HookDelivery.id, HookDelivery.event, HookDelivery.method, HookDelivery.url,
+                HookDelivery.destination, HookDelivery.headers, HookDelivery.payload
+            ).where(
+                or_(
+                    (HookDelivery.status == "pending") & (HookDelivery.next_attempt_at <= now),
+                    (HookDelivery.status == "delivering") & (HookDelivery.lease_expires_at < now)
+                )
+            )
+            if exclude:
+                # 熔断地址的投递留在发件箱中，不占用本次扫描的名额
+                query = query.where(or_(HookDelivery.destination.is_(None), HookDelivery.destination.notin_(exclude)))
+            candidates = (await db.execute(
+                query.order_by(HookDelivery.next_attempt_at).limit(capacity * 4)
+            )).all()
+
+            for delivery in candidates:
+                if len(self.in_flight) >= settings.hook_max_connections:
+                    break
+                if delivery.id in self.in_flight:
+                    continue
+                destination = delivery.destination or destination_of(delivery.url)
+                if destination in exclude:
+                    continue
+                if self.destinations.get(destination, 0) >= settings.hook_max_concurrency_per_destination:
+                    continue
+                probing = destination in probe_ready
+                if probing and not await db.run_sync(acquire_probe, destination):
+                    # 其它进程已在探测
+                    exclude.add(destination)
+                    continue
+                if not await db.run_sync(claim_delivery, delivery.id, self.worker_id):
+                    if probing:
+                        await db.run_sync(release_probe, destination)
+                    continue
+                if probing:
+                    logger.info(f"hook 接收地址熔断到期，发送探测请求: {destination}")
+                    exclude.add(destination)
+                self.destinations[destination] = self.destinations.get(destination, 0) + 1
+                self.in_flight[delivery.id] = asyncio.create_task(self._deliver(delivery, destination))
+
+    async def _deliver(self, delivery, destination: str):
+        delivery_id, event_name, url = delivery.id, delivery.event, delivery.url
+        headers = json.loads(delivery.headers) if delivery.headers else {}
+        headers.update({
+            "Content-Type": "application/json",
+            "X-Axis-Delivery-Id": delivery_id,
+            "X-Axis-Hook-Event": event_name
+        })
+        status_code = None
+        error = None
+        started = time.perf_counter()
+        try:
+            response = await self._client.request(
+                delivery.method or "POST",
+                url,
+                content=delivery.payload.encode("utf-8"),
+                headers=headers
+            )
+            status_code = response.status_code
+            if not response.is_success:
+                error = f"HTTP {status_code}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            async with AsyncSessionLocal() as db:
+                status = await db.run_sync(
+                    finish_delivery, delivery_id, self.worker_id, status_code, error, latency_ms, destination
+                )
+            if status == "delivered":
+                self.delivered += 1
+                logger.info(f"{event_name} hook 已投递: {url} ({status_code})")
+            elif status == "pending":
+                self.retried += 1
+                logger.warning(f"{event_name} hook 投递失败，稍后重试: {url} ({error})")
+            elif status == "failed":
+                self.failed += 1
+                logger.error(f"{event_name} hook 投递失败，已达到最多尝试次数: {url} ({error})")
+        except Exception as e:
+            logger.error(f"记录 hook 投递结果失败: {str(e)}")
+        finally:
+            self.in_flight.pop(delivery_id, None)
+            self.destinations[destination] -= 1
+            # 接收地址有了空闲名额，立即检查同一地址等待中的投递
+            self.notify()
+
+
+# 全局实例
+hook_dispatcher = HookDispatcher()
@@ -0,0 +1,182 @@
+"""
+hook 规则引擎
+每次执行开始时解析一次适用于该任务的 hooks：工作区级（task_id 为空）和任务级的 HookConfig，
+以及任务自身的 start_hook_curl / stop_hook_curl（视为 trigger_condition=always 的任务级 hook）。
+启用的 HookConfig 按作用域和类型建立索引后缓存，hook_configs 有写入提交时失效，其它进程的修改由 TTL 兜底。
+trigger_condition 只对结束 hook 生效（success: 任务完成，failure: 任务失败），开始 hook 每次执行都会触发；
+匹配的 hooks 各写入一条投递，由投递器并发发送。
+"""
+import logging
+import shlex
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import HookConfig, Task
+from app.services.hook_delivery import enqueue_hook
+from app.utils.snapshot_cache import SnapshotCache
+
+logger = logging.getLogger(__name__)
+
+HOOK_TYPES = ("start", "stop")
+
+# curl 命令中需要跳过参数值的选项（请求体固定为 hook 的 JSON 内容）
+_CURL_DATA_OPTIONS = {"-d", "--data", "--data-raw", "--data-binary", "--data-urlencode", "--json"}
+
+
+@dataclass
+class HookTarget:
+    """hook 请求的目标：方法、地址和额外请求头"""
+    url: str
+    method: str = "POST"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def parse_hook_target(command: str) -> HookTarget:
+    """
+    解析 hook 配置：可以是 URL，也可以是 curl 命令（读取 -X / -H / --url 和目标地址，请求体始终为 hook 内容）
+    地址不是 http(s) 时抛出 ValueError
+    """
+    command = (command or "").strip()
+    if not command.lower().startswith("curl "):
+        target = HookTarget(url=command)
+    else:
+        try:
+            args = shlex.split(command)[1:]
+        except ValueError as e:
+            raise ValueError(f"curl 命令格式错误: {str(e)}")
+        target = HookTarget(url="")
+        index = 0
+        while index < len(args):
+            arg = args[index]
+            value = args[index + 1] if index + 1 < len(args) else None
+            if arg in ("-X", "--request") and value:
+                target.method = value.upper()
+                index += 1
+            elif arg in ("-H", "--header") and value:
+                name, _, header_value = value.partition(":")
+                if name.strip():
+                    target.headers[name.strip()] = header_value.strip()
+                index += 1
+            elif arg == "--url" and value:
+                target.url = value
+                index += 1
+            elif arg in _CURL_DATA_OPTIONS:
+                index += 1
+            elif not arg.startswith("-"):
+                target.url = arg
+            index += 1
+
+    parts = urlsplit(target.url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("hook 地址必须是 http:// 或 https:// 开头的 URL")
+    return target
+
+
+@dataclass
+class HookRule:
+    """一条已解析的 hook"""
+    type: str
+    target: HookTarget
+    trigger_condition: str = "always"
+    hook_config_id: Optional[str] = None
+
+    def matches(self, status: Optional[str]) -> bool:
+        """结束 hook 是否匹配任务最终状态"""
+        if self.type != "stop" or self.trigger_condition in (None, "always"):
+            return True
+        if self.trigger_condition == "success":
+            return status == "completed"
+        if self.trigger_condition == "failure":
+            return status == "failed"
+        return False
+
+
+@dataclass
+class HookIndex:
+    """启用的 HookConfig 按作用域和类型建立的索引：{workspace_id / task_id: {type: [HookRule]}}"""
+    by_workspace: Dict[str, Dict[str, List[HookRule]]] = field(default_factory=dict)
+    by_task: Dict[str, Dict[str, List[HookRule]]] = field(default_factory=dict)
+
+
+# hook 规则缓存：hook_configs 有写入提交时失效
+_index_cache = SnapshotCache(settings.hook_rules_cache_ttl_seconds, tables=["hook_configs"])
+
+
+def _build_index(db: Session) -> HookIndex:
+    index = HookIndex()
+    configs = db.query(HookConfig).filter(HookConfig.enabled == 1).order_by(HookConfig.created_at).all()
+    for config in configs:
+        if config.type not in HOOK_TYPES:
+            continue
+        try:
+            target = parse_hook_target(config.curl_command)
+        except ValueError as e:
+            logger.warning(f"忽略无效的 hook 配置 {config.id}: {str(e)}")
+            continue
+        rule = HookRule(
+            type=config.type,
+            target=target,
+            trigger_condition=config.trigger_condition or "always",
+            hook_config_id=config.id
+        )
+        if config.task_id:
+            scope = index.by_task.setdefault(config.task_id, {})
+        elif config.workspace_id:
+            scope = index.by_workspace.setdefault(config.workspace_id, {})
+        else:
+            continue
+        scope.setdefault(config.type, []).append(rule)
+    return index
+
+
+def load_hook_index(db: Session) -> HookIndex:
+    return _index_cache.get_or_build(lambda: _build_index(db))
+
+
+@dataclass
+class ExecutionHooks:
+    """一次执行适用的 hooks，按类型分组"""
+    task_id: str
+    execution_id: Optional[str]
+    rules: Dict[str, List[HookRule]] = field(default_factory=dict)
+
+    def has(self, hook_type: str) -> bool:
+        return bool(self.rules.get(hook_type))
+
+    def enqueue(self, db: Session, hook_type: str, payload: dict, status: Optional[str] = None) -> int:
+        """为匹配的 hooks 各写入一条投递（只加入会话，由调用方提交），返回写入的投递数"""
+        count = 0
+        for rule in self.rules.get(hook_type, []):
+            if not rule.matches(status):
+                continue
+            enqueue_hook(
+                db, self.task_id, self.execution_id, hook_type, rule.target.url, payload,
+                method=rule.target.method,
+                headers=rule.target.headers,
+                hook_config_id=rule.hook_config_id
+            )
+            count += 1
+        return count
+
+
+def resolve_execution_hooks(db: Session, task: Task) -> ExecutionHooks:
+    """解析任务本次执行适用的 hooks：工作区级 -> 任务级 -> 任务自身的 start / stop hook"""
+    index = load_hook_index(db)
+    hooks = ExecutionHooks(task_id=task.id, execution_id=task.execution_id)
+    workspace_rules = index.by_workspace.get(task.workspace_id, {})
+    task_rules = index.by_task.get(task.id, {})
+    legacy_hooks = {"start": task.start_hook_curl, "stop": task.stop_hook_curl}
+
+    for hook_type in HOOK_TYPES:
+        rules = workspace_rules.get(hook_type, []) + task_rules.get(hook_type, [])
+        if legacy_hooks[hook_type]:
+            try:
+                rules.append(HookRule(type=hook_type, target=parse_hook_target(legacy_hooks[hook_type])))
+            except ValueError as e:
+                logger.warning(f"任务 {task.id} 的 {hook_type} hook 无效: {str(e)}")
+        hooks.rules[hook_type] = rules
+    return hooks
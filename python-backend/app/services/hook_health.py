@@ -0,0 +1,146 @@
+"""
+hook 接收地址的健康统计和熔断器
+每次投递结果记录到 hook_destinations（成功 / 失败次数、响应耗时、最后一次错误），所有投递进程共享。
+- closed: 正常投递；连续失败达到 HOOK_CIRCUIT_FAILURE_THRESHOLD 次后熔断（open）
+- open: 熔断期间不再向该地址发送请求，等待中的投递保持排队且不消耗尝试次数
+- half_open: 熔断到期后只放行一个探测请求，成功则恢复，失败则再次熔断且熔断时长翻倍（不超过上限）
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import HookDestination
+
+logger = logging.getLogger(__name__)
+
+# 响应耗时指数移动平均的权重
+LATENCY_EWMA_ALPHA = 0.2
+
+
+def _get_or_create(db: Session, destination: str) -> HookDestination:
+    row = db.get(HookDestination, destination)
+    if row is not None:
+        return row
+    try:
+        with db.begin_nested():
+            row = HookDestination(destination=destination, state="closed", consecutive_failures=0, open_count=0,
+                                  total_successes=0, total_failures=0)
+            db.add(row)
+    except IntegrityError:
+        # 其它进程同时创建了该地址
+        row = db.get(HookDestination, destination)
+    return row
+
+
+def open_seconds(open_count: int) -> float:
+    """第 open_count 次连续熔断的时长"""
+    return min(
+        settings.hook_circuit_open_seconds * (2 ** max(open_count - 1, 0)),
+        settings.hook_circuit_max_open_seconds
+    )
+
+
+def record_result(
+    db: Session,
+    destination: str,
+    success: bool,
+    latency_ms: Optional[float],
+    status_code: Optional[int] = None,
+    error: Optional[str] = None
+) -> HookDestination:
+    """记录一次投递结果并更新熔断状态（只 flush，由调用方提交）"""
+    now = datetime.now()
+    row = _get_or_create(db, destination)
+    if latency_ms is not None:
+        row.last_latency_ms = latency_ms
+        row.avg_latency_ms = latency_ms if row.avg_latency_ms is None else \
+            row.avg_latency_ms * (1 - LATENCY_EWMA_ALPHA) + latency_ms * LATENCY_EWMA_ALPHA
+    row.last_status_code = status_code
+
+    if success:
+        if row.state != "closed":
+            logger.info(f"hook 接收地址已恢复: {destination}")
+        row.total_successes += 1
+        row.consecutive_failures = 0
+        row.open_count = 0
+        row.state = "closed"
+        row.open_until = None
+        row.last_success_at = now
+    else:
+        row.total_failures += 1
+        row.consecutive_failures += 1
+        row.last_error = error
+        row.last_failure_at = now
+        # 探测请求失败，或连续失败达到阈值
+        if row.state == "half_open" or (
+            row.state == "closed" and row.consecutive_failures >= settings.hook_circuit_failure_threshold
+        ):
+            row.open_count += 1
+            row.state = "open"
+            row.opened_at = now
+            row.open_until = now + timedelta(seconds=open_seconds(row.open_count))
+            logger.warning(
+                f"hook 接收地址熔断 {open_seconds(row.open_count):g} 秒: {destination}"
+                f"（连续失败 {row.consecutive_failures} 次: {error}）"
+            )
+    db.flush()
+    return row
+
+
+def circuit_states(db: Session) -> Tuple[Set[str], Set[str]]:
+    """返回 (暂停投递的地址, 熔断已到期、可以发送探测请求的地址)"""
+    now = datetime.now()
+    blocked, probe_ready = set(), set()
+    rows = db.query(HookDestination.destination, HookDestination.open_until).filter(
+        HookDestination.state.in_(("open", "half_open"))
+    ).all()
+    for destination, open_until in rows:
+        if open_until is not None and open_until > now:
+            blocked.add(destination)
+        else:
+            probe_ready.add(destination)
+    return blocked, probe_ready
+
+
+def acquire_probe(db: Session, destination: str) -> bool:
+    """
+    原子地占用探测名额：熔断（或上一次探测）已到期时转为 half_open，
+    探测截止时间为投递租约时长，探测进程退出后到期可再次探测
+    """
+    now = datetime.now()
+    acquired = db.query(HookDestination).filter(
+        HookDestination.destination == destination,
+        HookDestination.state.in_(("open", "half_open")),
+        HookDestination.open_until <= now
+    ).update({
+        HookDestination.state: "half_open",
+        HookDestination.open_until: now + timedelta(seconds=settings.hook_delivery_lease_seconds)
+    }, synchronize_session=False)
+    db.commit()
+    return acquired == 1
+
+
+def release_probe(db: Session, destination: str):
+    """占用探测名额后未能发送请求（投递已被其它进程认领），立即释放名额"""
+    db.query(HookDestination).filter(
+        HookDestination.destination == destination,
+        HookDestination.state == "half_open"
+    ).update({HookDestination.open_until: datetime.now()}, synchronize_session=False)
+    db.commit()
+
+
+def reset_destination(db: Session, destination: str) -> Optional[HookDestination]:
+    """手动恢复接收地址（关闭熔断、清零连续失败次数），地址不存在时返回 None"""
+    row = db.get(HookDestination, destination)
+    if row is None:
+        return None
+    row.state = "closed"
+    row.consecutive_failures = 0
+    row.open_count = 0
+    row.open_until = None
+    db.commit()
+    return row
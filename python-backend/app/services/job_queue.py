@@ -0,0 +1,539 @@
+"""
+持久化执行队列
+dispatch / retry / 队列执行都会在 execution_jobs 表中写入作业，由 JobWorker 认领并提交到执行池。
+作业通过租约 + 心跳标记归属，进程重启或 worker 失联后，租约到期的作业会被重新认领。
+worker 在事件循环中运行，使用异步会话读写数据库，同步的辅助函数通过 run_sync 调用。
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import ExecutionJob, Task, Workspace
+from app.services.executor import agent_executor, Execution, ExecutionAlreadyActiveError, ExecutorBacklogFullError
+
+logger = logging.getLogger(__name__)
+
+# 尚未结束的作业状态
+ACTIVE_JOB_STATUSES = ("pending", "running")
+
+# 进程退出时等待被中断的执行清理（关闭 Agent 进程、保存日志）的最长时间（秒）
+SHUTDOWN_TIMEOUT_SECONDS = 10
+
+# 等待作业结束的 future {job_id: [asyncio.Future]}
+_job_waiters: dict[str, list[asyncio.Future]] = {}
+
+
+def new_execution_id() -> str:
+    """生成执行ID"""
+    return f"exec-sys-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{str(uuid.uuid4())[:8]}"
+
+
+def get_active_job(db: Session, task_id: str) -> Optional[ExecutionJob]:
+    """获取任务尚未结束的作业"""
+    return db.query(ExecutionJob).filter(
+        ExecutionJob.task_id == task_id,
+        ExecutionJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).first()
+
+
+def enqueue_task_execution(
+    db: Session,
+    task: Task,
+    kind: str,
+    execution_params: Optional[dict] = None
+) -> Tuple[ExecutionJob, int]:
+    """
+    将任务写入执行队列，并把任务状态置为 progress，返回 (作业, 排队位置)
+    排队位置与写入在同一事务中计算，不会与 worker 的认领交错；调用方负责在此之前完成工作区路径等校验
+    """
+    if get_active_job(db, task.id):
+        raise ExecutionAlreadyActiveError(f"任务 {task.id} 正在执行或排队中")
+
+    pending_count = db.query(ExecutionJob).filter(ExecutionJob.status == "pending").count()
+    if pending_count >= settings.max_pending_executions:
+        raise ExecutorBacklogFullError("执行队列已满，请稍后重试")
+
+    execution_id = new_execution_id()
+
+    task.status = "progress"
+    task.execution_id = execution_id
+    task.dispatch_time = datetime.now()
+
+    job = ExecutionJob(
+        id=str(uuid.uuid4()),
+        task_id=task.id,
+        workspace_id=task.workspace_id,
+        kind=kind,
+        execution_id=execution_id,
+        status="pending",
+        payload=json.dumps(execution_params or {}, ensure_ascii=False),
+        attempts=0,
+        # 认领和排队位置按创建时间排序，显式写入带微秒的时间，同一秒内的作业也能区分先后
+        created_at=datetime.now()
+    )
+    db.add(job)
+    db.flush()
+    position = get_queue_position(db, job)
+    db.commit()
+    db.refresh(task)
+    db.refresh(job)
+
+    job_worker.notify()
+    return job, position
+
+
+def get_queue_position(db: Session, job: ExecutionJob) -> int:
+    """
+    根据 execution_jobs 计算作业的排队位置：0 表示正在执行或即将被认领，N 表示还要等前面 N-1 个作业开始执行
+    worker 按创建顺序认领并跳过工作区已满的作业，因此排在前面的作业只有在其工作区还有空闲槽位时才会先占用全局槽位
+    """
+    if job.status != "pending":
+        return 0
+
+    is_running = ExecutionJob.status == "running"
+    is_ahead = and_(
+        ExecutionJob.status == "pending",
+        or_(
+            ExecutionJob.created_at < job.created_at,
+            and_(ExecutionJob.created_at == job.created_at, ExecutionJob.id < job.id)
+        )
+    )
+    rows = db.query(
+        ExecutionJob.workspace_id,
+        func.count(case((is_running, 1))),
+        func.count(case((is_ahead, 1)))
+    ).filter(
+        ExecutionJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).group_by(ExecutionJob.workspace_id).all()
+
+    per_workspace = settings.max_concurrent_executions_per_workspace
+    running = sum(count for _, count, _ in rows)
+    # 排在前面、会先于该作业被认领的作业数
+    claimable_ahead = sum(min(ahead, max(per_workspace - count, 0)) for _, count, ahead in rows)
+    running_in_workspace, ahead_in_workspace = next(
+        ((count, ahead) for workspace_id, count, ahead in rows if workspace_id == job.workspace_id), (0, 0)
+    )
+    free_slots = max(settings.max_concurrent_executions - running, 0)
+    free_workspace_slots = max(per_workspace - running_in_workspace, 0)
+
+    if claimable_ahead < free_slots and ahead_in_workspace < free_workspace_slots:
+        return 0
+    return max(claimable_ahead - free_slots, ahead_in_workspace - free_workspace_slots, 0) + 1
+
+
+def claim_job(db: Session, job: ExecutionJob, worker_id: str) -> bool:
+    """
+    原子地认领作业：仅当作业仍处于等待状态，或（requeue 策略下）运行中但租约已过期时才能认领成功
+    """
+    now = datetime.now()
+    claimable = ExecutionJob.status == "pending"
+    if _can_reclaim_expired():
+        claimable = or_(
+            claimable,
+            (ExecutionJob.status == "running") & (ExecutionJob.lease_expires_at < now)
+        )
+    claimed = db.query(ExecutionJob).filter(
+        ExecutionJob.id == job.id,
+        claimable
+    ).update({
+        ExecutionJob.status: "running",
+        ExecutionJob.worker_id: worker_id,
+        ExecutionJob.attempts: ExecutionJob.attempts + 1,
+        ExecutionJob.lease_expires_at: now + timedelta(seconds=settings.job_lease_seconds),
+        ExecutionJob.heartbeat_at: now,
+        ExecutionJob.started_at: now
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def heartbeat_jobs(db: Session, worker_id: str, job_ids: list[str]) -> int:
+    """续约 worker 正在执行的作业"""
+    if not job_ids:
+        return 0
+    now = datetime.now()
+    updated = db.query(ExecutionJob).filter(
+        ExecutionJob.id.in_(job_ids),
+        ExecutionJob.worker_id == worker_id,
+        ExecutionJob.status == "running"
+    ).update({
+        ExecutionJob.lease_expires_at: now + timedelta(seconds=settings.job_lease_seconds),
+        ExecutionJob.heartbeat_at: now
+    }, synchronize_session=False)
+    db.commit()
+    return updated
+
+
+def finish_job(db: Session, job_id: str, worker_id: str, status: str, error_message: Optional[str] = None):
+    """标记作业结束（仅当作业仍归属当前 worker）"""
+    db.query(ExecutionJob).filter(
+        ExecutionJob.id == job_id,
+        ExecutionJob.worker_id == worker_id
+    ).update({
+        ExecutionJob.status: status,
+        ExecutionJob.error_message: error_message,
+        ExecutionJob.finished_at: datetime.now(),
+        ExecutionJob.lease_expires_at: None
+    }, synchronize_session=False)
+    db.commit()
+    _notify_job_finished(job_id, status)
+
+
+def release_jobs(db: Session, worker_id: str, job_ids: list[str]) -> int:
+    """
+    进程正常退出时交还正在执行的作业：requeue 策略下立即放回等待队列（不计入认领次数），
+    由其它 worker 或重启后的进程重新执行；fail 策略下保持 running，租约到期后按策略标记失败
+    """
+    if not job_ids or not _can_reclaim_expired():
+        return 0
+    released = db.query(ExecutionJob).filter(
+        ExecutionJob.id.in_(job_ids),
+        ExecutionJob.worker_id == worker_id,
+        ExecutionJob.status == "running"
+    ).update({
+        ExecutionJob.status: "pending",
+        ExecutionJob.worker_id: None,
+        ExecutionJob.lease_expires_at: None,
+        ExecutionJob.heartbeat_at: None,
+        ExecutionJob.attempts: ExecutionJob.attempts - 1
+    }, synchronize_session=False)
+    db.commit()
+    return released
+
+
+def _notify_job_finished(job_id: str, status: str):
+    """唤醒当前进程中等待该作业的协程"""
+    for future in _job_waiters.get(job_id, []):
+        future.get_loop().call_soon_threadsafe(_set_future_result, future, status)
+
+
+def _set_future_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+async def _get_job_status(job_id: str) -> Optional[str]:
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(ExecutionJob.status).where(ExecutionJob.id == job_id))).scalar()
+
+
+async def wait_for_job(job_id: str) -> Optional[str]:
+    """
+    等待作业结束并返回最终状态
+    当前进程内结束的作业会立即唤醒；由其它 worker 进程执行的作业通过低频轮询兜底
+    """
+    future = asyncio.get_running_loop().create_future()
+    _job_waiters.setdefault(job_id, []).append(future)
+    try:
+        while True:
+            # 先注册 future 再检查状态，避免检查后、等待前作业结束导致漏掉通知
+            status = await _get_job_status(job_id)
+            if status not in ACTIVE_JOB_STATUSES:
+                return status
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(future),
+                    timeout=settings.job_completion_poll_seconds
+                )
+            except asyncio.TimeoutError:
+                continue
+    finally:
+        waiters = _job_waiters.get(job_id, [])
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            _job_waiters.pop(job_id, None)
+
+
+def cancel_task_execution(db: Session, task: Task, reason: str) -> str:
+    """
+    取消任务的执行，返回处理结果：
+    cancelled - 作业尚未开始，已直接取消；cancelling - 已通知执行中的 worker 取消；none - 没有进行中的执行
+    """
+    job = get_active_job(db, task.id)
+
+    if job and job.status == "pending":
+        cancelled = db.query(ExecutionJob).filter(
+            ExecutionJob.id == job.id,
+            ExecutionJob.status == "pending"
+        ).update({
+            ExecutionJob.status: "cancelled",
+            ExecutionJob.cancel_reason: reason,
+            ExecutionJob.error_message: f"任务已取消: {reason}",
+            ExecutionJob.finished_at: datetime.now()
+        }, synchronize_session=False)
+        if cancelled:
+            task.status = "failed"
+            task.error_message = f"任务已取消: {reason}"
+            db.commit()
+            _notify_job_finished(job.id, "cancelled")
+            return "cancelled"
+        # 作业刚被 worker 认领，按运行中的作业处理；结束未更新任何行的写事务，不占用写锁等待执行器写入
+        db.commit()
+        db.refresh(job)
+
+    # 当前进程中运行的执行直接取消
+    if agent_executor.cancel(task.id, reason):
+        return "cancelling"
+
+    if job and job.status == "running":
+        # 由其它 worker 进程执行，写入取消请求，由该 worker 在下一轮循环中处理
+        job.cancel_requested = 1
+        job.cancel_reason = reason
+        db.commit()
+        # 作业可能刚被当前进程认领、尚未提交到执行池，唤醒 worker 立即处理取消请求
+        job_worker.notify()
+        return "cancelling"
+
+    return "none"
+
+
+def _can_reclaim_expired() -> bool:
+    """租约过期的作业是否允许被重新认领"""
+    return settings.orphan_execution_policy == "requeue"
+
+
+def fail_exhausted_jobs(db: Session) -> int:
+    """
+    租约过期且不允许重新认领（fail 策略或已达到最大认领次数）的作业，直接标记为失败
+    """
+    now = datetime.now()
+    query = db.query(ExecutionJob).filter(
+        ExecutionJob.status == "running",
+        ExecutionJob.lease_expires_at < now
+    )
+    if _can_reclaim_expired():
+        query = query.filter(ExecutionJob.attempts >= settings.job_max_attempts)
+    jobs = query.all()
+
+    for job in jobs:
+        job.status = "failed"
+        job.error_message = "worker 失联，执行中断"
+        job.finished_at = now
+        job.lease_expires_at = None
+        task = db.query(Task).filter(Task.id == job.task_id).first()
+        if task and task.execution_id == job.execution_id:
+            task.status = "failed"
+            task.error_message = job.error_message
+
+    if jobs:
+        db.commit()
+        for job in jobs:
+            _notify_job_finished(job.id, "failed")
+    return len(jobs)
+
+
+class JobWorker:
+    """从 execution_jobs 表中认领作业并提交到执行池的 worker"""
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{str(uuid.uuid4())[:8]}"
+        # 当前 worker 正在执行的作业 {job_id: task_id}
+        self.running_jobs: dict[str, str] = {}
+        # 执行结束后结束作业的清理任务
+        self._cleanups: set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self):
+        """在当前事件循环中启动 worker"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+        agent_executor.add_release_listener(self.notify)
+        logger.info(f"作业 worker {self.worker_id} 已启动")
+
+    async def stop(self):
+        """
+        停止认领新作业，并中断正在执行的作业：终止 Agent 进程、保存已产生的日志，任务保持 progress，
+        作业按孤立执行策略交还（见 release_jobs），不会因进程退出被标记为取消或失败
+        """
+        self._stopping = True
+        if self._task is not None:
+            self.notify()
+            await self._task
+            self._task = None
+
+        jobs = dict(self.running_jobs)
+        if jobs:
+            interrupted = [future for future in map(agent_executor.interrupt, jobs.values()) if future is not None]
+            if interrupted:
+                await asyncio.wait(interrupted, timeout=SHUTDOWN_TIMEOUT_SECONDS)
+            async with AsyncSessionLocal() as db:
+                released = await db.run_sync(release_jobs, self.worker_id, list(jobs))
+            logger.info(f"作业 worker {self.worker_id} 已中断 {len(jobs)} 个执行中的作业，放回等待队列 {released} 个")
+        if self._cleanups:
+            await asyncio.gather(*self._cleanups, return_exceptions=True)
+        logger.info(f"作业 worker {self.worker_id} 已停止")
+
+    def notify(self):
+        """唤醒 worker 立即检查新作业，可从任意线程调用"""
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self):
+        """主循环：续约 -> 处理取消请求 -> 认领 -> 等待唤醒或轮询超时"""
+        last_heartbeat = datetime.now()
+        heartbeat_interval = max(settings.job_lease_seconds / 3, 1)
+
+        while not self._stopping:
+            try:
+                if (datetime.now() - last_heartbeat).total_seconds() >= heartbeat_interval:
+                    await self._heartbeat()
+                    last_heartbeat = datetime.now()
+                await self._process_cancel_requests()
+                await self._claim_available_jobs()
+            except Exception as e:
+                logger.error(f"作业 worker 循环异常: {str(e)}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.job_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _heartbeat(self):
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(heartbeat_jobs, self.worker_id, list(self.running_jobs.keys()))
+
+    async def _claim_available_jobs(self):
+        """按创建顺序认领作业，直到执行池没有空闲槽位"""
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(fail_exhausted_jobs)
+
+            now = datetime.now()
+            candidates = (await db.execute(
+                select(ExecutionJob).where(
+                    or_(
+                        ExecutionJob.status == "pending",
+                        (ExecutionJob.status == "running") & (ExecutionJob.lease_expires_at < now)
+                    )
+                ).order_by(ExecutionJob.created_at).limit(settings.max_concurrent_executions * 4)
+            )).scalars().all()
+
+            for job in candidates:
+                if len(agent_executor.running) >= agent_executor.max_concurrent:
+                    break
+                if not agent_executor.has_capacity(job.workspace_id):
+                    continue
+                if agent_executor.is_active(job.task_id):
+                    continue
+                if not await db.run_sync(claim_job, job, self.worker_id):
+                    continue
+                await self._submit(db, job)
+
+    async def _submit(self, db: AsyncSession, job: ExecutionJob):
+        from app.services.agent_runner import execute_claude_agent_task_async, resolve_execution_limits
+
+        task = await db.get(Task, job.task_id)
+        workspace = await db.get(Workspace, job.workspace_id)
+        if not task or not workspace or not workspace.path:
+            await db.run_sync(finish_job, job.id, self.worker_id, "failed", "任务或工作区不存在")
+            return
+
+        job_id = job.id
+        task_id = task.id
+        workspace_path = workspace.path
+        description = task.description
+        limits = resolve_execution_limits(json.loads(job.payload) if job.payload else None)
+
+        async def run_job():
+            await execute_claude_agent_task_async(task_id, workspace_path, description, limits)
+
+        self.running_jobs[job_id] = task_id
+        try:
+            execution = agent_executor.submit(
+                task_id, job.workspace_id, run_job, timeout_seconds=limits.timeout_seconds or None
+            )
+        except Exception as e:
+            self.running_jobs.pop(job_id, None)
+            await db.run_sync(finish_job, job_id, self.worker_id, "failed", str(e))
+            return
+        # 通过完成回调结束作业：执行在第一步之前被取消时 run_job 不会运行，也要结束作业
+        execution.future.add_done_callback(lambda _: self._on_execution_done(job_id, execution))
+
+    def _on_execution_done(self, job_id: str, execution: Execution):
+        """执行的 asyncio 任务结束后停止续约，并在后台结束作业"""
+        self.running_jobs.pop(job_id, None)
+        if execution.interrupted:
+            # 进程退出，作业由 stop() 交还
+            return
+        cancelled = execution.future.cancelled()
+        cleanup = asyncio.create_task(self._on_job_done(
+            job_id, execution.task_id, cancelled, execution.cancel_reason if cancelled else None
+        ))
+        self._cleanups.add(cleanup)
+        cleanup.add_done_callback(self._cleanups.discard)
+
+    async def _process_cancel_requests(self):
+        """处理其它进程发起的取消请求（作业由当前 worker 执行）"""
+        if not self.running_jobs:
+            return
+        async with AsyncSessionLocal() as db:
+            jobs = (await db.execute(
+                select(ExecutionJob.task_id, ExecutionJob.cancel_reason).where(
+                    ExecutionJob.id.in_(list(self.running_jobs.keys())),
+                    ExecutionJob.cancel_requested == 1
+                )
+            )).all()
+        for job in jobs:
+            agent_executor.cancel(job.task_id, job.cancel_reason or "执行被取消")
+
+    async def _on_job_done(
+        self,
+        job_id: str,
+        task_id: str,
+        cancelled: bool = False,
+        cancel_reason: Optional[str] = None
+    ):
+        """执行结束后根据任务最终状态结束作业（执行槽释放后执行池会唤醒 worker）"""
+        self.running_jobs.pop(job_id, None)
+        try:
+            async with AsyncSessionLocal() as db:
+                task = await db.get(Task, task_id)
+                if task and task.status == "progress":
+                    # 执行在开始前被取消，或执行器异常退出而未更新任务状态
+                    task.status = "failed"
+                    if cancelled:
+                        task.error_message = f"任务已取消: {cancel_reason or '执行被取消'}"
+                    else:
+                        task.error_message = task.error_message or "执行异常退出"
+                    await db.commit()
+
+                if cancelled:
+                    status, error_message = "cancelled", task.error_message if task else None
+                elif task and task.status == "completed":
+                    status, error_message = "completed", None
+                else:
+                    status, error_message = "failed", task.error_message if task else "任务不存在"
+                await db.run_sync(finish_job, job_id, self.worker_id, status, error_message)
+        except Exception as e:
+            logger.error(f"结束作业 {job_id} 失败: {str(e)}")
+
+
+# 全局实例
+job_worker = JobWorker()
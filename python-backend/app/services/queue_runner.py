@@ -0,0 +1,279 @@
+"""
+任务队列执行器
+在 API 进程的事件循环中运行队列：直接把队列任务写入执行队列，并等待作业结束的通知后继续下一步，
+不占用线程，也不需要通过 HTTP 调用自身的 dispatch 接口。
+队列任务可以声明依赖，互不依赖的分支在队列的并行度上限内同时执行。
+队列任务的状态即执行检查点：恢复执行时跳过已完成的任务，只重试失败 / 中断的任务并继续未执行的任务。
+执行中的队列记录执行进程和租约（runner_id / lease_expires_at），由该进程定期续约；
+只有租约已过期的 running 队列才会被视为中断（见 reconciler），不会误判其它进程正在执行的队列。
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import TaskQueue, QueueTask, Task, Workspace
+from app.schemas.queue import QueueStatusEnum, TaskStatusEnum
+from app.services.job_queue import enqueue_task_execution, wait_for_job
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_queue_step(queue_task_id: str) -> str:
+    """执行单个队列任务并等待结束，返回队列任务的最终状态"""
+    async with AsyncSessionLocal() as db:
+        queue_task = await db.get(QueueTask, queue_task_id)
+
+        # 更新任务状态为运行中
+        queue_task.status = TaskStatusEnum.progress.value
+        await db.commit()
+
+        try:
+            # 获取任务信息
+            task = await db.get(Task, queue_task.task_id)
+            workspace = await db.get(Workspace, task.workspace_id) if task else None
+            if not task:
+                queue_task.status = TaskStatusEnum.failed.value
+                queue_task.error_reason = "任务不存在"
+            elif not workspace or not workspace.path or not os.path.exists(workspace.path):
+                queue_task.status = TaskStatusEnum.failed.value
+                queue_task.error_reason = "工作区路径不存在"
+            else:
+                # 写入持久化执行队列，等待作业结束（超时由执行池 watchdog 控制）
+                job, _ = await db.run_sync(enqueue_task_execution, task, "queue")
+                await wait_for_job(job.id)
+
+                # 刷新任务状态
+                await db.refresh(task)
+
+                if task.status == "completed":
+                    queue_task.status = TaskStatusEnum.completed.value
+                else:
+                    queue_task.status = TaskStatusEnum.failed.value
+                    queue_task.error_reason = task.error_message or "任务执行失败"
+        except asyncio.CancelledError:
+            queue_task.status = TaskStatusEnum.failed.value
+            queue_task.error_reason = "队列执行被中断"
+            await db.commit()
+            raise
+        except Exception as e:
+            queue_task.status = TaskStatusEnum.failed.value
+            queue_task.error_reason = str(e)
+
+        await db.commit()
+        return queue_task.status
+
+
+def renew_queue_leases(db: Session, runner_id: str, queue_ids: List[str]) -> int:
+    """续约当前进程正在执行的队列"""
+    if not queue_ids:
+        return 0
+    updated = db.query(TaskQueue).filter(
+        TaskQueue.id.in_(queue_ids),
+        TaskQueue.runner_id == runner_id,
+        TaskQueue.status == QueueStatusEnum.running.value
+    ).update({
+        TaskQueue.lease_expires_at: datetime.now() + timedelta(seconds=settings.job_lease_seconds)
+    }, synchronize_session=False)
+    db.commit()
+    return updated
+
+
+def prepare_queue_run(db: Session, queue_id: str, mode: str = "resume") -> dict:
+    """
+    执行前重置队列任务状态，返回将要执行和跳过的任务数
+    mode: resume - 保留已完成的任务，其余任务重置为待执行；restart - 全部重置为待执行
+    """
+    query = db.query(QueueTask).filter(QueueTask.queue_id == queue_id)
+    if mode == "resume":
+        query = query.filter(QueueTask.status != TaskStatusEnum.completed.value)
+    reset_count = query.update(
+        {QueueTask.status: TaskStatusEnum.pending.value, QueueTask.error_reason: None},
+        synchronize_session=False
+    )
+    total = db.query(QueueTask).filter(QueueTask.queue_id == queue_id).count()
+    return {"total_tasks": total, "pending_tasks": reset_count, "skipped_tasks": total - reset_count}
+
+
+async def execute_queue_tasks(queue_id: str):
+    """
+    按依赖关系执行队列中的任务
+    依赖全部完成的任务按 order_index 顺序启动，同时运行的数量不超过队列的 max_parallelism；
+    已完成的任务直接作为已满足的依赖跳过；依赖失败的任务不会执行，直接标记为失败。
+    failure_policy 为 stop 时，第一个任务失败后不再启动新任务，未执行的任务保持待执行状态，便于恢复执行
+    """
+    # 创建新的数据库会话
+    db = AsyncSessionLocal()
+    running: Dict[asyncio.Task, str] = {}
+
+    try:
+        queue = await db.get(TaskQueue, queue_id)
+        if not queue:
+            return
+        max_parallelism = max(queue.max_parallelism or 1, 1)
+        stop_on_failure = queue.failure_policy == "stop"
+
+        # 获取队列中的所有任务
+        queue_tasks = (await db.execute(
+            select(QueueTask).where(QueueTask.queue_id == queue_id).order_by(QueueTask.order_index)
+        )).scalars().all()
+
+        # 依赖关系 {queue_task_id: [依赖的 task_id]}，以及每个 task_id 的执行结果
+        depends_on = {qt.id: json.loads(qt.depends_on) if qt.depends_on else [] for qt in queue_tasks}
+        task_results: Dict[str, str] = {
+            qt.task_id: qt.status for qt in queue_tasks if qt.status == TaskStatusEnum.completed.value
+        }
+        waiting = [qt for qt in queue_tasks if qt.status != TaskStatusEnum.completed.value]
+        stopped = False
+
+        while waiting or running:
+            if stopped:
+                # 停止策略下只等待已启动的任务结束
+                if not running:
+                    break
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for step in done:
+                    task_id = running.pop(step)
+                    try:
+                        task_results[task_id] = step.result()
+                    except Exception as e:
+                        logger.error(f"队列 {queue_id} 任务 {task_id} 执行异常: {str(e)}")
+                        task_results[task_id] = TaskStatusEnum.failed.value
+                continue
+
+            # 依赖失败的任务直接标记为失败
+            for queue_task in list(waiting):
+                failed_deps = [
+                    dep for dep in depends_on[queue_task.id]
+                    if task_results.get(dep) == TaskStatusEnum.failed.value
+                ]
+                if failed_deps:
+                    queue_task.status = TaskStatusEnum.failed.value
+                    queue_task.error_reason = "依赖的任务执行失败"
+                    task_results[queue_task.task_id] = TaskStatusEnum.failed.value
+                    waiting.remove(queue_task)
+            await db.commit()
+
+            # 启动依赖已全部完成的任务
+            for queue_task in list(waiting):
+                if len(running) >= max_parallelism:
+                    break
+                if all(task_results.get(dep) == TaskStatusEnum.completed.value for dep in depends_on[queue_task.id]):
+                    waiting.remove(queue_task)
+                    step = asyncio.create_task(_run_queue_step(queue_task.id))
+                    running[step] = queue_task.task_id
+
+            if not running:
+                # 剩余任务的依赖永远无法满足
+                for queue_task in waiting:
+                    queue_task.status = TaskStatusEnum.failed.value
+                    queue_task.error_reason = "依赖的任务无法执行"
+                    task_results[queue_task.task_id] = TaskStatusEnum.failed.value
+                waiting = []
+                await db.commit()
+                break
+
+            done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for step in done:
+                task_id = running.pop(step)
+                try:
+                    task_results[task_id] = step.result()
+                except Exception as e:
+                    logger.error(f"队列 {queue_id} 任务 {task_id} 执行异常: {str(e)}")
+                    task_results[task_id] = TaskStatusEnum.failed.value
+                if stop_on_failure and task_results[task_id] == TaskStatusEnum.failed.value:
+                    stopped = True
+                    logger.info(f"队列 {queue_id} 任务 {task_id} 执行失败，停止启动后续任务")
+
+        success_count = sum(1 for status in task_results.values() if status == TaskStatusEnum.completed.value)
+        failed_count = len(task_results) - success_count
+
+        # 更新队列状态
+        queue = await db.get(TaskQueue, queue_id, populate_existing=True)
+        if queue:
+            if stopped:
+                queue.status = QueueStatusEnum.failed.value
+            elif failed_count == 0:
+                queue.status = QueueStatusEnum.completed.value
+            elif success_count == 0:
+                queue.status = QueueStatusEnum.failed.value
+            else:
+                queue.status = QueueStatusEnum.completed.value  # 部分成功也标记为完成
+            queue.lease_expires_at = None
+            await db.commit()
+    except asyncio.CancelledError:
+        for step in running:
+            step.cancel()
+        if running:
+            await asyncio.gather(*running.keys(), return_exceptions=True)
+        await db.rollback()
+        queue = await db.get(TaskQueue, queue_id, populate_existing=True)
+        if queue:
+            queue.status = QueueStatusEnum.failed.value
+            queue.lease_expires_at = None
+            await db.commit()
+        raise
+    finally:
+        # 关闭数据库会话
+        await db.close()
+
+
+class QueueRunner:
+    """管理进程内正在执行的队列"""
+
+    def __init__(self, runner_id: Optional[str] = None):
+        self.runner_id = runner_id or f"{socket.gethostname()}-{os.getpid()}-{str(uuid.uuid4())[:8]}"
+        # 正在执行的队列 {queue_id: asyncio.Task}
+        self.running: Dict[str, asyncio.Task] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def is_running(self, queue_id: str) -> bool:
+        return queue_id in self.running
+
+    def take_ownership(self, queue: TaskQueue):
+        """标记队列由当前进程执行并写入租约（由调用方与 running 状态一起提交）"""
+        queue.runner_id = self.runner_id
+        queue.lease_expires_at = datetime.now() + timedelta(seconds=settings.job_lease_seconds)
+
+    def start(self, queue_id: str):
+        """在当前事件循环中启动队列执行（调用方先通过 take_ownership 写入租约）"""
+        if self.is_running(queue_id):
+            return
+        runner = asyncio.create_task(self._run(queue_id))
+        self.running[queue_id] = runner
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    async def _run_heartbeat(self):
+        """定期续约正在执行的队列，没有队列在执行时退出"""
+        interval = max(settings.job_lease_seconds / 3, 1)
+        while self.running:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.run_sync(renew_queue_leases, self.runner_id, list(self.running))
+            except Exception as e:
+                logger.error(f"队列续约失败: {str(e)}")
+
+    async def _run(self, queue_id: str):
+        try:
+            await execute_queue_tasks(queue_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"队列 {queue_id} 执行异常: {str(e)}", exc_info=True)
+        finally:
+            self.running.pop(queue_id, None)
+
+
+# 全局实例
+queue_runner = QueueRunner()
@@ -0,0 +1,188 @@
+"""
+启动时的执行状态修复
+进程崩溃或重启后，Task 可能停留在 progress、TaskQueue 停留在 running。
+这里用批量 SQL 找出没有存活作业（等待中或租约未过期）的执行，按配置的策略标记失败或重新入队，
+执行租约已过期的 running 队列标记失败（其它进程仍在续约的队列不受影响），
+并为每个受影响的任务写入一条执行日志说明原因，中断时未结束的执行日志标记为失败。
+"""
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import LargeBinary, and_, exists, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import ExecutionJob, QueueTask, Task, TaskExecutionLog, TaskExecutionMessage, TaskQueue
+from app.services.execution_log_store import encode_message
+from app.services.search import index_execution_messages
+
+logger = logging.getLogger(__name__)
+
+ORPHAN_POLICY_FAIL = "fail"
+ORPHAN_POLICY_REQUEUE = "requeue"
+
+# SQLite 生成随机 ID
+_random_id = func.lower(func.hex(func.randomblob(16)))
+
+
+def _live_job_exists(now: datetime):
+    """任务存在等待中的作业，或租约未过期的运行中作业"""
+    return exists().where(
+        ExecutionJob.task_id == Task.id,
+        or_(
+            ExecutionJob.status == "pending",
+            and_(ExecutionJob.status == "running", ExecutionJob.lease_expires_at >= now)
+        )
+    )
+
+
+def _insert_reconcile_logs(db: Session, orphan_filter, message: str, status: str) -> int:
+    """为所有孤立任务批量写入一条执行日志（包含一条说明原因的消息）"""
+    next_execution_number = select(
+        func.coalesce(func.max(TaskExecutionLog.execution_number), 0) + 1
+    ).where(TaskExecutionLog.task_id == Task.id).scalar_subquery()
+
+    reconcile_message = {"type": "reconcile", "message": message}
+    payload = encode_message(reconcile_message)
+    content_bytes = len(json.dumps(reconcile_message, ensure_ascii=False).encode("utf-8"))
+
+    source = select(
+        _random_id,
+        Task.id,
+        next_execution_number,
+        literal("reconciled"),
+        literal(status),
+        literal(1),
+        literal(content_bytes),
+        literal(0.0)
+    ).where(orphan_filter)
+
+    result = db.execute(
+        insert(TaskExecutionLog).from_select(
+            ["id", "task_id", "execution_number", "response_type", "status", "message_count", "content_bytes", "cost_usd"],
+            source
+        )
+    )
+
+    # 为刚写入、还没有消息的修复日志补上消息，并写入全文索引
+    last_message_id = db.query(func.coalesce(func.max(TaskExecutionMessage.id), 0)).scalar()
+    db.execute(
+        insert(TaskExecutionMessage).from_select(
+            ["execution_log_id", "seq", "message_type", "payload"],
+            select(
+                TaskExecutionLog.id,
+                literal(0),
+                literal("reconcile"),
+                literal(payload, LargeBinary)
+            ).where(
+                TaskExecutionLog.response_type == "reconciled",
+                ~exists().where(TaskExecutionMessage.execution_log_id == TaskExecutionLog.id)
+            )
+        )
+    )
+    new_message_ids = db.query(TaskExecutionMessage.id).filter(TaskExecutionMessage.id > last_message_id).all()
+    index_execution_messages(db, [(message_id, message) for (message_id,) in new_message_ids])
+
+    return result.rowcount or 0
+
+
+def reconcile_orphaned_executions(db: Session, policy: str = None) -> dict:
+    """
+    修复孤立的执行状态，返回各类修复数量
+    policy: fail - 标记为失败；requeue - 重新写入执行队列
+    """
+    policy = policy or settings.orphan_execution_policy
+    if policy not in (ORPHAN_POLICY_FAIL, ORPHAN_POLICY_REQUEUE):
+        raise ValueError(f"未知的孤立执行处理策略: {policy}")
+
+    now = datetime.now()
+    stats = {"policy": policy}
+
+    # 1. 租约已过期的运行中作业：requeue 策略下未超过最大认领次数的重新置为等待，其余标记失败
+    expired = and_(ExecutionJob.status == "running", ExecutionJob.lease_expires_at < now)
+    requeued_jobs = 0
+    if policy == ORPHAN_POLICY_REQUEUE:
+        requeued_jobs = db.execute(
+            update(ExecutionJob)
+            .where(expired, ExecutionJob.attempts < settings.job_max_attempts)
+            .values(status="pending", worker_id=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    failed_jobs = db.execute(
+        update(ExecutionJob)
+        .where(expired)
+        .values(status="failed", error_message="worker 失联，执行中断", finished_at=now, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    stats["requeued_jobs"] = requeued_jobs
+    stats["failed_jobs"] = failed_jobs
+
+    # 2. 处于 progress 但没有存活作业的任务
+    orphan_filter = and_(Task.status == "progress", ~_live_job_exists(now))
+
+    # 中断时仍在增量写入的执行日志，保留已写入的消息并标记失败
+    stats["interrupted_logs"] = db.execute(
+        update(TaskExecutionLog)
+        .where(
+            TaskExecutionLog.status == "running",
+            TaskExecutionLog.task_id.in_(select(Task.id).where(orphan_filter))
+        )
+        .values(status="failed", response_type="failed")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    if policy == ORPHAN_POLICY_REQUEUE:
+        message = "服务重启后检测到执行中断，任务已重新加入执行队列"
+        stats["orphan_tasks"] = _insert_reconcile_logs(db, orphan_filter, message, "failed")
+        db.execute(
+            insert(ExecutionJob).from_select(
+                ["id", "task_id", "workspace_id", "kind", "execution_id", "status", "payload", "attempts", "created_at"],
+                select(
+                    _random_id,
+                    Task.id,
+                    Task.workspace_id,
+                    literal("recovery"),
+                    Task.execution_id,
+                    literal("pending"),
+                    literal("{}"),
+                    literal(0),
+                    literal(now)
+                ).where(orphan_filter)
+            )
+        )
+    else:
+        message = "服务重启后检测到执行中断，任务已标记为失败"
+        stats["orphan_tasks"] = _insert_reconcile_logs(db, orphan_filter, message, "failed")
+        db.execute(
+            update(Task)
+            .where(orphan_filter)
+            .values(status="failed", error_message=message)
+            .execution_options(synchronize_session=False)
+        )
+
+    # 3. 执行进程已退出（租约过期或没有租约）的 running 队列；其它进程仍在续约的队列保持运行
+    expired_queue = and_(
+        TaskQueue.status == "running",
+        or_(TaskQueue.lease_expires_at.is_(None), TaskQueue.lease_expires_at < now)
+    )
+    stats["interrupted_queue_tasks"] = db.execute(
+        update(QueueTask)
+        .where(
+            QueueTask.status == "progress",
+            QueueTask.queue_id.in_(select(TaskQueue.id).where(expired_queue))
+        )
+        .values(status="failed", error_reason="服务重启，队列执行中断")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    stats["interrupted_queues"] = db.execute(
+        update(TaskQueue)
+        .where(expired_queue)
+        .values(status="failed", lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    db.commit()
+
+    logger.info(f"执行状态修复完成: {stats}")
+    return stats
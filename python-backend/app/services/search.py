@@ -0,0 +1,262 @@
+"""
+全文搜索
+基于 SQLite FTS5 为任务（标题、描述）、通知（标题、内容）和执行日志消息建立全文索引。
+任务和通知的索引是外部内容表（content=...），只保存倒排索引、不复制原文，由触发器与源表保持同步；
+执行日志消息是压缩保存的，触发器无法读取，由 execution_log_store 追加消息时写入无内容索引（content=''），
+命中片段在读取消息后生成。
+使用 trigram 分词，中文和英文都按子串匹配，检索词至少需要 3 个字符。
+
+重建索引: python -m app.services.search rebuild
+整理数据库（VACUUM 后重建索引）: python -m app.services.search vacuum
+"""
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.sql import column as sql_column
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# trigram 分词下可被索引匹配的最短检索词长度
+MIN_TERM_LENGTH = 3
+
+# 索引名 -> (源表, 索引列)
+SEARCH_INDEXES = {
+    "tasks_fts": ("tasks", ["title", "description"]),
+    "notifications_fts": ("notifications", ["title", "content"]),
+}
+
+# 执行日志消息的无内容索引，rowid 为 task_execution_messages.id
+MESSAGE_INDEX = "execution_messages_fts"
+
+# 旧版直接索引 task_execution_logs.response_content 的索引，日志改为逐条消息保存后删除
+_LEGACY_INDEX = "execution_logs_fts"
+
+# 当前数据库是否支持 FTS5，init_search_index 时检测
+search_available = False
+
+
+def _index_ddl(name: str, source: str, columns: List[str]) -> List[str]:
+    """
+    外部内容索引以源表的隐式 rowid 关联（tasks、notifications 的主键是字符串，没有 INTEGER PRIMARY KEY），
+    SQLite 不保证 rowid 稳定：VACUUM、导出再导入（.dump / .recover）或重建表都可能重新编号，
+    之后索引会指向错误的行，必须重建索引。整理数据库使用 vacuum_database，其它维护操作后运行 rebuild
+    """
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        f"{cols}, content='{source}', content_rowid='rowid', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {name}(rowid, {cols}) VALUES (new.rowid, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values}); END",
+        # 只在索引列变化时更新索引，状态等字段的频繁更新不触发
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values}); "
+        f"INSERT INTO {name}(rowid, {cols}) VALUES (new.rowid, {new_values}); END",
+    ]
+
+
+def init_search_index(engine):
+    """创建全文索引表和同步触发器，新建的索引会从源表完整构建一次"""
+    global search_available
+    with engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        }
+        try:
+            for name, (source, columns) in SEARCH_INDEXES.items():
+                for ddl in _index_ddl(name, source, columns):
+                    conn.execute(text(ddl))
+                if name not in existing:
+                    conn.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+
+            for suffix in ("ai", "ad", "au"):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {_LEGACY_INDEX}_{suffix}"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {_LEGACY_INDEX}"))
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {MESSAGE_INDEX} USING fts5("
+                f"content, content='', tokenize='trigram')"
+            ))
+        except OperationalError as e:
+            logger.warning(f"SQLite 不支持 FTS5，全文搜索不可用: {str(e)}")
+            search_available = False
+            return
+    search_available = True
+
+
+def index_execution_messages(db: Session, entries: List[Tuple[int, str]]):
+    """把执行日志消息的文本写入全文索引，entries 为 (消息 id, 文本)"""
+    if not search_available:
+        return
+    entries = [{"rowid": rowid, "content": content} for rowid, content in entries if content]
+    if entries:
+        db.execute(text(f"INSERT INTO {MESSAGE_INDEX}(rowid, content) VALUES (:rowid, :content)"), entries)
+
+
+def _rebuild_message_index(db: Session, batch_size: int = 1000):
+    from app.models import TaskExecutionMessage
+    from app.services.execution_log_store import decode_message, message_text
+
+    db.execute(text(f"INSERT INTO {MESSAGE_INDEX}({MESSAGE_INDEX}) VALUES ('delete-all')"))
+    last_id = 0
+    while True:
+        rows = db.query(TaskExecutionMessage.id, TaskExecutionMessage.payload).filter(
+            TaskExecutionMessage.id > last_id
+        ).order_by(TaskExecutionMessage.id).limit(batch_size).all()
+        if not rows:
+            break
+        index_execution_messages(db, [(row_id, message_text(decode_message(payload))) for row_id, payload in rows])
+        last_id = rows[-1][0]
+
+
+def rebuild_search_index(db: Session, names: Optional[List[str]] = None) -> List[str]:
+    """从源表重建全文索引（索引与源表不一致时使用），返回重建的索引名"""
+    names = names or list(SEARCH_INDEXES) + [MESSAGE_INDEX]
+    for name in names:
+        if name == MESSAGE_INDEX:
+            _rebuild_message_index(db)
+        elif name in SEARCH_INDEXES:
+            db.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+        else:
+            raise ValueError(f"未知的搜索索引: {name}")
+        db.execute(text(f"INSERT INTO {name}({name}) VALUES ('optimize')"))
+    db.commit()
+    logger.info(f"全文索引已重建: {names}")
+    return names
+
+
+def vacuum_database(engine) -> List[str]:
+    """整理数据库文件（VACUUM）并重建外部内容索引（VACUUM 可能重新编号 rowid，见 _index_ddl），返回重建的索引名"""
+    # VACUUM 不能在事务中执行
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+    logger.info("数据库已整理 (VACUUM)")
+    if not search_available:
+        return []
+    # 执行日志消息的索引以 INTEGER PRIMARY KEY 关联，不受影响
+    with Session(bind=engine) as db:
+        return rebuild_search_index(db, list(SEARCH_INDEXES))
+
+
+def build_match_query(keyword: str, column: Optional[str] = None) -> Optional[str]:
+    """
+    把用户输入转换为 FTS5 查询：按空白拆分，每个词作为短语（子串）匹配，多个词之间为 AND
+    存在无法被索引的词（短于 3 个字符）时返回 None，由调用方回退到 LIKE
+    """
+    terms = keyword.split()
+    if not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        return None
+    query = " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+    if column:
+        query = f"{column} : ({query})"
+    return query
+
+
+def fts_rowids(name: str, keyword: str, column: Optional[str] = None):
+    """
+    返回匹配关键词的源表 rowid 子查询，用于列表接口的搜索筛选
+    FTS5 不可用或关键词过短时返回 None
+    """
+    if not search_available:
+        return None
+    match = build_match_query(keyword, column)
+    if match is None:
+        return None
+    return text(f"SELECT rowid FROM {name} WHERE {name} MATCH :match").bindparams(match=match).columns(sql_column("rowid"))
+
+
+def _snippet(name: str, column_index: int = -1) -> str:
+    return f"snippet({name}, {column_index}, '<mark>', '</mark>', '…', 24)"
+
+
+def search_tasks(db: Session, match: str, workspace_id: Optional[str], limit: int) -> List[dict]:
+    rows = db.execute(text(f"""
+        SELECT t.id, t.workspace_id, t.title, t.status, t.priority, t.created_at,
+               {_snippet('tasks_fts')} AS snippet, tasks_fts.rank AS rank
+        FROM tasks_fts JOIN tasks t ON t.rowid = tasks_fts.rowid
+        WHERE tasks_fts MATCH :match AND (:workspace_id IS NULL OR t.workspace_id = :workspace_id)
+        ORDER BY tasks_fts.rank
+        LIMIT :limit
+    """), {"match": match, "workspace_id": workspace_id, "limit": limit}).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def search_notifications(db: Session, match: str, workspace_id: Optional[str], limit: int) -> List[dict]:
+    rows = db.execute(text(f"""
+        SELECT n.id, n.type, n.title, n.related_task_id, n.is_read, n.created_at,
+               {_snippet('notifications_fts')} AS snippet, notifications_fts.rank AS rank
+        FROM notifications_fts
+        JOIN notifications n ON n.rowid = notifications_fts.rowid
+        LEFT JOIN tasks t ON t.id = n.related_task_id
+        WHERE notifications_fts MATCH :match AND (:workspace_id IS NULL OR t.workspace_id = :workspace_id)
+        ORDER BY notifications_fts.rank
+        LIMIT :limit
+    """), {"match": match, "workspace_id": workspace_id, "limit": limit}).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def _make_snippet(content: str, match: str, width: int = 48) -> str:
+    """在消息文本中截取第一个命中词附近的片段并高亮所有命中词"""
+    terms = [term.replace('""', '"') for term in re.findall(r'"((?:[^"]|"")*)"', match)]
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    first = pattern.search(content)
+    start = max(first.start() - width, 0) if first else 0
+    end = min((first.end() if first else 0) + width, len(content))
+    fragment = pattern.sub(lambda m: f"<mark>{m.group(0)}</mark>", content[start:end])
+    return ("…" if start > 0 else "") + fragment + ("…" if end < len(content) else "")
+
+
+def search_execution_logs(db: Session, match: str, workspace_id: Optional[str], limit: int) -> List[dict]:
+    from app.services.execution_log_store import decode_message, message_text
+
+    # 已删除消息在无内容索引中的残留条目通过 JOIN 过滤
+    rows = db.execute(text(f"""
+        SELECT l.task_id, t.title AS task_title, t.workspace_id, l.execution_number,
+               l.response_type, l.created_at, m.seq, m.payload, {MESSAGE_INDEX}.rank AS rank
+        FROM {MESSAGE_INDEX}
+        JOIN task_execution_messages m ON m.id = {MESSAGE_INDEX}.rowid
+        JOIN task_execution_logs l ON l.id = m.execution_log_id
+        JOIN tasks t ON t.id = l.task_id
+        WHERE {MESSAGE_INDEX} MATCH :match AND (:workspace_id IS NULL OR t.workspace_id = :workspace_id)
+        ORDER BY {MESSAGE_INDEX}.rank
+        LIMIT :limit
+    """), {"match": match, "workspace_id": workspace_id, "limit": limit}).mappings().all()
+
+    hits = []
+    for row in rows:
+        hit = dict(row)
+        hit["snippet"] = _make_snippet(message_text(decode_message(hit.pop("payload"))), match)
+        hits.append(hit)
+    return hits
+
+
+if __name__ == "__main__":
+    import sys
+
+    import app.models  # noqa: F401  注册模型，init_db 才会创建所有表
+    from app.database import SessionLocal, engine, init_db
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "vacuum"):
+        print("用法: python -m app.services.search rebuild [索引名 ...] | vacuum")
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    if sys.argv[1] == "vacuum":
+        # 以 -m 运行时本模块是 __main__，FTS5 是否可用记录在 init_db 导入的模块中
+        from app.services import search
+
+        print(f"已整理数据库并重建: {search.vacuum_database(engine)}")
+        sys.exit(0)
+
+    session = SessionLocal()
+    try:
+        print(f"已重建: {rebuild_search_index(session, sys.argv[2:] or None)}")
+    finally:
+        session.close()
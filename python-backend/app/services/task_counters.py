@@ -0,0 +1,95 @@
+"""
+工作区任务计数
+workspaces 表上按状态冗余保存任务数，读取工作区统计时不再对 tasks 表做 count()。
+计数在 Task 新增、删除或状态变化时随同一事务的 flush 一起更新；
+绕过 ORM 的批量更新（例如启动时的执行状态修复）之后需要调用 recount_workspace_task_counters 重新统计。
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from app.models import Task, Workspace
+
+logger = logging.getLogger(__name__)
+
+# 任务状态 -> 工作区计数列
+COUNTER_COLUMNS = {
+    "pending": "pending_task_count",
+    "progress": "progress_task_count",
+    "completed": "completed_task_count",
+    "failed": "failed_task_count"
+}
+
+
+def _previous_value(task: Task, attribute: str):
+    history = get_history(task, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(task, attribute)
+
+
+@event.listens_for(Task.status, "set", active_history=True)
+@event.listens_for(Task.workspace_id, "set", active_history=True)
+def _keep_previous_value(target, value, oldvalue, initiator):
+    """修改已过期的任务（例如提交后未刷新）时先加载旧值，否则无法得知计数应从哪一列减去"""
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_task_counter_deltas(session: Session, flush_context):
+    """根据本次 flush 中 Task 的新增 / 删除 / 状态变化，在同一事务内增减工作区计数"""
+    deltas: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    for obj in session.new:
+        if isinstance(obj, Task):
+            deltas[(obj.workspace_id, obj.status or "pending")] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            deltas[(_previous_value(obj, "workspace_id"), _previous_value(obj, "status"))] -= 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, Task):
+            continue
+        old_key = (_previous_value(obj, "workspace_id"), _previous_value(obj, "status"))
+        new_key = (obj.workspace_id, obj.status)
+        if old_key != new_key:
+            deltas[old_key] -= 1
+            deltas[new_key] += 1
+
+    # 合并为每个工作区一条 UPDATE
+    workspace_deltas: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for (workspace_id, status), delta in deltas.items():
+        column = COUNTER_COLUMNS.get(status)
+        if workspace_id and column and delta:
+            workspace_deltas[workspace_id][column] = delta
+
+    connection = session.connection()
+    table = Workspace.__table__
+    for workspace_id, columns in workspace_deltas.items():
+        connection.execute(
+            update(table)
+            .where(table.c.id == workspace_id)
+            .values({column: table.c[column] + delta for column, delta in columns.items()})
+        )
+
+
+def recount_workspace_task_counters(db: Session, workspace_id: Optional[str] = None) -> int:
+    """按 tasks 表重新统计工作区任务计数，返回更新的工作区数"""
+    values = {
+        column: select(func.count(Task.id)).where(
+            Task.workspace_id == Workspace.id,
+            Task.status == status
+        ).scalar_subquery()
+        for status, column in COUNTER_COLUMNS.items()
+    }
+    statement = update(Workspace).values(values).execution_options(synchronize_session=False)
+    if workspace_id:
+        statement = statement.where(Workspace.id == workspace_id)
+    updated = db.execute(statement).rowcount
+    db.commit()
+    logger.info(f"工作区任务计数已重新统计: {updated} 个工作区")
+    return updated
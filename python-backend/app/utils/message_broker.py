@@ -0,0 +1,400 @@
+"""
+消息流代理
+MessageStreamManager 的订阅者和内存缓冲都在进程内，多个 API worker 进程（或独立部署的作业 worker）之间
+由代理转发消息流事件：本进程产生的事件直接投递给本进程的订阅者，同时经代理发送给其它进程。
+- memory: 单进程，不转发（默认）
+- sqlite: 通过共享的 SQLite 文件作为变更流，各进程轮询读取，适合单机多进程
+- redis: 通过 Redis 兼容服务的发布订阅（RESP 协议，不依赖 redis 客户端库）
+转发是尽力而为的：代理不可用时事件只在本进程投递，客户端断线重连时从执行日志补发缺失的消息。
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+from urllib.parse import unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# 每批最多转发的事件数
+SEND_BATCH_SIZE = 100
+
+
+class MessageBroker:
+    """消息代理接口：把本进程产生的消息流事件转发给其它进程，并把其它进程的事件交给 deliver 投递"""
+
+    name = "memory"
+
+    def __init__(self):
+        # 区分事件来源，收到本进程发出的事件时跳过
+        self.origin = uuid.uuid4().hex
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self._deliver: Optional[Callable[[dict], None]] = None
+
+    async def start(self, deliver: Callable[[dict], None]):
+        self._deliver = deliver
+
+    def publish(self, envelope: dict):
+        """发送事件给其它进程（不等待），本进程的投递由调用方完成"""
+
+    async def stop(self):
+        self._deliver = None
+
+    def stats(self) -> dict:
+        return {
+            "broker": self.name,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped
+        }
+
+    def _receive(self, envelope: dict):
+        if envelope.get("origin") == self.origin or self._deliver is None:
+            return
+        self.received += 1
+        try:
+            self._deliver(envelope)
+        except Exception as e:
+            logger.error(f"投递消息流事件失败: {str(e)}", exc_info=True)
+
+
+class InMemoryBroker(MessageBroker):
+    """单进程：事件只在本进程投递"""
+
+
+class _ForwardingBroker(MessageBroker, ABC):
+    """经外部存储转发事件的代理：发送队列 + 后台发送、接收任务，子类实现 _send 和 _receive_loop"""
+
+    def __init__(self, queue_size: int = 10000):
+        super().__init__()
+        self.queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outgoing: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, deliver: Callable[[dict], None]):
+        await super().start(deliver)
+        self._loop = asyncio.get_running_loop()
+        self._outgoing = asyncio.Queue()
+        await self._open()
+        self._tasks = [
+            asyncio.create_task(self._send_loop()),
+            asyncio.create_task(self._receive_loop())
+        ]
+        logger.info(f"消息流代理 {self.name} 已启动")
+
+    def publish(self, envelope: dict):
+        if self._loop is None or self._loop.is_closed():
+            # 未启动（例如命令行脚本）时只在本进程投递
+            return
+        envelope = dict(envelope, origin=self.origin)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._enqueue(envelope)
+        else:
+            # 同步接口在线程池中调用
+            self._loop.call_soon_threadsafe(self._enqueue, envelope)
+
+    async def stop(self, timeout: float = 2.0):
+        if self._loop is None:
+            return
+        # 尽量发送完队列中的事件
+        deadline = time.monotonic() + timeout
+        while self._outgoing is not None and not self._outgoing.empty() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+        await self._close()
+        self._loop = None
+        await super().stop()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["pending"] = self._outgoing.qsize() if self._outgoing is not None else 0
+        return stats
+
+    def _enqueue(self, envelope: dict):
+        if self._outgoing.qsize() >= self.queue_size:
+            # 代理不可用时不无限积压，丢弃最早的事件
+            self._outgoing.get_nowait()
+            self.dropped += 1
+        self._outgoing.put_nowait(envelope)
+
+    async def _send_loop(self):
+        while True:
+            batch = [await self._outgoing.get()]
+            while not self._outgoing.empty() and len(batch) < SEND_BATCH_SIZE:
+                batch.append(self._outgoing.get_nowait())
+            payloads = [json.dumps(envelope, ensure_ascii=False, default=str) for envelope in batch]
+            try:
+                await self._send(payloads)
+                self.published += len(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"消息流代理 {self.name} 发送失败: {str(e)}")
+                await asyncio.sleep(1.0)
+
+    def _receive_payload(self, payload):
+        try:
+            envelope = json.loads(payload)
+        except (TypeError, ValueError):
+            logger.warning(f"消息流代理 {self.name} 收到无效事件")
+            return
+        self._receive(envelope)
+
+    async def _open(self):
+        pass
+
+    async def _close(self):
+        pass
+
+    @abstractmethod
+    async def _send(self, payloads: List[str]):
+        """发送一批序列化后的事件"""
+
+    @abstractmethod
+    async def _receive_loop(self):
+        """持续接收其它进程的事件，交给 _receive_payload 投递"""
+
+
+class SqliteBroker(_ForwardingBroker):
+    """
+    以共享 SQLite 文件作为变更流：发送方追加行，各进程按自增 id 轮询读取新行
+    只用于转发实时事件，超过 retention_seconds 的行定期删除；与业务数据库分开，避免与业务写入争用写锁
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, poll_interval: float = 0.05, retention_seconds: float = 60.0, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._last_prune = 0.0
+
+    async def _open(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stream_feed ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_stream_feed_created_at ON stream_feed (created_at)")
+            # 只转发启动之后的事件
+            self._last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM stream_feed").fetchone()[0]
+
+    async def _close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    def _write(self, payloads: List[str]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO stream_feed (origin, payload, created_at) VALUES (?, ?, ?)",
+                    [(self.origin, payload, now) for payload in payloads]
+                )
+                if now - self._last_prune >= self.retention_seconds:
+                    self._conn.execute("DELETE FROM stream_feed WHERE created_at < ?", (now - self.retention_seconds,))
+                    self._last_prune = now
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _read(self) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, origin, payload FROM stream_feed WHERE id > ? ORDER BY id LIMIT 1000",
+                (self._last_id,)
+            ).fetchall()
+
+    async def _send(self, payloads: List[str]):
+        await asyncio.to_thread(self._write, payloads)
+
+    async def _receive_loop(self):
+        while True:
+            try:
+                rows = await asyncio.to_thread(self._read)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"读取消息流变更失败: {str(e)}")
+                rows = []
+            for row_id, origin, payload in rows:
+                self._last_id = row_id
+                if origin != self.origin:
+                    self._receive_payload(payload)
+            if len(rows) < 1000:
+                await asyncio.sleep(self.poll_interval)
+
+
+class RedisBroker(_ForwardingBroker):
+    """
+    经 Redis 兼容服务（Redis、Valkey、KeyDB 或本地替身）的发布订阅转发事件
+    直接使用 RESP 协议，只用到 AUTH、PUBLISH、SUBSCRIBE 三个命令；断线后自动重连，断开期间的事件不补发
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str = "axis:message-stream", reconnect_interval: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        parts = urlsplit(url)
+        if parts.scheme not in ("redis", "unix"):
+            raise ValueError(f"不支持的消息流代理地址: {url}")
+        self.url = url
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+        self._unix_path = parts.path if parts.scheme == "unix" else None
+        self._host = parts.hostname or "localhost"
+        self._port = parts.port or 6379
+        self._username = unquote(parts.username) if parts.username else None
+        self._password = unquote(parts.password) if parts.password else None
+        self._publisher: Optional[tuple] = None
+        self.connected = False
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["connected"] = self.connected
+        return stats
+
+    async def _connect(self) -> tuple:
+        if self._unix_path:
+            reader, writer = await asyncio.open_unix_connection(self._unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(self._host, self._port)
+        if self._password:
+            args = [self._username, self._password] if self._username else [self._password]
+            await self._command(reader, writer, "AUTH", *args)
+        return reader, writer
+
+    async def _close(self):
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+    async def _send(self, payloads: List[str]):
+        if self._publisher is None:
+            self._publisher = await self._connect()
+        reader, writer = self._publisher
+        try:
+            # 流水线发送，再依次读取回复
+            for payload in payloads:
+                writer.write(_encode_command("PUBLISH", self.channel, payload))
+            await writer.drain()
+            for _ in payloads:
+                await _read_reply(reader)
+        except Exception:
+            writer.close()
+            self._publisher = None
+            raise
+
+    async def _receive_loop(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                await self._command(reader, writer, "SUBSCRIBE", self.channel)
+                self.connected = True
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        self._receive_payload(reply[2].decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"消息流代理连接断开，{self.reconnect_interval} 秒后重连: {str(e)}")
+            finally:
+                self.connected = False
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(self.reconnect_interval)
+
+    @staticmethod
+    async def _command(reader, writer, *args):
+        writer.write(_encode_command(*args))
+        await writer.drain()
+        return await _read_reply(reader)
+
+
+class RedisError(Exception):
+    """Redis 兼容服务返回的错误"""
+
+
+def _encode_command(*args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("连接已关闭")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body
+    if kind == b"-":
+        raise RedisError(body.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind in (b"*", b">"):
+        length = int(body)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise RedisError(f"无法解析的回复: {line!r}")
+
+
+def create_broker(
+    kind: str,
+    url: Optional[str] = None,
+    sqlite_path: Optional[str] = None,
+    poll_interval: float = 0.05
+) -> MessageBroker:
+    """按配置创建消息代理"""
+    if kind == "memory":
+        return InMemoryBroker()
+    if kind == "sqlite":
+        return SqliteBroker(sqlite_path, poll_interval=poll_interval)
+    if kind == "redis":
+        return RedisBroker(url)
+    raise ValueError(f"未知的消息流代理: {kind}")
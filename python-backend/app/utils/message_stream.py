@@ -1,11 +1,185 @@
 """
 任务消息流管理器
 用于实时推送任务执行过程中的消息
+每个任务只在内存中保留最近的一段消息（环形缓冲），执行结束的消息流超过 TTL 后回收，
+所有任务保留的消息总大小超过内存预算时优先回收最早结束的消息流（写入消息时回收，空闲时由后台定期回收）；
+完整日志以数据库中的执行日志为准。
+每个订阅者使用有界队列，推送不等待订阅者；订阅者队列已满（消费过慢）时按配置的策略处理：
+- drop_oldest: 丢弃队列中最早的消息
+- coalesce: 优先丢弃队列中只表示进度的消息（没有文本内容），没有时丢弃最早的消息
+- disconnect: 清空队列并通知订阅者断开，由客户端重新连接
+消息带有事件 ID (执行次数, 消息序号)，与执行日志中的位置一致；断线重连时只补发 Last-Event-ID 之后的消息，
+内存中已回收的部分由调用方从执行日志读取。
+多路连接（open_connection）在一个订阅者上同时订阅多个任务和整个工作区，订阅范围可以随时修改。
+多进程部署时由消息代理（message_broker）在进程之间转发事件，每个进程各自维护缓冲和订阅者；
+连接只存在于建立它的进程中，其它进程收到的订阅变更经代理转发给该进程（forward_subscription）。
+管理器不加锁，只能在事件循环中访问（接口使用 async def），不要在线程池中调用。
 """
 import asyncio
-from typing import Dict, List
-from collections import defaultdict
 import json
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.utils.message_broker import MessageBroker, create_broker
+
+
+# 后台回收过期消息流的间隔上限（秒）
+SWEEP_INTERVAL_SECONDS = 30
+
+# 事件 ID: (执行次数, 消息序号)
+EventId = Tuple[int, int]
+# 消息流中的一条事件
+StreamEvent = Tuple[Optional[EventId], dict]
+# 订阅者队列中的事件，带有所属任务 (task_id, 事件 ID, 消息)
+TaggedEvent = Tuple[Optional[str], Optional[EventId], dict]
+
+
+def format_event_id(event_id: EventId) -> str:
+    return f"{event_id[0]}.{event_id[1]}"
+
+
+def parse_event_id(value: Optional[str]) -> Optional[EventId]:
+    """解析 SSE 的 Last-Event-ID，格式无效时返回 None"""
+    try:
+        execution_number, seq = value.split(".")
+        return int(execution_number), int(seq)
+    except (AttributeError, ValueError):
+        return None
+
+
+class _TaskStream:
+    """单个任务的消息缓冲"""
+
+    __slots__ = ("events", "sizes", "bytes", "workspace_id")
+
+    def __init__(self, max_messages: int):
+        self.events: Deque[StreamEvent] = deque(maxlen=max_messages)
+        self.sizes: Deque[int] = deque(maxlen=max_messages)
+        self.bytes = 0
+        self.workspace_id: Optional[str] = None
+
+    def append(self, event: StreamEvent, size: int) -> int:
+        """追加事件，返回因缓冲已满被挤出的消息数"""
+        evicted = 0
+        if len(self.events) == self.events.maxlen:
+            self.bytes -= self.sizes[0]
+            evicted = 1
+        self.events.append(event)
+        self.sizes.append(size)
+        self.bytes += size
+        return evicted
+
+    def pop_oldest(self):
+        self.events.popleft()
+        self.bytes -= self.sizes.popleft()
+
+
+SLOW_CONSUMER_DROP_OLDEST = "drop_oldest"
+SLOW_CONSUMER_COALESCE = "coalesce"
+SLOW_CONSUMER_DISCONNECT = "disconnect"
+SLOW_CONSUMER_POLICIES = (SLOW_CONSUMER_DROP_OLDEST, SLOW_CONSUMER_COALESCE, SLOW_CONSUMER_DISCONNECT)
+
+# disconnect 策略下通知订阅者断开的消息类型
+STREAM_OVERFLOW = "stream_overflow"
+# 多路连接订阅范围变更后推送给订阅者的消息类型
+SUBSCRIPTION_UPDATED = "subscription_updated"
+
+# 判断消息是否只表示进度时忽略的字段
+_PROGRESS_FIELDS = {"type", "raw", "progress", "subtype"}
+
+
+def _is_progress_only(message: dict) -> bool:
+    return message.get("type") != "ResultMessage" and set(message) <= _PROGRESS_FIELDS
+
+
+class StreamSubscriber:
+    """单个订阅者的有界消息队列，可以订阅多个任务和工作区"""
+
+    def __init__(
+        self,
+        max_size: int,
+        policy: str,
+        task_ids: Iterable[str] = (),
+        workspace_ids: Iterable[str] = (),
+        connection_id: Optional[str] = None
+    ):
+        self.task_ids: Set[str] = set(task_ids)
+        self.workspace_ids: Set[str] = set(workspace_ids)
+        self.connection_id = connection_id
+        self.max_size = max_size
+        self.policy = policy
+        self.connected_at = time.time()
+        self.closed = False
+        self.delivered = 0  # 放入队列的消息数
+        self.dropped = 0  # 因队列已满丢弃的消息数（含合并的进度消息）
+        self.coalesced = 0  # 其中被合并的进度消息数
+        self.max_lag = 0  # 队列中积压消息数的最大值
+        self._events: Deque[TaggedEvent] = deque()
+        self._ready = asyncio.Event()
+
+    @property
+    def lag(self) -> int:
+        return len(self._events)
+
+    async def get(self) -> TaggedEvent:
+        """取出下一条事件 (task_id, 事件 ID, 消息)"""
+        while not self._events:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._events.popleft()
+
+    def empty(self) -> bool:
+        return not self._events
+
+    def first_event_id(self) -> Optional[EventId]:
+        """队列中第一条事件的 ID，用于判断重连时内存缓冲之前是否有缺失"""
+        return self._events[0][1] if self._events else None
+
+    def offer(self, event: TaggedEvent):
+        """不阻塞地放入事件，队列已满时按策略处理"""
+        if self.closed:
+            return
+        if len(self._events) >= self.max_size:
+            if self.policy == SLOW_CONSUMER_DISCONNECT:
+                self.dropped += len(self._events) + 1
+                self._events.clear()
+                self.closed = True
+                event = (None, None, {"type": STREAM_OVERFLOW, "message": "消息消费过慢，连接已断开，请重新连接"})
+            else:
+                if not (self.policy == SLOW_CONSUMER_COALESCE and self._drop_progress()):
+                    self._events.popleft()
+                self.dropped += 1
+        self._events.append(event)
+        self.delivered += 1
+        self.max_lag = max(self.max_lag, len(self._events))
+        self._ready.set()
+
+    def stats(self) -> dict:
+        return {
+            "connection_id": self.connection_id,
+            "task_ids": sorted(self.task_ids),
+            "workspace_ids": sorted(self.workspace_ids),
+            "connected_at": self.connected_at,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "closed": self.closed
+        }
+
+    def _drop_progress(self) -> bool:
+        """丢弃队列中最早的一条进度消息，没有时返回 False"""
+        for index, (_, _, message) in enumerate(self._events):
+            if _is_progress_only(message):
+                del self._events[index]
+                self.coalesced += 1
+                return True
+        return False
+
 
 class MessageStreamManager:
     """管理任务消息流的单例类"""
@@ -22,52 +196,359 @@ class MessageStreamManager:
         if self._initialized:
             return
         self._initialized = True
-        # 存储每个任务的消息队列 {task_id: [messages]}
-        self.task_messages: Dict[str, List[dict]] = defaultdict(list)
-        # 存储每个任务的订阅者队列 {task_id: [asyncio.Queue]}
-        self.task_subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
-
-    async def add_message(self, task_id: str, message: dict):
-        """添加消息到任务流"""
-        # 存储消息历史
-        self.task_messages[task_id].append(message)
-
-        # 推送给所有订阅者
-        if task_id in self.task_subscribers:
-            for queue in self.task_subscribers[task_id]:
-                try:
-                    await queue.put(message)
-                except:
-                    pass
-
-    async def subscribe(self, task_id: str) -> asyncio.Queue:
-        """订阅任务消息流"""
-        queue = asyncio.Queue()
-        self.task_subscribers[task_id].append(queue)
+        self.buffer_size = settings.message_stream_buffer_size
+        self.finished_ttl_seconds = settings.message_stream_finished_ttl_seconds
+        self.memory_budget_bytes = settings.message_stream_memory_budget_bytes
+        self.subscriber_queue_size = settings.message_stream_subscriber_queue_size
+        self.slow_consumer_policy = settings.message_stream_slow_consumer_policy
+        if self.slow_consumer_policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"未知的慢订阅者处理策略: {self.slow_consumer_policy}")
+        # 每个任务的消息缓冲 {task_id: _TaskStream}
+        self._streams: Dict[str, _TaskStream] = {}
+        # 已结束的消息流，按结束先后排列 {task_id: 结束时间}
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        # 所有缓冲中消息的总字节数（按 JSON 序列化后的长度估算）
+        self._retained_bytes = 0
+        self._evicted_streams = 0
+        self._evicted_messages = 0
+        # 存储每个任务的订阅者 {task_id: [StreamSubscriber]}
+        self.task_subscribers: Dict[str, List[StreamSubscriber]] = defaultdict(list)
+        # 订阅整个工作区的订阅者 {workspace_id: [StreamSubscriber]}
+        self.workspace_subscribers: Dict[str, List[StreamSubscriber]] = defaultdict(list)
+        # 多路连接 {connection_id: StreamSubscriber}
+        self._connections: Dict[str, StreamSubscriber] = {}
+        # 已断开订阅者的累计丢弃数
+        self._closed_subscriber_dropped = 0
+        self._disconnected_subscribers = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        self.broker: MessageBroker = create_broker(
+            settings.message_broker,
+            url=settings.message_broker_url,
+            sqlite_path=settings.message_broker_sqlite_path,
+            poll_interval=settings.message_broker_poll_interval_seconds
+        )
+
+    async def start(self):
+        """启动消息代理（接收其它进程的事件）和过期消息流的后台回收（在应用启动时调用）"""
+        await self.broker.start(self._apply)
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._run_sweeper())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        await self.broker.stop()
+
+    async def _run_sweeper(self):
+        """定期回收：服务空闲时没有新消息触发回收，已结束的消息流也要在 TTL 后释放"""
+        interval = min(SWEEP_INTERVAL_SECONDS, max(self.finished_ttl_seconds / 2, 0.1))
+        while True:
+            await asyncio.sleep(interval)
+            self._evict()
+
+    async def add_message(
+        self,
+        task_id: str,
+        message: dict,
+        event_id: Optional[EventId] = None,
+        workspace_id: Optional[str] = None
+    ):
+        """添加消息到任务流，event_id 为消息在执行日志中的位置 (执行次数, 消息序号)"""
+        self._add_local(task_id, message, event_id, workspace_id)
+        self.broker.publish({
+            "kind": "message",
+            "task_id": task_id,
+            "workspace_id": workspace_id,
+            "event_id": event_id,
+            "message": message
+        })
+
+    def _add_local(
+        self,
+        task_id: str,
+        message: dict,
+        event_id: Optional[EventId],
+        workspace_id: Optional[str]
+    ):
+        stream = self._streams.get(task_id)
+        if stream is None:
+            stream = self._streams[task_id] = _TaskStream(self.buffer_size)
+        if workspace_id:
+            stream.workspace_id = workspace_id
+        # 任务重新执行时，上一次执行的结束标记作废
+        self._finished.pop(task_id, None)
+
+        size = len(json.dumps(message, ensure_ascii=False, default=str))
+        before = stream.bytes
+        event = (event_id, message)
+        self._evicted_messages += stream.append(event, size)
+        self._retained_bytes += stream.bytes - before
+        self._evict()
+
+        # 推送给所有订阅者（不等待，慢订阅者按策略丢弃或断开）
+        tagged = (task_id, event_id, message)
+        for subscriber in self._subscribers_of(task_id, stream.workspace_id):
+            subscriber.offer(tagged)
+
+    def finish_task(self, task_id: str):
+        """标记任务的本次执行已结束，消息保留 finished_ttl_seconds 供晚到的订阅者读取"""
+        self._finish_local(task_id)
+        self.broker.publish({"kind": "finish", "task_id": task_id})
+
+    def _finish_local(self, task_id: str):
+        if task_id in self._streams:
+            self._finished.pop(task_id, None)
+            self._finished[task_id] = time.monotonic()
+        self._evict()
+
+    async def subscribe(self, task_id: str, after: Optional[EventId] = None) -> StreamSubscriber:
+        """订阅任务消息流，after 为客户端已收到的最后一条事件 ID，只补发其后的消息"""
+        subscriber = StreamSubscriber(self.subscriber_queue_size, self.slow_consumer_policy, task_ids=[task_id])
+        self.task_subscribers[task_id].append(subscriber)
 
         # 发送历史消息
-        if task_id in self.task_messages:
-            for msg in self.task_messages[task_id]:
-                await queue.put(msg)
+        for event_id, message in self.get_events(task_id, after=after):
+            subscriber.offer((task_id, event_id, message))
 
-        return queue
+        return subscriber
 
-    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+    def unsubscribe(self, task_id: str, subscriber: StreamSubscriber):
         """取消订阅"""
-        if task_id in self.task_subscribers:
-            if queue in self.task_subscribers[task_id]:
-                self.task_subscribers[task_id].remove(queue)
+        self._detach(subscriber)
+
+    def open_connection(self, task_ids: Iterable[str] = (), workspace_ids: Iterable[str] = ()) -> StreamSubscriber:
+        """打开多路连接，订阅一组任务和工作区；订阅时每个执行中的任务先推送一条最新消息作为当前状态"""
+        subscriber = StreamSubscriber(
+            self.subscriber_queue_size,
+            self.slow_consumer_policy,
+            connection_id=uuid.uuid4().hex
+        )
+        self._connections[subscriber.connection_id] = subscriber
+        self.update_connection(subscriber.connection_id, task_ids, workspace_ids, notify=False)
+        return subscriber
+
+    def update_connection(
+        self,
+        connection_id: str,
+        task_ids: Iterable[str],
+        workspace_ids: Iterable[str],
+        notify: bool = True
+    ) -> Optional[StreamSubscriber]:
+        """替换多路连接的订阅范围，连接不在本进程时返回 None；notify 时先向订阅者推送新的订阅范围"""
+        subscriber = self._connections.get(connection_id)
+        if subscriber is None:
+            return None
+        task_ids, workspace_ids = set(task_ids), set(workspace_ids)
+
+        for task_id in subscriber.task_ids - task_ids:
+            self._remove_from(self.task_subscribers, task_id, subscriber)
+        for workspace_id in subscriber.workspace_ids - workspace_ids:
+            self._remove_from(self.workspace_subscribers, workspace_id, subscriber)
+
+        added_tasks = task_ids - subscriber.task_ids
+        added_workspaces = workspace_ids - subscriber.workspace_ids
+        for task_id in added_tasks:
+            self.task_subscribers[task_id].append(subscriber)
+        for workspace_id in added_workspaces:
+            self.workspace_subscribers[workspace_id].append(subscriber)
+        covered = subscriber.task_ids | {
+            task_id for task_id, stream in self._streams.items() if stream.workspace_id in subscriber.workspace_ids
+        }
+        subscriber.task_ids, subscriber.workspace_ids = task_ids, workspace_ids
+        if notify:
+            subscriber.offer((None, None, {
+                "type": SUBSCRIPTION_UPDATED,
+                "connection_id": connection_id,
+                "task_ids": sorted(task_ids),
+                "workspace_ids": sorted(workspace_ids)
+            }))
+
+        # 新订阅的任务推送最新一条消息（之前已订阅的不重复推送）
+        for task_id, stream in self._streams.items():
+            if task_id in covered or task_id in self._finished or not stream.events:
+                continue
+            if task_id in added_tasks or stream.workspace_id in added_workspaces:
+                event_id, message = stream.events[-1]
+                subscriber.offer((task_id, event_id, message))
+        return subscriber
+
+    def forward_subscription(
+        self,
+        connection_id: str,
+        task_ids: Iterable[str],
+        workspace_ids: Iterable[str]
+    ) -> bool:
+        """连接不在本进程时经代理把订阅变更转发给持有连接的进程；单进程（memory 代理）时返回 False"""
+        if self.broker.name == "memory":
+            return False
+        self.broker.publish({
+            "kind": "subscription",
+            "connection_id": connection_id,
+            "task_ids": sorted(task_ids),
+            "workspace_ids": sorted(workspace_ids)
+        })
+        return True
+
+    def close_connection(self, connection_id: str):
+        subscriber = self._connections.pop(connection_id, None)
+        if subscriber is not None:
+            self._detach(subscriber)
+
+    def get_connection(self, connection_id: str) -> Optional[StreamSubscriber]:
+        return self._connections.get(connection_id)
 
     def clear_task(self, task_id: str):
         """清理任务数据"""
-        if task_id in self.task_messages:
-            del self.task_messages[task_id]
-        if task_id in self.task_subscribers:
-            del self.task_subscribers[task_id]
+        self._clear_local(task_id)
+        self.broker.publish({"kind": "clear", "task_id": task_id})
+
+    def _clear_local(self, task_id: str):
+        self._drop_stream(task_id)
+        for subscriber in list(self.task_subscribers.get(task_id, ())):
+            if subscriber.connection_id:
+                # 多路连接只移除该任务，连接保持
+                subscriber.task_ids.discard(task_id)
+                self._remove_from(self.task_subscribers, task_id, subscriber)
+            else:
+                self._detach(subscriber)
+
+    def get_events(self, task_id: str, after: Optional[EventId] = None) -> List[StreamEvent]:
+        """获取任务缓冲中 after 之后的事件"""
+        stream = self._streams.get(task_id)
+        if stream is None:
+            return []
+        return [event for event in stream.events if after is None or (event[0] is not None and event[0] > after)]
 
     def get_messages(self, task_id: str) -> List[dict]:
-        """获取任务的所有消息"""
-        return self.task_messages.get(task_id, [])
+        """获取任务缓冲中的消息（最近 buffer_size 条）"""
+        stream = self._streams.get(task_id)
+        return [message for _, message in stream.events] if stream else []
+
+    def stats(self) -> dict:
+        """内存占用统计"""
+        self._evict()
+        subscribers = self._all_subscribers()
+        return {
+            "streams": len(self._streams),
+            "active_streams": len(self._streams) - len(self._finished),
+            "finished_streams": len(self._finished),
+            "subscribers": len(subscribers),
+            "multiplexed_connections": len(self._connections),
+            "subscriber_queue_size": self.subscriber_queue_size,
+            "slow_consumer_policy": self.slow_consumer_policy,
+            "max_subscriber_lag": max((subscriber.lag for subscriber in subscribers), default=0),
+            "dropped_subscriber_messages": self._closed_subscriber_dropped + sum(s.dropped for s in subscribers),
+            "disconnected_subscribers": self._disconnected_subscribers + sum(s.closed for s in subscribers),
+            "retained_messages": sum(len(stream.events) for stream in self._streams.values()),
+            "retained_bytes": self._retained_bytes,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "buffer_size": self.buffer_size,
+            "evicted_streams": self._evicted_streams,
+            "evicted_messages": self._evicted_messages,
+            "broker": self.broker.stats()
+        }
+
+    def subscriber_stats(self) -> List[dict]:
+        """各订阅者的积压和丢弃情况，积压最多的在前"""
+        subscribers = self._all_subscribers()
+        return [subscriber.stats() for subscriber in sorted(subscribers, key=lambda s: s.lag, reverse=True)]
+
+    def _apply(self, envelope: dict):
+        """投递其它进程经代理转发的事件"""
+        kind = envelope.get("kind")
+        task_id = envelope.get("task_id")
+        if kind == "message":
+            event_id = envelope.get("event_id")
+            self._add_local(
+                task_id,
+                envelope.get("message") or {},
+                tuple(event_id) if event_id is not None else None,
+                envelope.get("workspace_id")
+            )
+        elif kind == "finish":
+            self._finish_local(task_id)
+        elif kind == "clear":
+            self._clear_local(task_id)
+        elif kind == "subscription":
+            # 只有持有该连接的进程会生效，其它进程忽略
+            self.update_connection(
+                envelope.get("connection_id"),
+                envelope.get("task_ids") or [],
+                envelope.get("workspace_ids") or []
+            )
+
+    def _subscribers_of(self, task_id: str, workspace_id: Optional[str]) -> List[StreamSubscriber]:
+        """订阅了该任务或其所在工作区的订阅者（同一订阅者只出现一次）"""
+        subscribers = list(self.task_subscribers.get(task_id, ()))
+        if workspace_id:
+            for subscriber in self.workspace_subscribers.get(workspace_id, ()):
+                if task_id not in subscriber.task_ids:
+                    subscribers.append(subscriber)
+        return subscribers
+
+    def _all_subscribers(self) -> List[StreamSubscriber]:
+        subscribers = {}
+        for registry in (self.task_subscribers, self.workspace_subscribers):
+            for queues in registry.values():
+                for subscriber in queues:
+                    subscribers[id(subscriber)] = subscriber
+        for subscriber in self._connections.values():
+            subscribers[id(subscriber)] = subscriber
+        return list(subscribers.values())
+
+    @staticmethod
+    def _remove_from(registry: Dict[str, List[StreamSubscriber]], key: str, subscriber: StreamSubscriber):
+        queues = registry.get(key)
+        if queues and subscriber in queues:
+            queues.remove(subscriber)
+            if not queues:
+                del registry[key]
+
+    def _detach(self, subscriber: StreamSubscriber):
+        """从所有订阅中移除订阅者并累计其丢弃数"""
+        for task_id in subscriber.task_ids:
+            self._remove_from(self.task_subscribers, task_id, subscriber)
+        for workspace_id in subscriber.workspace_ids:
+            self._remove_from(self.workspace_subscribers, workspace_id, subscriber)
+        if subscriber.connection_id:
+            self._connections.pop(subscriber.connection_id, None)
+        self._closed_subscriber_dropped += subscriber.dropped
+        self._disconnected_subscribers += subscriber.closed
+        subscriber.dropped = 0
+        subscriber.closed = False
+
+    def _drop_stream(self, task_id: str):
+        self._finished.pop(task_id, None)
+        stream = self._streams.pop(task_id, None)
+        if stream is not None:
+            self._retained_bytes -= stream.bytes
+            self._evicted_streams += 1
+            self._evicted_messages += len(stream.events)
+
+    def _evict(self):
+        """回收过期的已结束消息流；超出内存预算时先回收最早结束的消息流，再裁剪最大的执行中缓冲"""
+        now = time.monotonic()
+        while self._finished:
+            task_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at < self.finished_ttl_seconds and self._retained_bytes <= self.memory_budget_bytes:
+                break
+            self._drop_stream(task_id)
+
+        while self._retained_bytes > self.memory_budget_bytes:
+            # 每个执行中的任务至少保留最新一条消息
+            trimmable = [stream for stream in self._streams.values() if len(stream.events) > 1]
+            if not trimmable:
+                break
+            stream = max(trimmable, key=lambda s: s.bytes)
+            before = stream.bytes
+            stream.pop_oldest()
+            self._retained_bytes -= before - stream.bytes
+            self._evicted_messages += 1
 
 # 全局实例
 message_stream_manager = MessageStreamManager()
@@ -0,0 +1,87 @@
+"""
+列表分页
+支持两种方式：
+- 页码分页（page / page_size），兼容原有接口；
+- 游标分页（cursor），按 (排序列, id) 做 keyset 查询，翻页耗时与页数无关。
+游标是对最后一行排序键的不透明编码，客户端只需把上一页返回的 next_cursor 原样传回。
+"""
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, String, and_, or_, type_coerce
+from sqlalchemy.orm import Query
+
+
+def _raw(expr):
+    # 时间列按数据库中保存的原始字符串比较，避免与 Python datetime 的格式差异导致重复或遗漏
+    if isinstance(expr.type, DateTime):
+        return type_coerce(expr, String)
+    return expr
+
+
+def encode_cursor(sort_key: str, values: Sequence[Any]) -> str:
+    payload = json.dumps({"s": sort_key, "v": list(values)}, ensure_ascii=False, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str) -> List[Any]:
+    """解析游标，游标无效或与当前排序方式不一致时返回 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["v"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="分页游标无效")
+    if payload.get("s") != sort_key:
+        raise HTTPException(status_code=400, detail="分页游标与当前排序方式不一致")
+    return values
+
+
+def paginate(
+    query: Query,
+    order_by: Sequence[Any],
+    descending: bool,
+    page: int,
+    page_size: int,
+    cursor: Optional[str] = None,
+    sort_key: str = ""
+) -> Tuple[list, Optional[str]]:
+    """
+    对查询排序并取出一页，返回 (当前页数据, 下一页游标)
+    order_by: 排序表达式，最后一个必须是唯一列（通常为 id），所有列使用同一排序方向
+    传入 cursor 时使用 keyset 查询并忽略 page；没有下一页时游标为 None
+    """
+    columns = [_raw(expr) for expr in order_by]
+
+    if cursor:
+        values = decode_cursor(cursor, sort_key)
+        if len(values) != len(columns):
+            raise HTTPException(status_code=400, detail="分页游标无效")
+        # (a, b) < (x, y)  =>  a < x OR (a = x AND b < y)
+        conditions = []
+        for index, column in enumerate(columns):
+            equal = [columns[i] == values[i] for i in range(index)]
+            compare = column < values[index] if descending else column > values[index]
+            conditions.append(and_(*equal, compare))
+        query = query.filter(or_(*conditions))
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    query = query.add_columns(*columns).limit(page_size + 1)
+    if not cursor:
+        query = query.offset((page - 1) * page_size)
+
+    rows = query.all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(sort_key, rows[-1][-len(columns):])
+
+    # 去掉附加的排序键列，只查询单个实体时直接返回实体
+    entity_count = len(query.column_descriptions) - len(columns)
+    if entity_count == 1:
+        return [row[0] for row in rows], next_cursor
+    return [tuple(row[:entity_count]) for row in rows], next_cursor
@@ -0,0 +1,103 @@
+"""
+快照缓存
+缓存读多写少的聚合结果（例如仪表盘概览），在 TTL 内直接返回快照。
+通过 SQLAlchemy Session 事件记录每个事务写入的表，事务提交后立即失效依赖这些表的缓存；
+其它进程（独立 worker）的写入无法感知，由较短的 TTL 兜底。
+"""
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_WRITTEN_TABLES_KEY = "snapshot_cache_written_tables"
+
+
+class SnapshotCache:
+    """短 TTL、写入失效的单值快照缓存"""
+
+    def __init__(self, ttl_seconds: float, tables: Iterable[str]):
+        self.ttl_seconds = ttl_seconds
+        # 快照依赖的表，任一表有写入提交时失效
+        self.tables: Set[str] = set(tables)
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._expires_at = 0.0
+        # 每次失效递增，避免失效前开始构建的旧快照被写回缓存
+        self._version = 0
+        _caches.append(self)
+
+    def get(self) -> Optional[Any]:
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+            return None
+
+    def get_or_build(self, builder: Callable[[], Any]) -> Any:
+        """返回有效快照，不存在或已过期时调用 builder 重新生成"""
+        if self.ttl_seconds <= 0:
+            return builder()
+
+        value = self.get()
+        if value is not None:
+            return value
+
+        with self._lock:
+            version = self._version
+        value = builder()
+        with self._lock:
+            if version == self._version:
+                self._value = value
+                self._expires_at = time.monotonic() + self.ttl_seconds
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._version += 1
+
+
+_caches: List[SnapshotCache] = []
+
+
+def invalidate_tables(tables: Iterable[str]):
+    """失效依赖指定表的所有缓存"""
+    tables = set(tables)
+    for cache in _caches:
+        if cache.tables & tables:
+            cache.invalidate()
+
+
+def _written_tables(session: Session) -> Set[str]:
+    return session.info.setdefault(_WRITTEN_TABLES_KEY, set())
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_tables(session: Session, flush_context):
+    tables = _written_tables(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            tables.add(table)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_write_tables(orm_execute_state):
+    # query.update() / update(Model) 等批量写入不经过 flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _written_tables(orm_execute_state.session).add(mapper.local_table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session):
+    tables = session.info.pop(_WRITTEN_TABLES_KEY, None)
+    if tables:
+        invalidate_tables(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session):
+    session.info.pop(_WRITTEN_TABLES_KEY, None)
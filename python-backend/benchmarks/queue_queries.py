@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+队列列表 / 队列详情接口的查询性能测试
+在临时 SQLite 数据库中生成不同规模的队列数据，统计每次请求执行的 SQL 语句数和耗时。
+语句数应与队列数量、队列大小无关。
+
+用法: python benchmarks/queue_queries.py
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_queues.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["RUN_EMBEDDED_WORKER"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import SessionLocal, engine, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import QueueTask, Task, TaskQueue, Workspace  # noqa: E402
+
+ROUNDS = 20
+
+
+def seed(queue_count: int, queue_size: int) -> tuple[str, str]:
+    """生成一个工作区、queue_size 个任务和 queue_count 个包含全部任务的队列"""
+    db = SessionLocal()
+    workspace_id = str(uuid.uuid4())
+    db.add(Workspace(id=workspace_id, name="bench", project_goal="bench", path=tempfile.gettempdir()))
+    task_ids = [str(uuid.uuid4()) for _ in range(queue_size)]
+    db.bulk_save_objects([
+        Task(id=task_id, workspace_id=workspace_id, title=f"task {i}", description="bench", source="manual")
+        for i, task_id in enumerate(task_ids)
+    ])
+    queue_ids = [str(uuid.uuid4()) for _ in range(queue_count)]
+    db.bulk_save_objects([
+        TaskQueue(id=queue_id, workspace_id=workspace_id, name="bench", status="pending")
+        for queue_id in queue_ids
+    ])
+    db.bulk_save_objects([
+        QueueTask(
+            id=str(uuid.uuid4()),
+            queue_id=queue_id,
+            task_id=task_id,
+            order_index=index,
+            status="completed" if index % 2 else "pending"
+        )
+        for queue_id in queue_ids
+        for index, task_id in enumerate(task_ids)
+    ])
+    db.commit()
+    db.close()
+    return workspace_id, queue_ids[0]
+
+
+def measure(client: TestClient, url: str) -> tuple[int, float]:
+    """返回单次请求的 SQL 语句数和平均耗时（毫秒）"""
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.get(url)
+        assert response.status_code == 200, response.text
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        client.get(url)
+    elapsed_ms = (time.perf_counter() - start) / ROUNDS * 1000
+    return len(statements), elapsed_ms
+
+
+def main():
+    init_db()
+    print(f"{'队列数':>6} {'队列大小':>8} | {'列表 SQL':>8} {'列表 ms':>8} | {'详情 SQL':>8} {'详情 ms':>8}")
+    with TestClient(app) as client:
+        for queue_count, queue_size in [(10, 10), (100, 10), (100, 200), (100, 1000)]:
+            workspace_id, queue_id = seed(queue_count, queue_size)
+            list_sql, list_ms = measure(client, f"/api/queues/workspaces/{workspace_id}?page_size=100")
+            detail_sql, detail_ms = measure(client, f"/api/queues/{queue_id}")
+            print(f"{queue_count:>6} {queue_size:>8} | {list_sql:>8} {list_ms:>8.1f} | {detail_sql:>8} {detail_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+并发执行写入执行日志时的 SQLite 写锁争用测试
+模拟 50 个同时运行的执行，每个执行逐条写入消息（与 Agent 执行相同的分批规则），
+对比 default / performance 存储配置、各执行自行提交 / 单一写入线程组提交时的写入吞吐量、提交次数、
+锁等待失败次数和事件循环的最长停顿。
+
+用法: python benchmarks/sqlite_contention.py [并发执行数] [每个执行的消息数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+BENCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(BENCH_DIR, 'bench_app.db')}"
+os.environ["RUN_EMBEDDED_WORKER"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base, configure_sqlite  # noqa: E402
+from app.models import Task, Workspace  # noqa: E402
+from app.services.db_writer import DatabaseWriter  # noqa: E402
+from app.services.execution_log_store import AsyncExecutionLogWriter, GroupCommitExecutionLogWriter  # noqa: E402
+
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+MESSAGES = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+# 每个执行每攒够几条消息提交一次（Agent 执行默认 20 条或 1 秒，这里取小批次放大争用）
+FLUSH_BATCH = 2
+# 两条消息之间的间隔（秒），模拟 Agent 逐条产生消息
+MESSAGE_INTERVAL = 0.002
+
+
+def seed(url: str, profile: str) -> list[str]:
+    """创建表、一个工作区和 CONCURRENCY 个任务"""
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    configure_sqlite(engine, profile)
+    Base.metadata.create_all(bind=engine)
+    from app.services.search import init_search_index
+    init_search_index(engine)
+
+    db = sessionmaker(bind=engine)()
+    workspace_id = str(uuid.uuid4())
+    db.add(Workspace(id=workspace_id, name="bench", project_goal="bench", path=tempfile.gettempdir()))
+    task_ids = [str(uuid.uuid4()) for _ in range(CONCURRENCY)]
+    db.add_all([
+        Task(id=task_id, workspace_id=workspace_id, title=f"task {i}", description="bench", source="manual")
+        for i, task_id in enumerate(task_ids)
+    ])
+    db.commit()
+    db.close()
+    engine.dispose()
+    return task_ids
+
+
+async def measure_stall(stop: asyncio.Event, result: list):
+    """每 10 毫秒唤醒一次，记录实际唤醒比预期晚的最长时间"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - start - 0.01)
+    result.append(worst)
+
+
+async def run_scenario(profile: str, group_commit: bool) -> dict:
+    path = os.path.join(BENCH_DIR, f"bench_{profile}_{'group' if group_commit else 'session'}.db")
+    url = f"sqlite:///{path}"
+    task_ids = seed(url, profile)
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    configure_sqlite(async_engine.sync_engine, profile)
+    session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    sync_engine = create_engine(url, connect_args={"check_same_thread": False})
+    configure_sqlite(sync_engine, profile)
+    writer = DatabaseWriter(batch_size=64, max_delay_ms=5, bind=sync_engine)
+
+    commits = []
+    for target in (async_engine.sync_engine, sync_engine):
+        event.listen(target, "commit", lambda conn: commits.append(1))
+
+    lock_errors = 0
+    written = 0
+
+    async def execution(task_id: str):
+        nonlocal lock_errors, written
+        async with session_factory() as db:
+            if group_commit:
+                log_writer = GroupCommitExecutionLogWriter(task_id, batch_size=FLUSH_BATCH, flush_interval=60, writer=writer)
+            else:
+                log_writer = AsyncExecutionLogWriter(db, task_id, batch_size=FLUSH_BATCH, flush_interval=60)
+            for seq in range(MESSAGES):
+                try:
+                    await log_writer.add({"type": "AssistantMessage", "text": f"{task_id} message {seq} " + "x" * 200})
+                    written += 1
+                except OperationalError:
+                    lock_errors += 1
+                    await db.rollback()
+                await asyncio.sleep(MESSAGE_INTERVAL)
+            try:
+                await log_writer.finish(response_type="completed")
+            except OperationalError:
+                lock_errors += 1
+
+    if group_commit:
+        writer.start()
+    stop = asyncio.Event()
+    stall = []
+    monitor = asyncio.create_task(measure_stall(stop, stall))
+    start = time.perf_counter()
+    await asyncio.gather(*(execution(task_id) for task_id in task_ids))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    writer.stop()
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+    return {
+        "elapsed": elapsed,
+        "throughput": written / elapsed,
+        "commits": len(commits),
+        "lock_errors": lock_errors,
+        "max_stall_ms": stall[0] * 1000
+    }
+
+
+async def main():
+    print(f"{CONCURRENCY} 个并发执行，每个执行 {MESSAGES} 条消息，每 {FLUSH_BATCH} 条提交一次")
+    print(f"{'存储配置':>12} {'提交方式':>10} | {'耗时 s':>8} {'消息/s':>10} {'提交次数':>8} {'锁失败':>6} {'最长停顿 ms':>11}")
+    for profile in ("default", "performance"):
+        for group_commit in (False, True):
+            result = await run_scenario(profile, group_commit)
+            print(
+                f"{profile:>12} {'组提交' if group_commit else '各自提交':>10} | {result['elapsed']:>8.2f} "
+                f"{result['throughput']:>10.0f} {result['commits']:>8} {result['lock_errors']:>6} "
+                f"{result['max_stall_ms']:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
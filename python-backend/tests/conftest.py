@@ -0,0 +1,316 @@
+"""
+测试配置
+应用在导入时按环境变量创建数据库引擎，因此先把数据库指向临时目录，再导入 app；
+每个测试前重建所有表，测试之间不共享数据。
+"""
+import asyncio
+import contextlib
+import os
+import tempfile
+import uuid
+
+_TMP_DIR = tempfile.mkdtemp(prefix="axis-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'axis.db')}"
+os.environ["MESSAGE_BROKER"] = "memory"
+os.environ["MESSAGE_BROKER_SQLITE_PATH"] = os.path.join(_TMP_DIR, "axis_stream.db")
+os.environ["SQLITE_WRITER_ENABLED"] = "false"
+os.environ["ANTHROPIC_API_KEY"] = "test-key"
+
+import pytest
+from sqlalchemy import event, text
+
+from app.database import Base, SessionLocal, async_engine, engine, init_db
+from app.models import Task, Workspace
+from app.services import search
+from app.utils.snapshot_cache import invalidate_tables
+
+
+def _reset_database():
+    with engine.begin() as conn:
+        for name in list(search.SEARCH_INDEXES) + [search.MESSAGE_INDEX]:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    invalidate_tables(Base.metadata.tables.keys())
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _dispose_engines():
+    yield
+    # aiosqlite 的连接在后台线程中，不关闭时进程退出会一直等待
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def _clean_database():
+    _reset_database()
+    yield
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    """不运行 lifespan（作业 worker、投递器等后台任务由需要的测试自行启动）"""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+async def async_client():
+    """在测试的事件循环中调用接口（TestClient 在单独线程的事件循环中运行应用）"""
+    import httpx
+
+    from app.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http_client:
+        yield http_client
+
+
+@pytest.fixture
+def workspace(db, tmp_path) -> Workspace:
+    ws = Workspace(id=str(uuid.uuid4()), name="测试工作区", project_goal="测试", path=str(tmp_path))
+    db.add(ws)
+    db.commit()
+    return ws
+
+
+@pytest.fixture
+def make_task(db, workspace):
+    """创建任务，默认属于 workspace 工作区"""
+
+    def _make_task(title: str = "测试任务", workspace_id: str = None, **fields) -> Task:
+        fields.setdefault("source", "manual")
+        task = Task(
+            id=str(uuid.uuid4()),
+            workspace_id=workspace_id or workspace.id,
+            title=title,
+            description=fields.pop("description", title),
+            **fields
+        )
+        db.add(task)
+        db.commit()
+        return task
+
+    return _make_task
+
+
+@pytest.fixture
+def make_queue(client, workspace):
+    """通过接口创建队列，返回队列 ID"""
+
+    def _make_queue(task_ids: list, **fields) -> str:
+        response = client.post(
+            f"/api/queues/workspaces/{workspace.id}",
+            json={"name": "测试队列", "task_ids": task_ids, **fields}
+        )
+        assert response.status_code == 200, response.text
+        return response.json()["data"]["id"]
+
+    return _make_queue
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    """
+    用脚本化的消息替换 Claude Agent SDK 的 query，未安装 SDK 时跳过
+    agent.script(prompt) 返回该次执行依次产生的消息，默认为初始化、一条回复和成功结果
+    """
+    sdk = pytest.importorskip("claude_agent_sdk")
+
+    class FakeAgent:
+        def __init__(self):
+            self.prompts = []
+            self.closed = []
+            self.delay = 0.0
+            self.cost = 0.01
+            self.failing = set()  # 执行失败的 prompt
+            self.replies = 1
+            self.active = 0
+            self.max_active = 0  # 同时执行的最大数量
+
+        def script(self, prompt: str) -> list:
+            is_error = prompt in self.failing
+            return (
+                [sdk.SystemMessage(subtype="init", data={})]
+                + [
+                    sdk.AssistantMessage(content=[sdk.TextBlock(text=f"回复 {i}: {prompt}")], model="test")
+                    for i in range(self.replies)
+                ]
+                + [sdk.ResultMessage(
+                    subtype="error" if is_error else "success",
+                    duration_ms=10,
+                    duration_api_ms=10,
+                    is_error=is_error,
+                    num_turns=1,
+                    session_id="test",
+                    total_cost_usd=self.cost,
+                    usage=None,
+                    result="执行失败" if is_error else "完成"
+                )]
+            )
+
+        async def query(self, prompt, options=None):
+            self.prompts.append(prompt)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            try:
+                for message in self.script(prompt):
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    yield message
+            finally:
+                self.active -= 1
+                self.closed.append(prompt)
+
+    agent = FakeAgent()
+    monkeypatch.setattr(sdk, "query", agent.query)
+    return agent
+
+
+@pytest.fixture
+async def worker(monkeypatch):
+    """在测试的事件循环中运行作业 worker（缩短轮询间隔），测试结束时停止"""
+    from app.config import settings
+    from app.services.executor import agent_executor
+    from app.services.job_queue import JobWorker
+
+    monkeypatch.setattr(settings, "job_poll_interval_seconds", 0.05)
+    monkeypatch.setattr(settings, "job_completion_poll_seconds", 0.2)
+    job_worker = JobWorker("test-worker")
+    job_worker.start()
+    yield job_worker
+    await job_worker.stop()
+    agent_executor.release_listeners.remove(job_worker.notify)
+
+
+@pytest.fixture
+def make_stream_manager(monkeypatch):
+    """
+    创建独立的消息流管理器（settings 中 message_stream_* 配置可通过参数覆盖），
+    第一个创建的实例替换接口使用的全局实例；测试结束后恢复原来的单例
+    """
+    from app.api import streams as streams_api
+    from app.api import tasks as tasks_api
+    from app.config import settings
+    from app.utils import message_stream
+
+    monkeypatch.setattr(message_stream.MessageStreamManager, "_instance", None)
+    created = []
+
+    def _make(**overrides) -> "message_stream.MessageStreamManager":
+        for name, value in overrides.items():
+            monkeypatch.setattr(settings, name, value)
+        message_stream.MessageStreamManager._instance = None
+        manager = message_stream.MessageStreamManager()
+        if not created:
+            for module in (message_stream, streams_api, tasks_api):
+                monkeypatch.setattr(module, "message_stream_manager", manager)
+        created.append(manager)
+        return manager
+
+    return _make
+
+
+@pytest.fixture
+def enqueue(db, make_task):
+    """为同一个任务写入待投递的结束 hook，返回投递 ID"""
+    from app.services.hook_delivery import enqueue_hook
+
+    task = make_task()
+
+    def _enqueue(url: str = "http://hooks.test/task", **fields) -> str:
+        delivery = enqueue_hook(db, task.id, "exec-1", "stop", url, {"task_id": task.id}, **fields)
+        db.commit()
+        return delivery.id
+
+    return _enqueue
+
+
+@pytest.fixture
+async def dispatcher(monkeypatch):
+    """使用模拟 HTTP 接收方的投递器，dispatcher.responses 为依次返回的状态码（用完后返回 200）"""
+    import httpx
+
+    from app.config import settings
+    from app.services.hook_delivery import HookDispatcher
+
+    monkeypatch.setattr(settings, "hook_poll_interval_seconds", 0.05)
+    monkeypatch.setattr(settings, "hook_retry_base_seconds", 0.01)
+    hook_dispatcher = HookDispatcher("test-dispatcher")
+    hook_dispatcher.requests = []
+    hook_dispatcher.responses = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        hook_dispatcher.requests.append(request)
+        status = hook_dispatcher.responses.pop(0) if hook_dispatcher.responses else 200
+        return httpx.Response(status)
+
+    hook_dispatcher.start()
+    default_client = hook_dispatcher._client
+    hook_dispatcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    await default_client.aclose()
+    yield hook_dispatcher
+    await hook_dispatcher.stop()
+
+
+async def wait_until(predicate, timeout: float = 5.0, interval: float = 0.02):
+    """等待 predicate() 为真，超时时测试失败"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(interval)
+
+
+async def run_queue(db, queue_id: str, mode: str = "resume"):
+    """按执行接口的方式准备队列并在当前事件循环中执行，返回执行后的队列"""
+    from app.models import TaskQueue
+    from app.services.queue_runner import execute_queue_tasks, prepare_queue_run
+
+    prepare_queue_run(db, queue_id, mode)
+    db.get(TaskQueue, queue_id).status = "running"
+    db.commit()
+    await asyncio.wait_for(execute_queue_tasks(queue_id), timeout=10)
+    db.expire_all()
+    return db.get(TaskQueue, queue_id)
+
+
+def queue_statuses(db, queue_id: str) -> list:
+    """队列中各任务的状态（按 order_index 排序）"""
+    from app.models import QueueTask
+
+    return [
+        queue_task.status
+        for queue_task in db.query(QueueTask).filter(QueueTask.queue_id == queue_id).order_by(QueueTask.order_index)
+    ]
+
+
+@contextlib.contextmanager
+def count_queries():
+    """统计期间同步引擎执行的 SQL 语句，返回语句列表"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from app.database import AsyncSessionLocal, _async_database_url, engine, get_async_db
+from app.models import Task
+
+
+def test_async_url_uses_aiosqlite():
+    assert _async_database_url("sqlite:///./axis.db") == "sqlite+aiosqlite:///./axis.db"
+    assert _async_database_url("sqlite+aiosqlite:///./axis.db") == "sqlite+aiosqlite:///./axis.db"
+    assert _async_database_url("postgresql+asyncpg://u:p@db/axis") == "postgresql+asyncpg://u:p@db/axis"
+
+
+@pytest.mark.anyio
+async def test_async_session_sees_sync_writes_and_keeps_objects_after_commit(make_task):
+    task = make_task("异步读取")
+    dependency = get_async_db()
+    db = await dependency.__anext__()
+    try:
+        loaded = await db.get(Task, task.id)
+        loaded.title = "已修改"
+        await db.commit()
+        # 提交后不过期，访问属性不会触发隐式加载
+        assert loaded.title == "已修改"
+    finally:
+        await dependency.aclose()
+
+
+@pytest.mark.anyio
+async def test_waiting_for_write_lock_does_not_block_event_loop(make_task):
+    task = make_task()
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    async def write():
+        async with AsyncSessionLocal() as db:
+            (await db.get(Task, task.id)).title = "等待写锁后提交"
+            await db.commit()
+
+    # 另一个连接持有写锁，异步会话的提交在驱动线程中等待
+    holder = engine.raw_connection()
+    holder.execute("BEGIN IMMEDIATE")
+    ticking = asyncio.create_task(ticker())
+    writing = asyncio.create_task(write())
+    try:
+        await asyncio.sleep(0.3)
+        assert not writing.done()
+        assert ticks >= 10
+    finally:
+        holder.rollback()
+        holder.close()
+    await asyncio.wait_for(writing, timeout=5)
+    ticking.cancel()
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT title FROM tasks WHERE id = :id"), {"id": task.id}).scalar() == "等待写锁后提交"
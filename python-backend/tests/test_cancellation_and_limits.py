@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.models import ExecutionJob, Task
+from app.services.agent_runner import resolve_execution_limits
+from app.services.executor import agent_executor
+from app.services.job_queue import cancel_task_execution, enqueue_task_execution, wait_for_job
+from conftest import wait_until
+
+
+def test_limits_fall_back_to_defaults_only_when_unset(monkeypatch):
+    monkeypatch.setattr(settings, "execution_timeout_seconds", 60)
+    monkeypatch.setattr(settings, "execution_max_messages", 10)
+    monkeypatch.setattr(settings, "execution_max_cost_usd", 1.5)
+
+    defaults = resolve_execution_limits({"max_messages": None})
+    assert (defaults.timeout_seconds, defaults.max_messages, defaults.max_cost_usd) == (60, 10, 1.5)
+
+    # 0 表示该任务不限制
+    unlimited = resolve_execution_limits({"timeout_seconds": 0, "max_messages": 0, "max_cost_usd": 0})
+    assert (unlimited.timeout_seconds, unlimited.max_messages, unlimited.max_cost_usd) == (0, 0, 0)
+
+
+def test_cancel_pending_job_through_api(client, db, make_task):
+    task = make_task()
+    job, _ = enqueue_task_execution(db, task, "dispatch")
+
+    response = client.post(f"/api/tasks/{task.id}/cancel")
+
+    assert response.status_code == 200
+    assert response.json()["data"]["result"] == "cancelled"
+    db.expire_all()
+    assert db.get(ExecutionJob, job.id).status == "cancelled"
+    assert db.get(Task, task.id).error_message == "任务已取消: 用户取消"
+    assert client.post(f"/api/tasks/{task.id}/cancel").status_code == 400
+
+
+async def _run(db, task, execution_params=None) -> str:
+    job, _ = enqueue_task_execution(db, task, "dispatch", execution_params)
+    status = await asyncio.wait_for(wait_for_job(job.id), timeout=5)
+    db.expire_all()
+    return status
+
+
+@pytest.mark.anyio
+async def test_cost_limit_fails_execution(db, make_task, fake_agent, worker):
+    fake_agent.cost = 0.5
+    task = make_task()
+
+    assert await _run(db, task, {"max_cost_usd": 0.1}) == "failed"
+    assert "超出费用限制" in db.get(Task, task.id).error_message
+
+
+@pytest.mark.anyio
+async def test_zero_overrides_global_limit(db, make_task, fake_agent, worker, monkeypatch):
+    monkeypatch.setattr(settings, "execution_max_messages", 1)
+    fake_agent.replies = 3
+    limited, unlimited = make_task("受全局限制"), make_task("不限制")
+
+    assert await _run(db, limited) == "failed"
+    assert "超出消息数限制" in db.get(Task, limited.id).error_message
+    assert await _run(db, unlimited, {"max_messages": 0}) == "completed"
+    # 超出限制时关闭了 Agent 的消息流
+    assert "受全局限制" in fake_agent.closed
+
+
+@pytest.mark.anyio
+async def test_cancel_running_execution(db, make_task, fake_agent, worker):
+    fake_agent.delay = 0.2
+    task = make_task()
+    job, _ = enqueue_task_execution(db, task, "dispatch")
+    await wait_until(lambda: agent_executor.is_active(task.id))
+
+    # 与接口一样在线程中取消：在事件循环中同步写库会阻塞执行中正在提交的异步会话，直到 SQLite 锁超时
+    assert await asyncio.to_thread(cancel_task_execution, db, task, "用户取消") == "cancelling"
+    assert await asyncio.wait_for(wait_for_job(job.id), timeout=5) == "cancelled"
+    db.expire_all()
+    assert db.get(Task, task.id).error_message == "任务已取消: 用户取消"
+
+
+@pytest.mark.anyio
+async def test_cancel_before_first_step_still_finishes_job(db, make_task, fake_agent, worker):
+    task = make_task()
+    job, _ = enqueue_task_execution(db, task, "dispatch")
+    # 作业提交到执行池后、执行协程第一次运行前取消
+    original_submit = agent_executor.submit
+
+    def submit_and_cancel(*args, **kwargs):
+        execution = original_submit(*args, **kwargs)
+        agent_executor.cancel(task.id, "用户取消")
+        return execution
+
+    agent_executor.submit = submit_and_cancel
+    try:
+        worker.notify()
+        assert await asyncio.wait_for(wait_for_job(job.id), timeout=5) == "cancelled"
+    finally:
+        agent_executor.submit = original_submit
+    db.expire_all()
+    assert db.get(Task, task.id).status == "failed"
+    assert fake_agent.prompts == []
+
+
+@pytest.mark.anyio
+async def test_cancel_request_from_another_process(db, make_task, fake_agent, worker):
+    fake_agent.delay = 0.2
+    task = make_task()
+    job, _ = enqueue_task_execution(db, task, "dispatch")
+    await wait_until(lambda: agent_executor.is_active(task.id))
+
+    # 其它进程只能写入取消请求（在线程中写入，见 test_cancel_running_execution）
+    def request_cancel():
+        db.query(ExecutionJob).filter(ExecutionJob.id == job.id).update(
+            {ExecutionJob.cancel_requested: 1, ExecutionJob.cancel_reason: "其它进程取消"}
+        )
+        db.commit()
+
+    await asyncio.to_thread(request_cancel)
+    worker.notify()
+
+    assert await asyncio.wait_for(wait_for_job(job.id), timeout=5) == "cancelled"
+    db.expire_all()
+    assert db.get(Task, task.id).error_message == "任务已取消: 其它进程取消"
@@ -0,0 +1,67 @@
+import uuid
+
+from app.models import Notification
+from app.utils.snapshot_cache import SnapshotCache
+from conftest import count_queries
+
+
+def test_snapshot_cache_reuses_value_until_invalidated():
+    cache = SnapshotCache(60, tables=["tasks"])
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"n": len(builds)}
+
+    assert cache.get_or_build(build) == {"n": 1}
+    assert cache.get_or_build(build) == {"n": 1}
+    cache.invalidate()
+    assert cache.get_or_build(build) == {"n": 2}
+
+
+def test_snapshot_built_before_invalidation_is_not_stored():
+    cache = SnapshotCache(60, tables=["tasks"])
+
+    def stale_build():
+        # 构建期间有写入提交
+        cache.invalidate()
+        return {"stale": True}
+
+    assert cache.get_or_build(stale_build) == {"stale": True}
+    assert cache.get() is None
+
+
+def test_snapshot_cache_with_zero_ttl_always_builds():
+    cache = SnapshotCache(0, tables=["tasks"])
+    values = iter(range(3))
+    assert [cache.get_or_build(lambda: next(values)) for _ in range(3)] == [0, 1, 2]
+
+
+def test_commit_invalidates_caches_of_written_tables(db, workspace, make_task):
+    tasks_cache = SnapshotCache(60, tables=["tasks"])
+    other_cache = SnapshotCache(60, tables=["hook_configs"])
+    tasks_cache.get_or_build(lambda: "tasks")
+    other_cache.get_or_build(lambda: "hooks")
+
+    make_task()
+
+    assert tasks_cache.get() is None
+    assert other_cache.get() == "hooks"
+
+
+def test_overview_is_cached_and_refreshed_after_writes(client, db, workspace, make_task):
+    task = make_task(status="completed")
+    db.add(Notification(id=str(uuid.uuid4()), type="task-completion", title="完成", content="完成", related_task_id=task.id))
+    db.commit()
+
+    first = client.get("/api/dashboard/overview").json()["data"]
+    assert first["workspace_summary"][0]["completed_tasks"] == 1
+    assert first["recent_activities"][0]["workspace_name"] == workspace.name
+
+    with count_queries() as statements:
+        assert client.get("/api/dashboard/overview").json()["data"] == first
+    assert statements == []
+
+    make_task(status="failed")
+    refreshed = client.get("/api/dashboard/overview").json()["data"]
+    assert refreshed["workspace_summary"][0]["failed_tasks"] == 1
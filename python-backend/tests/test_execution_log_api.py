@@ -0,0 +1,46 @@
+import json
+
+from app.services.execution_log_store import create_execution_log
+from conftest import count_queries
+
+
+def _add_logs(db, task_id: str, count: int, messages: int = 3):
+    for _ in range(count):
+        create_execution_log(db, task_id, "completed", messages=[
+            {"type": "AssistantMessage", "text": f"消息 {i}"} for i in range(messages)
+        ])
+    db.commit()
+
+
+def test_log_list_returns_summaries_without_content(client, db, make_task):
+    task = make_task()
+    _add_logs(db, task.id, 3)
+
+    with count_queries() as statements:
+        response = client.get(f"/api/tasks/{task.id}/execution-logs")
+    logs = response.json()["data"]
+    assert [log["execution_number"] for log in logs] == [3, 2, 1]
+    assert all("response_content" not in log and log["message_count"] == 3 for log in logs)
+    # 列表不读取消息表
+    assert not any("task_execution_messages" in statement for statement in statements)
+
+    assert client.get("/api/tasks/不存在/execution-logs").status_code == 404
+
+
+def test_log_detail_and_message_pages(client, db, make_task):
+    task = make_task()
+    _add_logs(db, task.id, 1, messages=5)
+    base = f"/api/tasks/{task.id}/execution-logs/1"
+
+    detail = client.get(base).json()["data"]
+    assert [m["text"] for m in json.loads(detail["response_content"])] == [f"消息 {i}" for i in range(5)]
+    ranged = client.get(base, params={"offset": 3}).json()["data"]
+    assert (ranged["offset"], len(json.loads(ranged["response_content"]))) == (3, 2)
+
+    page = client.get(f"{base}/messages", params={"offset": 1, "limit": 2}).json()["data"]
+    assert page["total_messages"] == 5
+    assert [m["text"] for m in page["messages"]] == ["消息 1", "消息 2"]
+
+    response = client.get(f"/api/tasks/{task.id}/execution-logs/2")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "第 2 次执行日志不存在"
@@ -0,0 +1,98 @@
+import json
+import uuid
+
+from app.models import TaskExecutionLog, TaskExecutionMessage
+from app.services.execution_log_store import (
+    append_messages,
+    backfill_execution_costs,
+    create_execution_log,
+    decode_message,
+    encode_message,
+    load_messages,
+    migrate_legacy_logs,
+)
+
+
+def _messages(count: int) -> list:
+    return [{"type": "AssistantMessage", "text": f"第 {i} 条消息 " + "内容" * 50} for i in range(count)]
+
+
+def test_messages_are_stored_compressed_and_round_trip(db, make_task):
+    message = {"type": "AssistantMessage", "text": "重复的内容" * 100}
+    assert decode_message(encode_message(message)) == message
+
+    task = make_task()
+    execution_log = create_execution_log(db, task.id, "completed", messages=[message])
+    db.commit()
+
+    row = db.query(TaskExecutionMessage).filter(TaskExecutionMessage.execution_log_id == execution_log.id).one()
+    assert row.message_type == "AssistantMessage"
+    assert len(row.payload) < len(json.dumps(message, ensure_ascii=False).encode())
+    assert execution_log.content_bytes == len(json.dumps(message, ensure_ascii=False).encode())
+
+
+def test_append_continues_sequence_and_sums_cost(db, make_task):
+    task = make_task()
+    execution_log = create_execution_log(db, task.id, "completed", messages=_messages(3))
+    append_messages(db, execution_log, _messages(2) + [{"type": "ResultMessage", "result": "完成", "cost_usd": 0.25}])
+    db.commit()
+
+    assert execution_log.execution_number == 1
+    assert execution_log.message_count == 6
+    assert execution_log.cost_usd == 0.25
+    seqs = [seq for (seq,) in db.query(TaskExecutionMessage.seq).filter(
+        TaskExecutionMessage.execution_log_id == execution_log.id
+    ).order_by(TaskExecutionMessage.seq)]
+    assert seqs == list(range(6))
+    assert create_execution_log(db, task.id, "completed").execution_number == 2
+
+
+def test_load_messages_pages_by_sequence(db, make_task):
+    task = make_task()
+    messages = _messages(5)
+    execution_log = create_execution_log(db, task.id, "completed", messages=messages)
+    db.commit()
+
+    assert load_messages(db, execution_log) == messages
+    assert load_messages(db, execution_log, offset=1, limit=2) == messages[1:3]
+    assert load_messages(db, execution_log, offset=4, limit=10) == messages[4:]
+
+
+def test_legacy_logs_are_migrated_to_messages(db, make_task):
+    task = make_task()
+    messages = _messages(2) + [{"type": "ResultMessage", "cost_usd": 0.5}]
+    legacy = TaskExecutionLog(
+        id=str(uuid.uuid4()), task_id=task.id, execution_number=1, response_type="completed",
+        response_content=json.dumps(messages), status="completed"
+    )
+    broken = TaskExecutionLog(
+        id=str(uuid.uuid4()), task_id=task.id, execution_number=2, response_type="failed",
+        response_content="Traceback: 出错了", status="failed"
+    )
+    db.add_all([legacy, broken])
+    db.commit()
+    # 迁移前按旧格式读取
+    assert load_messages(db, legacy, offset=1) == messages[1:]
+
+    assert migrate_legacy_logs(db, batch_size=1) == 2
+    db.expire_all()
+    assert legacy.response_content is None and legacy.message_count == 3
+    assert load_messages(db, legacy) == messages
+    assert load_messages(db, broken) == [{"type": "text", "text": "Traceback: 出错了"}]
+    assert migrate_legacy_logs(db) == 0
+
+
+def test_backfill_reads_cost_from_result_messages(db, make_task):
+    task = make_task()
+    execution_log = create_execution_log(db, task.id, "completed", messages=[
+        {"type": "AssistantMessage", "text": "回复"},
+        {"type": "ResultMessage", "cost_usd": 0.125},
+    ])
+    empty = create_execution_log(db, task.id, "completed")
+    execution_log.cost_usd = None
+    empty.cost_usd = None
+    db.commit()
+
+    assert backfill_execution_costs(db, batch_size=1) == 2
+    db.expire_all()
+    assert (execution_log.cost_usd, empty.cost_usd) == (0.125, 0.0)
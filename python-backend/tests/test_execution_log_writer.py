@@ -0,0 +1,88 @@
+import pytest
+
+from app.database import AsyncSessionLocal, SessionLocal, engine
+from app.models import TaskExecutionLog
+from app.services.db_writer import DatabaseWriter
+from app.services.execution_log_store import (
+    AsyncExecutionLogWriter,
+    ExecutionLogWriter,
+    GroupCommitExecutionLogWriter,
+)
+from conftest import wait_until
+
+
+def _visible_count(task_id: str):
+    """从另一个会话读取执行中的日志，返回 (状态, 已提交的消息数)"""
+    session = SessionLocal()
+    try:
+        execution_log = session.query(TaskExecutionLog).filter(TaskExecutionLog.task_id == task_id).one_or_none()
+        return (execution_log.status, execution_log.message_count) if execution_log else None
+    finally:
+        session.close()
+
+
+def test_writer_commits_in_batches(db, make_task):
+    task = make_task()
+    writer = ExecutionLogWriter(db, task.id, batch_size=3, flush_interval=60)
+    assert _visible_count(task.id) is None
+
+    positions = [writer.add({"type": "text", "text": f"消息 {i}"}) for i in range(2)]
+    assert positions == [(1, 0), (1, 1)]
+    # 首条消息时已创建执行记录，消息尚在缓存中
+    assert _visible_count(task.id) == ("running", 0)
+
+    writer.add({"type": "text", "text": "消息 2"})
+    assert _visible_count(task.id) == ("running", 3)
+
+    writer.add({"type": "text", "text": "消息 3"})
+    writer.finish("completed")
+    assert _visible_count(task.id) == ("completed", 4)
+
+
+def test_writer_flushes_after_interval(db, make_task):
+    task = make_task()
+    writer = ExecutionLogWriter(db, task.id, batch_size=100, flush_interval=0)
+    writer.add({"type": "text", "text": "消息"})
+    assert _visible_count(task.id) == ("running", 1)
+
+
+def test_finish_without_messages_creates_no_log(db, make_task):
+    task = make_task()
+    assert ExecutionLogWriter(db, task.id).finish("completed") is None
+    assert _visible_count(task.id) is None
+
+
+@pytest.mark.anyio
+async def test_async_writer_is_visible_mid_run(make_task):
+    task = make_task()
+    async with AsyncSessionLocal() as session:
+        writer = AsyncExecutionLogWriter(session, task.id, batch_size=2, flush_interval=60)
+        for i in range(3):
+            await writer.add({"type": "text", "text": f"消息 {i}"})
+        assert _visible_count(task.id) == ("running", 2)
+        assert await writer.finish("failed", "failed") == 1
+    assert _visible_count(task.id) == ("failed", 3)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("group_commit", [False, True])
+async def test_async_writers_flush_on_timer_without_new_messages(make_task, group_commit):
+    task = make_task()
+    database_writer = DatabaseWriter(bind=engine)
+    if group_commit:
+        database_writer.start()
+        writer = GroupCommitExecutionLogWriter(task.id, batch_size=100, flush_interval=0.1, writer=database_writer)
+    else:
+        writer = AsyncExecutionLogWriter(AsyncSessionLocal(), task.id, batch_size=100, flush_interval=0.1)
+    try:
+        await writer.add({"type": "text", "text": "工具调用前的消息"})
+        assert _visible_count(task.id) == ("running", 0)
+        # 之后没有新消息（例如耗时的工具调用），缓存的消息在 flush_interval 内由定时提交写入
+        await wait_until(lambda: _visible_count(task.id) == ("running", 1), timeout=1.0)
+
+        assert await writer.finish("completed") == 1
+        assert writer._flush_task is None
+        assert _visible_count(task.id) == ("completed", 1)
+    finally:
+        await writer.close()
+        database_writer.stop()
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.executor import AgentExecutor, ExecutionAlreadyActiveError, ExecutorCapacityError
+
+
+def _blocking(release: asyncio.Event):
+    async def run():
+        await release.wait()
+    return run
+
+
+@pytest.mark.anyio
+async def test_enforces_global_and_per_workspace_limits():
+    executor = AgentExecutor(max_concurrent=3, max_per_workspace=2)
+    release = asyncio.Event()
+    executor.submit("t1", "w1", _blocking(release))
+    executor.submit("t2", "w1", _blocking(release))
+
+    assert not executor.has_capacity("w1")
+    with pytest.raises(ExecutorCapacityError):
+        executor.submit("t3", "w1", _blocking(release))
+
+    executor.submit("t3", "w2", _blocking(release))
+    assert not executor.has_capacity("w3")
+    assert executor.stats()["workspaces"] == {"w1": 2, "w2": 1}
+
+    release.set()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert executor.running == {}
+    assert executor.workspace_running == {}
+
+
+@pytest.mark.anyio
+async def test_rejects_duplicate_task_and_notifies_on_release():
+    executor = AgentExecutor(max_concurrent=2, max_per_workspace=2)
+    released = []
+    executor.add_release_listener(lambda: released.append(True))
+    release = asyncio.Event()
+    execution = executor.submit("t1", "w1", _blocking(release))
+
+    with pytest.raises(ExecutionAlreadyActiveError):
+        executor.submit("t1", "w1", _blocking(release))
+
+    release.set()
+    await execution.future
+    await asyncio.sleep(0)
+    assert released == [True]
+    assert not executor.is_active("t1")
+
+
+@pytest.mark.anyio
+async def test_cancel_records_reason():
+    executor = AgentExecutor(max_concurrent=1, max_per_workspace=1)
+    reasons = []
+
+    async def run():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            reasons.append(executor.get_cancel_reason("t1"))
+            raise
+
+    execution = executor.submit("t1", "w1", run)
+    await asyncio.sleep(0)
+    assert executor.cancel("t1", "用户取消")
+    with pytest.raises(asyncio.CancelledError):
+        await execution.future
+    assert reasons == ["用户取消"]
+    assert not executor.cancel("t1", "用户取消")
+
+
+@pytest.mark.anyio
+async def test_watchdog_cancels_executions_past_their_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "execution_watchdog_interval_seconds", 0.01)
+    executor = AgentExecutor(max_concurrent=1, max_per_workspace=1)
+    execution = executor.submit("t1", "w1", lambda: asyncio.sleep(10), timeout_seconds=0.05)
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(asyncio.shield(execution.future), timeout=2)
+    assert execution.cancel_reason.startswith("执行超时")
+
+
+
+@pytest.mark.anyio
+async def test_interrupt_marks_execution_without_cancel_reason():
+    executor = AgentExecutor(max_concurrent=1, max_per_workspace=1)
+    seen = []
+
+    async def run():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            seen.append(executor.is_interrupted("t1"))
+            raise
+
+    execution = executor.submit("t1", "w1", run)
+    await asyncio.sleep(0)
+    assert executor.interrupt("t1") is execution.future
+    with pytest.raises(asyncio.CancelledError):
+        await execution.future
+    assert seen == [True]
+    assert execution.cancel_reason is None
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import HookDelivery, HookDestination
+from app.services.hook_delivery import claim_delivery, finish_delivery
+from app.services.hook_health import acquire_probe, circuit_states, record_result, release_probe
+from conftest import wait_until
+
+DESTINATION = "http://hooks.test:80"
+
+
+@pytest.fixture(autouse=True)
+def _circuit_settings(monkeypatch):
+    monkeypatch.setattr(settings, "hook_circuit_failure_threshold", 3)
+    monkeypatch.setattr(settings, "hook_circuit_open_seconds", 30.0)
+
+
+def _destination(db) -> HookDestination:
+    db.expire_all()
+    return db.get(HookDestination, DESTINATION)
+
+
+def _fail(db, times: int = 1):
+    for _ in range(times):
+        record_result(db, DESTINATION, False, 10.0, 503, "HTTP 503")
+    db.commit()
+
+
+def _expire_open(db):
+    _destination(db).open_until = datetime.now() - timedelta(seconds=1)
+    db.commit()
+
+
+def test_circuit_opens_probes_and_closes(db):
+    _fail(db, 2)
+    assert _destination(db).state == "closed"
+    _fail(db)
+    row = _destination(db)
+    assert (row.state, row.open_count) == ("open", 1)
+    assert timedelta(seconds=29) < row.open_until - datetime.now() <= timedelta(seconds=30)
+    assert circuit_states(db) == ({DESTINATION}, set())
+    assert not acquire_probe(db, DESTINATION)
+
+    # 熔断到期：只放行一个探测
+    _expire_open(db)
+    assert circuit_states(db) == (set(), {DESTINATION})
+    assert acquire_probe(db, DESTINATION)
+    assert _destination(db).state == "half_open"
+    assert not acquire_probe(db, DESTINATION)
+
+    # 探测失败：再次熔断，时长翻倍
+    _fail(db)
+    row = _destination(db)
+    assert (row.state, row.open_count) == ("open", 2)
+    assert row.open_until - datetime.now() > timedelta(seconds=59)
+
+    _expire_open(db)
+    assert acquire_probe(db, DESTINATION)
+    record_result(db, DESTINATION, True, 5.0, 200)
+    db.commit()
+    row = _destination(db)
+    assert (row.state, row.open_count, row.consecutive_failures, row.open_until) == ("closed", 0, 0, None)
+    assert (row.total_successes, row.total_failures) == (1, 4)
+
+
+def test_released_probe_can_be_taken_again(db):
+    _fail(db, 3)
+    _expire_open(db)
+    assert acquire_probe(db, DESTINATION)
+    release_probe(db, DESTINATION)
+    assert acquire_probe(db, DESTINATION)
+
+
+def test_failure_during_open_circuit_waits_for_it(db, enqueue):
+    delivery_id = enqueue()
+    claim_delivery(db, delivery_id, "worker")
+    _fail(db, 2)
+    finish_delivery(db, delivery_id, "worker", 503, "HTTP 503", 10.0, DESTINATION)
+
+    db.expire_all()
+    delivery = db.get(HookDelivery, delivery_id)
+    assert delivery.status == "pending"
+    assert delivery.next_attempt_at == _destination(db).open_until
+
+
+@pytest.mark.anyio
+async def test_dispatcher_holds_deliveries_until_probe_succeeds(db, enqueue, dispatcher):
+    _fail(db, 3)
+    delivery_ids = [enqueue(), enqueue()]
+    await wait_until(lambda: dispatcher.open_circuits == 1)
+    assert dispatcher.requests == []
+
+    _expire_open(db)
+    await wait_until(lambda: dispatcher.delivered == 2)
+    # 第一个请求是探测，恢复后再发送其余投递
+    assert len(dispatcher.requests) == 2
+    assert _destination(db).state == "closed"
+    db.expire_all()
+    assert [db.get(HookDelivery, delivery_id).attempts for delivery_id in delivery_ids] == [1, 1]
+
+
+def test_destination_endpoints_report_and_reset(client, db, enqueue):
+    record_result(db, DESTINATION, True, 20.0, 200)
+    _fail(db, 3)
+    enqueue()
+
+    response = client.get("/api/hooks/destinations", params={"state": "open"})
+    [destination] = response.json()["data"]
+    assert (destination["destination"], destination["state"]) == (DESTINATION, "open")
+    assert (destination["success_rate"], destination["pending_deliveries"]) == (0.25, 1)
+    assert client.get("/api/hooks/destinations", params={"state": "closed"}).json()["data"] == []
+
+    response = client.post("/api/hooks/destinations/reset", json={"destination": DESTINATION})
+    assert response.status_code == 200
+    assert (response.json()["data"]["state"], response.json()["data"]["consecutive_failures"]) == ("closed", 0)
+    assert circuit_states(db) == (set(), set())
+
+    response = client.post("/api/hooks/destinations/reset", json={"destination": "http://unknown:80"})
+    assert response.status_code == 404
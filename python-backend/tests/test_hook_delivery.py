@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import HookDelivery
+from app.services.hook_delivery import (
+    claim_delivery,
+    destination_of,
+    finish_delivery,
+    retry_delay_seconds,
+)
+from conftest import wait_until
+
+
+def _delivery(db, delivery_id: str) -> HookDelivery:
+    db.expire_all()
+    return db.get(HookDelivery, delivery_id)
+
+
+def test_enqueue_writes_pending_delivery(db, enqueue):
+    delivery = _delivery(db, enqueue(headers={"Authorization": "Bearer t"}))
+    assert (delivery.status, delivery.attempts, delivery.destination) == ("pending", 0, "http://hooks.test:80")
+    assert json.loads(delivery.headers) == {"Authorization": "Bearer t"}
+    assert destination_of("https://example.com/a?b=1") == "https://example.com:443"
+
+
+def test_retry_delay_backs_off_exponentially(monkeypatch):
+    monkeypatch.setattr(settings, "hook_retry_base_seconds", 2.0)
+    monkeypatch.setattr(settings, "hook_retry_max_seconds", 10.0)
+    assert 1.6 <= retry_delay_seconds(1) <= 2.4
+    assert 6.4 <= retry_delay_seconds(3) <= 9.6
+    assert retry_delay_seconds(10) <= 12.0
+
+
+def test_claim_is_exclusive_until_lease_expires(db, enqueue):
+    delivery_id = enqueue()
+    assert claim_delivery(db, delivery_id, "worker-a")
+    assert not claim_delivery(db, delivery_id, "worker-b")
+
+    _delivery(db, delivery_id).lease_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+    assert claim_delivery(db, delivery_id, "worker-b")
+    delivery = _delivery(db, delivery_id)
+    assert (delivery.worker_id, delivery.attempts) == ("worker-b", 2)
+    # 租约已被接管，原进程的结果不再写入投递状态
+    assert finish_delivery(db, delivery_id, "worker-a", 200, None) is None
+
+
+def test_finish_records_success_retry_and_failure(db, enqueue, monkeypatch):
+    monkeypatch.setattr(settings, "hook_max_attempts", 2)
+    delivery_id = enqueue()
+
+    claim_delivery(db, delivery_id, "worker")
+    assert finish_delivery(db, delivery_id, "worker", 503, "HTTP 503") == "pending"
+    assert _delivery(db, delivery_id).next_attempt_at > datetime.now()
+
+    claim_delivery(db, delivery_id, "worker")  # 未到重试时间不能认领
+    assert _delivery(db, delivery_id).attempts == 1
+    _delivery(db, delivery_id).next_attempt_at = datetime.now()
+    db.commit()
+    claim_delivery(db, delivery_id, "worker")
+    assert finish_delivery(db, delivery_id, "worker", 503, "HTTP 503") == "failed"
+
+    other_id = enqueue()
+    claim_delivery(db, other_id, "worker")
+    assert finish_delivery(db, other_id, "worker", 204, None) == "delivered"
+    assert _delivery(db, other_id).delivered_at is not None
+
+
+@pytest.mark.anyio
+async def test_dispatcher_delivers_and_retries(db, enqueue, dispatcher):
+    dispatcher.responses = [500]
+    delivery_id = enqueue()
+
+    await wait_until(lambda: _delivery(db, delivery_id).status == "delivered")
+    delivery = _delivery(db, delivery_id)
+    assert (delivery.attempts, delivery.last_status_code) == (2, 200)
+    assert (dispatcher.retried, dispatcher.delivered) == (1, 1)
+
+    request = dispatcher.requests[-1]
+    assert request.headers["X-Axis-Delivery-Id"] == delivery_id
+    assert request.headers["X-Axis-Hook-Event"] == "stop"
+    assert json.loads(request.content) == json.loads(delivery.payload)
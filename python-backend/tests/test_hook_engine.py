@@ -0,0 +1,100 @@
+import pytest
+
+from app.models import HookDelivery
+from app.services.hook_delivery import claim_delivery, finish_delivery
+from app.services.hook_engine import HookRule, HookTarget, load_hook_index, parse_hook_target, resolve_execution_hooks
+from conftest import count_queries
+
+
+def _create_hook(client, workspace_id: str, **fields) -> dict:
+    body = {"name": "通知", "type": "stop", "curl_command": "http://hooks.test/stop", **fields}
+    response = client.post(f"/api/hooks/workspaces/{workspace_id}", json=body)
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def _urls(hooks, hook_type: str) -> list:
+    return [rule.target.url for rule in hooks.rules[hook_type]]
+
+
+def test_parse_url_and_curl_command():
+    assert parse_hook_target("https://example.com/hook") == HookTarget(url="https://example.com/hook")
+    target = parse_hook_target(
+        "curl -X put -H 'Authorization: Bearer abc' -H 'X-Empty:' -d '{\"a\": 1}' https://example.com/hook"
+    )
+    assert target == HookTarget(
+        url="https://example.com/hook", method="PUT", headers={"Authorization": "Bearer abc", "X-Empty": ""}
+    )
+    assert parse_hook_target("curl --url http://example.com/a --json '{}'").url == "http://example.com/a"
+    for invalid in ("ftp://example.com", "curl -X POST", "curl 'unterminated"):
+        with pytest.raises(ValueError):
+            parse_hook_target(invalid)
+
+
+def test_trigger_condition_only_filters_stop_hooks():
+    target = HookTarget(url="http://hooks.test")
+    assert HookRule("start", target, "failure").matches(None)
+    assert HookRule("stop", target, "success").matches("completed")
+    assert not HookRule("stop", target, "success").matches("failed")
+    assert HookRule("stop", target, "failure").matches("failed")
+    assert HookRule("stop", target).matches("failed")
+
+
+def test_resolve_combines_workspace_task_and_legacy_hooks(client, db, workspace, make_task):
+    task = make_task(start_hook_curl="http://legacy.test/start", stop_hook_curl="不是地址")
+    other = make_task()
+    _create_hook(client, workspace.id, curl_command="http://workspace.test/stop")
+    _create_hook(client, workspace.id, curl_command="http://task.test/stop", task_id=task.id, trigger_condition="failure")
+    _create_hook(client, workspace.id, curl_command="http://other.test/stop", task_id=other.id)
+    _create_hook(client, workspace.id, curl_command="http://disabled.test/stop", enabled=False)
+
+    hooks = resolve_execution_hooks(db, task)
+    assert _urls(hooks, "start") == ["http://legacy.test/start"]
+    # 无效的任务 hook 被忽略
+    assert _urls(hooks, "stop") == ["http://workspace.test/stop", "http://task.test/stop"]
+
+    assert hooks.enqueue(db, "stop", {"status": "completed"}, status="completed") == 1
+    assert hooks.enqueue(db, "stop", {"status": "failed"}, status="failed") == 2
+    db.commit()
+    assert db.query(HookDelivery).count() == 3
+
+
+def test_api_writes_invalidate_cached_rules(client, db, workspace, make_task):
+    task = make_task()
+    hook = _create_hook(client, workspace.id)
+    assert _urls(resolve_execution_hooks(db, task), "stop") == ["http://hooks.test/stop"]
+    with count_queries() as statements:
+        load_hook_index(db)
+    assert statements == []
+
+    client.put(f"/api/hooks/{hook['id']}", json={"curl_command": "curl -X PUT http://hooks.test/v2"})
+    rules = resolve_execution_hooks(db, task).rules["stop"]
+    assert (rules[0].target.url, rules[0].target.method) == ("http://hooks.test/v2", "PUT")
+
+    # 投递成功时更新 last_execution，不使缓存失效
+    resolve_execution_hooks(db, task).enqueue(db, "stop", {})
+    db.commit()
+    delivery = db.query(HookDelivery).one()
+    claim_delivery(db, delivery.id, "worker")
+    finish_delivery(db, delivery.id, "worker", 200, None)
+    with count_queries() as statements:
+        load_hook_index(db)
+    assert statements == []
+    assert client.get(f"/api/hooks/{hook['id']}").json()["data"]["last_execution"] is not None
+
+    client.put(f"/api/hooks/{hook['id']}", json={"enabled": False})
+    assert resolve_execution_hooks(db, task).rules["stop"] == []
+    client.put(f"/api/hooks/{hook['id']}", json={"enabled": True})
+    client.delete(f"/api/hooks/{hook['id']}")
+    assert resolve_execution_hooks(db, task).rules["stop"] == []
+
+
+def test_api_rejects_invalid_hooks(client, workspace, make_task):
+    url = f"/api/hooks/workspaces/{workspace.id}"
+    response = client.post(url, json={"name": "无效", "type": "stop", "curl_command": "ftp://example.com"})
+    assert response.status_code == 400
+    other_workspace_task = make_task(workspace_id="其它工作区")
+    response = client.post(url, json={
+        "name": "跨工作区", "type": "stop", "curl_command": "http://hooks.test", "task_id": other_workspace_task.id
+    })
+    assert response.status_code == 404
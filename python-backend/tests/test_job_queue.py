@@ -0,0 +1,162 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import ExecutionJob, Task
+from app.services.executor import ExecutionAlreadyActiveError
+from app.services.job_queue import (
+    claim_job,
+    enqueue_task_execution,
+    fail_exhausted_jobs,
+    heartbeat_jobs,
+    release_jobs,
+    wait_for_job,
+)
+from conftest import wait_until
+
+
+@pytest.fixture
+def single_slot(monkeypatch):
+    monkeypatch.setattr(settings, "max_concurrent_executions", 1)
+    monkeypatch.setattr(settings, "max_concurrent_executions_per_workspace", 1)
+
+
+def _expire(db, job: ExecutionJob):
+    job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+
+
+def test_enqueue_marks_task_in_progress_and_rejects_duplicates(db, make_task):
+    task = make_task()
+    job, position = enqueue_task_execution(db, task, "dispatch", {"max_messages": 5})
+
+    assert job.status == "pending"
+    assert position == 0
+    assert task.status == "progress"
+    assert task.execution_id == job.execution_id
+    with pytest.raises(ExecutionAlreadyActiveError):
+        enqueue_task_execution(db, task, "retry")
+
+
+def test_queue_position_counts_pending_jobs_ahead(db, make_task, single_slot):
+    positions = [enqueue_task_execution(db, make_task(f"任务 {i}"), "dispatch")[1] for i in range(3)]
+    assert positions == [0, 1, 2]
+
+
+def test_queue_position_ignores_other_workspaces_limit(db, make_task, workspace, monkeypatch):
+    monkeypatch.setattr(settings, "max_concurrent_executions", 2)
+    monkeypatch.setattr(settings, "max_concurrent_executions_per_workspace", 1)
+    from app.models import Workspace
+
+    other = Workspace(id="other", name="其它", project_goal="测试", path=workspace.path)
+    db.add(other)
+    db.commit()
+
+    assert enqueue_task_execution(db, make_task("a"), "dispatch")[1] == 0
+    assert enqueue_task_execution(db, make_task("b"), "dispatch")[1] == 1
+    # 其它工作区还有空闲槽位
+    assert enqueue_task_execution(db, make_task("c", workspace_id="other"), "dispatch")[1] == 0
+
+
+def test_claim_is_exclusive_and_expired_leases_follow_policy(db, make_task, monkeypatch):
+    job, _ = enqueue_task_execution(db, make_task(), "dispatch")
+
+    assert claim_job(db, job, "worker-a")
+    assert not claim_job(db, job, "worker-b")
+
+    _expire(db, job)
+    monkeypatch.setattr(settings, "orphan_execution_policy", "fail")
+    assert not claim_job(db, job, "worker-b")
+
+    monkeypatch.setattr(settings, "orphan_execution_policy", "requeue")
+    assert claim_job(db, job, "worker-b")
+    db.refresh(job)
+    assert job.worker_id == "worker-b"
+    assert job.attempts == 2
+    assert job.lease_expires_at > datetime.now()
+
+
+def test_heartbeat_only_renews_own_jobs(db, make_task):
+    job, _ = enqueue_task_execution(db, make_task(), "dispatch")
+    claim_job(db, job, "worker-a")
+    _expire(db, job)
+
+    assert heartbeat_jobs(db, "worker-b", [job.id]) == 0
+    assert heartbeat_jobs(db, "worker-a", [job.id]) == 1
+    db.refresh(job)
+    assert job.lease_expires_at > datetime.now()
+
+
+def test_expired_jobs_fail_under_fail_policy(db, make_task, monkeypatch):
+    monkeypatch.setattr(settings, "orphan_execution_policy", "fail")
+    task = make_task()
+    job, _ = enqueue_task_execution(db, task, "dispatch")
+    claim_job(db, job, "worker-a")
+    _expire(db, job)
+
+    assert fail_exhausted_jobs(db) == 1
+    db.refresh(job)
+    db.refresh(task)
+    assert job.status == "failed"
+    assert task.status == "failed"
+
+
+def test_expired_jobs_fail_after_max_attempts_under_requeue(db, make_task, monkeypatch):
+    monkeypatch.setattr(settings, "orphan_execution_policy", "requeue")
+    monkeypatch.setattr(settings, "job_max_attempts", 2)
+    job, _ = enqueue_task_execution(db, make_task(), "dispatch")
+    claim_job(db, job, "worker-a")
+    _expire(db, job)
+    assert fail_exhausted_jobs(db) == 0
+
+    claim_job(db, job, "worker-b")
+    _expire(db, job)
+    assert fail_exhausted_jobs(db) == 1
+
+
+def test_release_jobs_requeues_only_under_requeue_policy(db, make_task, monkeypatch):
+    job, _ = enqueue_task_execution(db, make_task(), "dispatch")
+    claim_job(db, job, "worker-a")
+
+    monkeypatch.setattr(settings, "orphan_execution_policy", "fail")
+    assert release_jobs(db, "worker-a", [job.id]) == 0
+
+    monkeypatch.setattr(settings, "orphan_execution_policy", "requeue")
+    assert release_jobs(db, "worker-b", [job.id]) == 0
+    assert release_jobs(db, "worker-a", [job.id]) == 1
+    db.refresh(job)
+    assert (job.status, job.worker_id, job.attempts) == ("pending", None, 0)
+
+
+@pytest.mark.anyio
+async def test_worker_runs_queued_job_to_completion(db, make_task, fake_agent, worker):
+    task = make_task(description="写一个函数")
+    job, _ = enqueue_task_execution(db, task, "dispatch")
+
+    assert await asyncio.wait_for(wait_for_job(job.id), timeout=5) == "completed"
+    db.refresh(task)
+    db.refresh(job)
+    assert task.status == "completed"
+    assert job.worker_id == "test-worker"
+    assert fake_agent.prompts == ["写一个函数"]
+
+
+@pytest.mark.anyio
+async def test_worker_stop_hands_running_job_back(db, make_task, fake_agent, worker, monkeypatch):
+    monkeypatch.setattr(settings, "orphan_execution_policy", "requeue")
+    fake_agent.delay = 0.5
+    task = make_task()
+    job, _ = enqueue_task_execution(db, task, "dispatch")
+    # 等到 Agent 已开始执行
+    await wait_until(lambda: fake_agent.active)
+
+    await worker.stop()
+
+    db.expire_all()
+    job = db.get(ExecutionJob, job.id)
+    task = db.get(Task, task.id)
+    assert (job.status, job.attempts) == ("pending", 0)
+    assert task.status == "progress"
+    assert fake_agent.closed
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from app.utils.message_broker import (
+    RedisBroker,
+    RedisError,
+    SqliteBroker,
+    _ForwardingBroker,
+    _read_reply,
+)
+
+
+class FakeRedisServer:
+    """只支持 AUTH / SUBSCRIBE / PUBLISH 的 RESP 服务，用于测试 RedisBroker"""
+
+    def __init__(self, password=None):
+        self.password = password
+        self.subscribers = {}
+        self.commands = []
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        for writers in self.subscribers.values():
+            for writer in writers:
+                writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        authenticated = self.password is None
+        try:
+            while True:
+                command = await _read_reply(reader)
+                name = command[0].decode().upper()
+                self.commands.append(name)
+                if name == "AUTH":
+                    authenticated = command[-1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                elif name == "SUBSCRIBE":
+                    channel = command[1]
+                    self.subscribers.setdefault(channel, []).append(writer)
+                    writer.write(b"*3\r\n" + _bulk(b"subscribe") + _bulk(channel) + b":1\r\n")
+                elif name == "PUBLISH":
+                    channel, payload = command[1], command[2]
+                    receivers = self.subscribers.get(channel, [])
+                    for receiver in receivers:
+                        receiver.write(b"*3\r\n" + _bulk(b"message") + _bulk(channel) + _bulk(payload))
+                    writer.write(f":{len(receivers)}\r\n".encode())
+                else:
+                    writer.write(f"-ERR unknown command '{name}'\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for writers in self.subscribers.values():
+                if writer in writers:
+                    writers.remove(writer)
+            writer.close()
+
+
+def _bulk(data: bytes) -> bytes:
+    return f"${len(data)}\r\n".encode() + data + b"\r\n"
+
+
+async def _wait_until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+def test_forwarding_broker_requires_send_and_receive():
+    class Incomplete(_ForwardingBroker):
+        async def _send(self, payloads):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.anyio
+async def test_read_reply_parses_resp_types():
+    reader = asyncio.StreamReader()
+    reader.feed_data(b"+OK\r\n:3\r\n$5\r\nhello\r\n$-1\r\n*2\r\n$1\r\na\r\n:1\r\n-ERR boom\r\n")
+    assert await _read_reply(reader) == b"OK"
+    assert await _read_reply(reader) == 3
+    assert await _read_reply(reader) == b"hello"
+    assert await _read_reply(reader) is None
+    assert await _read_reply(reader) == [b"a", 1]
+    with pytest.raises(RedisError, match="boom"):
+        await _read_reply(reader)
+
+
+@pytest.mark.anyio
+async def test_redis_broker_forwards_between_processes():
+    server = FakeRedisServer(password="secret")
+    port = await server.start()
+    url = f"redis://:secret@127.0.0.1:{port}/0"
+    sender, receiver = RedisBroker(url), RedisBroker(url)
+    sent, received = [], []
+    await sender.start(sent.append)
+    await receiver.start(received.append)
+    try:
+        await _wait_until(lambda: sender.connected and receiver.connected)
+        sender.publish({"kind": "message", "task_id": "t1", "message": {"text": "你好"}})
+        await _wait_until(lambda: received)
+
+        assert received[0]["task_id"] == "t1"
+        assert received[0]["message"] == {"text": "你好"}
+        # 自己发出的事件不会再投递给自己
+        assert sent == []
+        assert sender.stats()["published"] == 1
+        assert receiver.stats()["received"] == 1
+        assert "AUTH" in server.commands
+    finally:
+        await sender.stop()
+        await receiver.stop()
+        await server.stop()
+
+
+@pytest.mark.anyio
+async def test_redis_broker_reconnects_after_connection_loss():
+    server = FakeRedisServer()
+    port = await server.start()
+    broker = RedisBroker(f"redis://127.0.0.1:{port}", reconnect_interval=0.05)
+    received = []
+    await broker.start(received.append)
+    try:
+        await _wait_until(lambda: broker.connected)
+        for writers in server.subscribers.values():
+            for writer in list(writers):
+                writer.close()
+        await _wait_until(lambda: not broker.connected)
+        await _wait_until(lambda: broker.connected)
+        assert server.commands.count("SUBSCRIBE") == 2
+    finally:
+        await broker.stop()
+        await server.stop()
+
+
+@pytest.mark.anyio
+async def test_sqlite_broker_forwards_between_processes(tmp_path):
+    path = str(tmp_path / "stream.db")
+    sender, receiver = SqliteBroker(path, poll_interval=0.01), SqliteBroker(path, poll_interval=0.01)
+    received = []
+    await sender.start(lambda envelope: None)
+    await receiver.start(received.append)
+    try:
+        sender.publish({"kind": "finish", "task_id": "t1"})
+        await _wait_until(lambda: received)
+        assert received == [{"kind": "finish", "task_id": "t1", "origin": sender.origin}]
+    finally:
+        await sender.stop()
+        await receiver.stop()
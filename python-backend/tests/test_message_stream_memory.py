@@ -0,0 +1,75 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from conftest import wait_until
+
+
+def _message(i: int, size: int = 10) -> dict:
+    return {"type": "text", "text": f"{i}:" + "x" * size}
+
+
+@pytest.mark.anyio
+async def test_ring_buffer_keeps_latest_messages(make_stream_manager):
+    manager = make_stream_manager(message_stream_buffer_size=3)
+    for i in range(5):
+        await manager.add_message("task", _message(i), event_id=(1, i))
+
+    assert [event_id for event_id, _ in manager.get_events("task")] == [(1, 2), (1, 3), (1, 4)]
+    stats = manager.stats()
+    assert (stats["retained_messages"], stats["evicted_messages"]) == (3, 2)
+    assert stats["retained_bytes"] == sum(len(json.dumps(m)) for m in manager.get_messages("task"))
+
+
+@pytest.mark.anyio
+async def test_memory_budget_evicts_finished_streams_first(make_stream_manager):
+    manager = make_stream_manager(message_stream_memory_budget_bytes=500)
+    for i in range(3):
+        await manager.add_message("finished", _message(i, 40))
+    manager.finish_task("finished")
+    for i in range(3):
+        await manager.add_message("running", _message(i, 40))
+    assert manager.stats()["streams"] == 2
+
+    # 超出预算：先回收已结束的消息流，再裁剪执行中的缓冲，但至少保留一条
+    for i in range(3, 10):
+        await manager.add_message("running", _message(i, 40))
+    stats = manager.stats()
+    assert manager.get_events("finished") == []
+    assert stats["retained_bytes"] <= 500
+    assert 1 <= len(manager.get_messages("running")) < 10
+    assert manager.get_messages("running")[-1] == _message(9, 40)
+
+
+@pytest.mark.anyio
+async def test_finished_stream_expires_after_ttl(make_stream_manager):
+    manager = make_stream_manager(message_stream_finished_ttl_seconds=0.2)
+    await manager.add_message("task", _message(0))
+    manager.finish_task("task")
+    assert manager.get_messages("task") == [_message(0)]
+
+    # 重新执行时结束标记作废
+    await manager.add_message("task", _message(1))
+    await asyncio.sleep(0.25)
+    assert manager.stats()["streams"] == 1
+
+    manager.finish_task("task")
+    await asyncio.sleep(0.25)
+    assert manager.stats()["streams"] == 0
+
+
+@pytest.mark.anyio
+async def test_sweeper_evicts_idle_streams(make_stream_manager):
+    manager = make_stream_manager(message_stream_finished_ttl_seconds=0.1)
+    await manager.start()
+    try:
+        await manager.add_message("task", _message(0))
+        manager.finish_task("task")
+        finished_at = time.monotonic()
+        # 没有新消息或统计请求触发回收，只能由后台回收释放
+        await wait_until(lambda: not manager._streams, timeout=2)
+        assert time.monotonic() - finished_at >= 0.1
+    finally:
+        await manager.stop()
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.models import Workspace
+from app.utils.message_stream import SUBSCRIPTION_UPDATED
+
+
+def _drain(subscriber) -> list:
+    events = []
+    while not subscriber.empty():
+        events.append(subscriber._events.popleft())
+    return events
+
+
+def _text(text: str) -> dict:
+    return {"type": "text", "text": text}
+
+
+@pytest.mark.anyio
+async def test_connection_receives_tasks_and_workspaces(make_stream_manager):
+    manager = make_stream_manager()
+    await manager.add_message("running", _text("已有进度"), (1, 0), workspace_id="ws-1")
+    await manager.add_message("finished", _text("已结束"), (1, 0), workspace_id="ws-1")
+    manager.finish_task("finished")
+
+    connection = manager.open_connection(task_ids=["task-a"], workspace_ids=["ws-1"])
+    # 订阅时每个执行中的任务先推送最新一条消息，已结束的任务不推送
+    assert [(task_id, message["text"]) for task_id, _, message in _drain(connection)] == [("running", "已有进度")]
+
+    await manager.add_message("task-a", _text("a"), (1, 0))
+    await manager.add_message("running", _text("b"), (1, 1), workspace_id="ws-1")
+    await manager.add_message("other", _text("c"), (1, 0), workspace_id="ws-2")
+    assert [task_id for task_id, _, _ in _drain(connection)] == ["task-a", "running"]
+
+
+@pytest.mark.anyio
+async def test_update_replaces_scope_and_notifies(make_stream_manager):
+    manager = make_stream_manager()
+    await manager.add_message("task-b", _text("b 的进度"), (1, 0))
+    connection = manager.open_connection(task_ids=["task-a"])
+
+    assert manager.update_connection(connection.connection_id, ["task-b"], []) is connection
+    events = _drain(connection)
+    assert events[0][2] == {
+        "type": SUBSCRIPTION_UPDATED, "connection_id": connection.connection_id, "task_ids": ["task-b"], "workspace_ids": []
+    }
+    assert [task_id for task_id, _, _ in events[1:]] == ["task-b"]
+
+    await manager.add_message("task-a", _text("a"), (1, 0))
+    assert _drain(connection) == []
+    assert manager.update_connection("不存在", ["task-a"], []) is None
+
+
+@pytest.mark.anyio
+async def test_clearing_task_keeps_connection_open(make_stream_manager):
+    manager = make_stream_manager()
+    connection = manager.open_connection(task_ids=["task-a", "task-b"])
+    manager.clear_task("task-a")
+
+    assert connection.task_ids == {"task-b"}
+    assert manager.get_connection(connection.connection_id) is connection
+    manager.close_connection(connection.connection_id)
+    assert manager.stats()["multiplexed_connections"] == 0
+
+
+def test_put_updates_local_connection(client, make_stream_manager):
+    manager = make_stream_manager()
+    connection = manager.open_connection(task_ids=["task-a"])
+
+    response = client.put(
+        f"/api/streams/{connection.connection_id}",
+        json={"task_ids": ["task-b", "task-b"], "workspace_ids": ["ws-1"]}
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert (data["task_ids"], data["workspace_ids"], data["forwarded"]) == (["task-b"], ["ws-1"], False)
+    assert connection.workspace_ids == {"ws-1"}
+
+    # 单进程部署时不存在的连接无法转发
+    response = client.put("/api/streams/不存在", json={"task_ids": ["task-a"]})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "流连接不存在或已断开"
+
+
+@pytest.fixture
+def publishing(make_stream_manager):
+    """持续向工作区 ws-1 中不断新增的任务推送消息，并记录订阅变更是在哪个线程执行的"""
+    manager = make_stream_manager(message_stream_buffer_size=5)
+    update_threads = []
+    update_connection = manager.update_connection
+
+    def record_thread(*args, **kwargs):
+        update_threads.append(threading.get_ident())
+        return update_connection(*args, **kwargs)
+
+    manager.update_connection = record_thread
+
+    async def publish():
+        i = 0
+        while True:
+            await manager.add_message(f"task-{i % 50}", _text(str(i)), (1, i), workspace_id="ws-1")
+            if i % 50 == 49:
+                manager.finish_task(f"task-{i % 50}")
+            i += 1
+            await asyncio.sleep(0)
+
+    return manager, update_threads, publish
+
+
+@pytest.mark.anyio
+async def test_put_during_publishing_runs_on_event_loop(async_client, publishing):
+    manager, update_threads, publish = publishing
+    connection = manager.open_connection(task_ids=["task-0"])
+    publisher = asyncio.create_task(publish())
+    try:
+        for i in range(10):
+            scope = {"workspace_ids": ["ws-1"]} if i % 2 == 0 else {"task_ids": [f"task-{i}"]}
+            response = await async_client.put(f"/api/streams/{connection.connection_id}", json=scope)
+            assert response.status_code == 200
+            # 变更后推送的消息立即唤醒等待中的连接
+            while True:
+                _, _, message = await asyncio.wait_for(connection.get(), timeout=1)
+                if message["type"] == SUBSCRIPTION_UPDATED:
+                    break
+            assert message["workspace_ids"] == scope.get("workspace_ids", [])
+    finally:
+        publisher.cancel()
+    # 打开连接 1 次 + 接口修改 10 次，都在事件循环线程中执行
+    assert update_threads == [threading.get_ident()] * 11
+
+
+
+@pytest.mark.anyio
+async def test_task_delete_and_stats_run_on_event_loop(async_client, db, workspace, make_task, make_stream_manager):
+    manager = make_stream_manager()
+    task_id = make_task().id
+    await manager.add_message(task_id, _text("进度"), (1, 0))
+    connection = manager.open_connection(task_ids=[task_id])
+
+    assert (await async_client.get("/api/executor/status")).json()["data"]["message_streams"]["streams"] == 1
+    assert len((await async_client.get("/api/executor/stream-subscribers")).json()["data"]) == 1
+
+    assert (await async_client.delete(f"/api/tasks/{task_id}")).status_code == 200
+    assert manager.stats()["streams"] == 0
+    db.expire_all()
+    assert db.get(Workspace, workspace.id).pending_task_count == 0
+    assert connection.task_ids == set()
+    assert (await async_client.delete(f"/api/tasks/{task_id}")).status_code == 404
@@ -0,0 +1,74 @@
+import uuid
+
+from app.models import Notification, Workspace
+
+
+def _collect(client, url: str, key: str, **params) -> list:
+    """按 next_cursor 依次翻页，返回所有页的 ID"""
+    ids, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        data = client.get(url, params=query).json()["data"]
+        ids += [item["id"] for item in data[key]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            return ids
+
+
+def test_task_cursor_walks_every_row_once(client, workspace, make_task):
+    # 同一秒内创建的任务 created_at 相同，靠 id 区分次序
+    created = {make_task(f"任务 {i}").id for i in range(7)}
+
+    pages = _collect(client, f"/api/workspaces/{workspace.id}/tasks", "tasks", page_size=3)
+    assert len(pages) == 7
+    assert set(pages) == created
+
+    by_title = _collect(
+        client, f"/api/workspaces/{workspace.id}/tasks", "tasks", page_size=3, sort_by="title", sort_order="asc"
+    )
+    full = client.get(
+        f"/api/workspaces/{workspace.id}/tasks", params={"page_size": 10, "sort_by": "title", "sort_order": "asc"}
+    ).json()["data"]["tasks"]
+    assert by_title == [task["id"] for task in full]
+
+
+def test_task_cursor_matches_page_numbers(client, workspace, make_task):
+    for i in range(5):
+        make_task(f"任务 {i}", priority=["high", "medium", "low"][i % 3])
+    url = f"/api/workspaces/{workspace.id}/tasks"
+
+    numbered = []
+    for page in (1, 2, 3):
+        numbered += [t["id"] for t in client.get(url, params={"page": page, "page_size": 2, "sort_by": "priority"}).json()["data"]["tasks"]]
+    assert _collect(client, url, "tasks", page_size=2, sort_by="priority") == numbered
+
+
+def test_cursor_rejects_other_sort_order(client, workspace, make_task):
+    for i in range(3):
+        make_task(f"任务 {i}")
+    url = f"/api/workspaces/{workspace.id}/tasks"
+    cursor = client.get(url, params={"page_size": 1}).json()["data"]["next_cursor"]
+
+    response = client.get(url, params={"cursor": cursor, "sort_by": "title"})
+    assert response.status_code == 400
+    assert client.get(url, params={"cursor": "不是游标"}).status_code == 400
+
+
+def test_queue_workspace_and_notification_cursors(client, db, workspace, make_task, make_queue, tmp_path):
+    queues = {make_queue([make_task().id]) for _ in range(4)}
+    assert set(_collect(client, f"/api/queues/workspaces/{workspace.id}", "queues", page_size=3)) == queues
+
+    for i in range(4):
+        db.add(Workspace(id=str(uuid.uuid4()), name=f"工作区 {i}", project_goal="测试", path=str(tmp_path)))
+        db.add(Notification(id=str(uuid.uuid4()), type="system-alert", title=f"通知 {i}", content="内容"))
+    db.commit()
+    workspaces = _collect(client, "/api/workspaces", "workspaces", page_size=2)
+    assert len(workspaces) == len(set(workspaces)) == 5
+    notifications = _collect(client, "/api/notifications", "notifications", page_size=3, include_total=False)
+    assert len(notifications) == len(set(notifications)) == 4
+
+
+def test_include_total_false_skips_count(client):
+    data = client.get("/api/notifications", params={"include_total": False}).json()["data"]
+    assert data["total"] is None
+    assert client.get("/api/notifications").json()["data"]["total"] == 0
@@ -0,0 +1,57 @@
+import pytest
+
+from app.models import QueueTask
+from conftest import queue_statuses, run_queue
+
+
+def test_rejects_cycles_and_unknown_dependencies(client, workspace, make_task):
+    a, b = make_task("a"), make_task("b")
+    url = f"/api/queues/workspaces/{workspace.id}"
+
+    response = client.post(url, json={"name": "环", "task_ids": [a.id, b.id], "dependencies": {a.id: [b.id], b.id: [a.id]}})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "任务依赖存在循环"
+
+    response = client.post(url, json={"name": "未知依赖", "task_ids": [a.id], "dependencies": {a.id: ["missing"]}})
+    assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_independent_tasks_run_in_parallel_before_dependents(db, make_task, make_queue, fake_agent, worker):
+    fake_agent.delay = 0.05
+    a, b, c = make_task("a"), make_task("b"), make_task("c")
+    queue_id = make_queue([a.id, b.id, c.id], dependencies={c.id: [a.id, b.id]}, max_parallelism=2)
+
+    queue = await run_queue(db, queue_id)
+
+    assert queue.status == "completed"
+    assert queue_statuses(db, queue_id) == ["completed"] * 3
+    assert fake_agent.max_active == 2
+    assert fake_agent.prompts[-1] == "c"
+
+
+@pytest.mark.anyio
+async def test_parallelism_limit_is_respected(db, make_task, make_queue, fake_agent, worker):
+    fake_agent.delay = 0.02
+    queue_id = make_queue([make_task(str(i)).id for i in range(3)], max_parallelism=1)
+
+    await run_queue(db, queue_id)
+
+    assert fake_agent.max_active == 1
+    assert fake_agent.prompts == ["0", "1", "2"]
+
+
+@pytest.mark.anyio
+async def test_failed_dependency_skips_dependents(db, make_task, make_queue, fake_agent, worker):
+    fake_agent.failing = {"a"}
+    a, b, c = make_task("a"), make_task("b"), make_task("c")
+    queue_id = make_queue([a.id, b.id, c.id], dependencies={b.id: [a.id]}, max_parallelism=2)
+
+    queue = await run_queue(db, queue_id)
+
+    # 部分成功的队列标记为完成
+    assert queue.status == "completed"
+    assert queue_statuses(db, queue_id) == ["failed", "failed", "completed"]
+    dependent = db.query(QueueTask).filter(QueueTask.task_id == b.id).one()
+    assert dependent.error_reason == "依赖的任务执行失败"
+    assert "b" not in fake_agent.prompts
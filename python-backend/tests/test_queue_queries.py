@@ -0,0 +1,44 @@
+from app.models import QueueTask
+from conftest import count_queries
+
+
+def _complete_first(db, queue_id):
+    queue_task = db.query(QueueTask).filter(QueueTask.queue_id == queue_id, QueueTask.order_index == 0).one()
+    queue_task.status = "completed"
+    db.commit()
+
+
+def _list_queries(client, workspace_id) -> int:
+    with count_queries() as statements:
+        response = client.get(f"/api/queues/workspaces/{workspace_id}")
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_queue_list_reports_progress_from_one_aggregate(client, db, workspace, make_task, make_queue):
+    first = make_queue([make_task().id, make_task().id])
+    _complete_first(db, first)
+    single = _list_queries(client, workspace.id)
+
+    for _ in range(4):
+        make_queue([make_task().id])
+    assert _list_queries(client, workspace.id) == single
+
+    queues = {q["id"]: q for q in client.get(f"/api/queues/workspaces/{workspace.id}").json()["data"]["queues"]}
+    assert len(queues) == 5
+    assert (queues[first]["total_tasks"], queues[first]["completed_tasks"], queues[first]["progress"]) == (2, 1, 50)
+
+
+def test_queue_detail_loads_task_names_in_one_query(client, db, make_task, make_queue):
+    small = make_queue([make_task("第一步").id])
+    large = make_queue([make_task(f"第 {i} 步").id for i in range(6)])
+    _complete_first(db, large)
+
+    with count_queries() as small_statements:
+        client.get(f"/api/queues/{small}")
+    with count_queries() as large_statements:
+        detail = client.get(f"/api/queues/{large}").json()["data"]
+
+    assert len(large_statements) == len(small_statements)
+    assert [task["name"] for task in detail["tasks"]] == [f"第 {i} 步" for i in range(6)]
+    assert (detail["completed_tasks"], detail["progress"]) == (1, 16)
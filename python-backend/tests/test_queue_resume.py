@@ -0,0 +1,56 @@
+import pytest
+
+from app.models import QueueTask
+from app.services.queue_runner import prepare_queue_run
+from conftest import queue_statuses, run_queue
+
+
+def _set_statuses(db, queue_id, statuses):
+    queue_tasks = db.query(QueueTask).filter(QueueTask.queue_id == queue_id).order_by(QueueTask.order_index).all()
+    for queue_task, status in zip(queue_tasks, statuses):
+        queue_task.status = status
+    db.commit()
+
+
+def test_prepare_resume_keeps_completed_tasks(db, make_task, make_queue):
+    queue_id = make_queue([make_task(str(i)).id for i in range(3)])
+    _set_statuses(db, queue_id, ["completed", "failed", "progress"])
+
+    assert prepare_queue_run(db, queue_id, "resume") == {"total_tasks": 3, "pending_tasks": 2, "skipped_tasks": 1}
+    db.commit()
+    assert queue_statuses(db, queue_id) == ["completed", "pending", "pending"]
+
+    assert prepare_queue_run(db, queue_id, "restart")["pending_tasks"] == 3
+    db.commit()
+    assert queue_statuses(db, queue_id) == ["pending"] * 3
+
+
+@pytest.mark.anyio
+async def test_stop_policy_halts_and_resume_continues_from_failure(db, make_task, make_queue, fake_agent, worker):
+    fake_agent.failing = {"b"}
+    queue_id = make_queue([make_task(name).id for name in "abc"], failure_policy="stop")
+
+    queue = await run_queue(db, queue_id)
+
+    assert queue.status == "failed"
+    assert queue_statuses(db, queue_id) == ["completed", "failed", "pending"]
+    assert fake_agent.prompts == ["a", "b"]
+
+    fake_agent.failing = set()
+    queue = await run_queue(db, queue_id, "resume")
+
+    assert queue.status == "completed"
+    assert queue_statuses(db, queue_id) == ["completed"] * 3
+    # 已完成的任务不会重新执行
+    assert fake_agent.prompts == ["a", "b", "b", "c"]
+
+
+@pytest.mark.anyio
+async def test_restart_runs_every_task_again(db, make_task, make_queue, fake_agent, worker):
+    queue_id = make_queue([make_task(name).id for name in "ab"])
+    await run_queue(db, queue_id)
+
+    queue = await run_queue(db, queue_id, "restart")
+
+    assert queue.status == "completed"
+    assert fake_agent.prompts == ["a", "b", "a", "b"]
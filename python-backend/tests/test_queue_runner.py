@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.models import ExecutionJob, QueueTask
+from app.services.job_queue import claim_job, enqueue_task_execution, finish_job, wait_for_job
+from conftest import queue_statuses, run_queue
+
+
+@pytest.mark.anyio
+async def test_queue_runs_tasks_through_the_job_queue(db, make_task, make_queue, fake_agent, worker):
+    tasks = [make_task("第一步"), make_task("第二步")]
+    queue_id = make_queue([task.id for task in tasks])
+
+    queue = await run_queue(db, queue_id)
+
+    assert queue.status == "completed"
+    assert queue_statuses(db, queue_id) == ["completed", "completed"]
+    assert fake_agent.prompts == ["第一步", "第二步"]
+    assert {job.kind for job in db.query(ExecutionJob).all()} == {"queue"}
+
+
+@pytest.mark.anyio
+async def test_wait_for_job_wakes_on_local_finish(db, make_task, monkeypatch):
+    # 兜底轮询间隔很长，只有进程内通知才能及时唤醒
+    monkeypatch.setattr(settings, "job_completion_poll_seconds", 30)
+    job, _ = enqueue_task_execution(db, make_task(), "queue")
+    claim_job(db, job, "worker-a")
+
+    waiter = asyncio.create_task(wait_for_job(job.id))
+    await asyncio.sleep(0.05)
+    finish_job(db, job.id, "worker-a", "completed")
+
+    assert await asyncio.wait_for(waiter, timeout=1) == "completed"
+
+
+@pytest.mark.anyio
+async def test_queue_step_fails_when_workspace_path_is_missing(db, workspace, make_task, make_queue, fake_agent):
+    queue_id = make_queue([make_task().id])
+    workspace.path = "/nonexistent/axis-test"
+    db.commit()
+
+    queue = await run_queue(db, queue_id)
+
+    assert queue.status == "failed"
+    assert db.query(QueueTask).filter(QueueTask.queue_id == queue_id).one().error_reason == "工作区路径不存在"
+    assert fake_agent.prompts == []
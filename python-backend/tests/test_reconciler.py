@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from app.models import ExecutionJob, QueueTask, Task, TaskExecutionLog, TaskQueue
+from app.services.execution_log_store import create_execution_log, load_messages
+from app.services.job_queue import claim_job, enqueue_task_execution
+from app.services.reconciler import reconcile_orphaned_executions
+
+
+def _queue(db, workspace, make_task, lease_expires_at):
+    queue = TaskQueue(
+        id=f"queue-{len(db.query(TaskQueue).all())}",
+        workspace_id=workspace.id,
+        name="队列",
+        status="running",
+        runner_id="runner-a",
+        lease_expires_at=lease_expires_at
+    )
+    db.add(queue)
+    db.add(QueueTask(id=f"{queue.id}-1", queue_id=queue.id, task_id=make_task().id, order_index=0, status="progress"))
+    db.commit()
+    return queue
+
+
+def test_fail_policy_fails_orphaned_tasks_and_logs_the_reason(db, make_task):
+    orphan = make_task("孤立任务", status="progress")
+    create_execution_log(db, orphan.id, "running", status="running", messages=[{"type": "init"}])
+    alive = make_task("排队中的任务")
+    enqueue_task_execution(db, alive, "dispatch")
+    db.commit()
+
+    stats = reconcile_orphaned_executions(db, policy="fail")
+
+    db.expire_all()
+    assert stats["orphan_tasks"] == 1
+    assert stats["interrupted_logs"] == 1
+    assert db.get(Task, orphan.id).status == "failed"
+    assert db.get(Task, alive.id).status == "progress"
+
+    logs = db.query(TaskExecutionLog).filter(TaskExecutionLog.task_id == orphan.id).order_by(
+        TaskExecutionLog.execution_number
+    ).all()
+    assert [(log.response_type, log.status) for log in logs] == [("failed", "failed"), ("reconciled", "failed")]
+    assert load_messages(db, logs[1])[0]["type"] == "reconcile"
+
+
+def test_requeue_policy_requeues_orphans_and_expired_jobs(db, make_task):
+    orphan = make_task("孤立任务", status="progress")
+    expired = make_task("租约过期的任务")
+    job, _ = enqueue_task_execution(db, expired, "dispatch")
+    claim_job(db, job, "worker-a")
+    job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+
+    stats = reconcile_orphaned_executions(db, policy="requeue")
+
+    db.expire_all()
+    assert stats["requeued_jobs"] == 1
+    assert stats["orphan_tasks"] == 1
+    assert db.get(ExecutionJob, job.id).status == "pending"
+    recovery = db.query(ExecutionJob).filter(ExecutionJob.task_id == orphan.id).one()
+    assert (recovery.kind, recovery.status) == ("recovery", "pending")
+    assert db.get(Task, orphan.id).status == "progress"
+
+
+def test_only_queues_with_expired_leases_are_interrupted(db, workspace, make_task):
+    live = _queue(db, workspace, make_task, datetime.now() + timedelta(seconds=60))
+    expired = _queue(db, workspace, make_task, datetime.now() - timedelta(seconds=1))
+    unowned = _queue(db, workspace, make_task, None)
+
+    stats = reconcile_orphaned_executions(db, policy="fail")
+
+    db.expire_all()
+    assert stats["interrupted_queues"] == 2
+    assert db.get(TaskQueue, live.id).status == "running"
+    assert db.get(QueueTask, f"{live.id}-1").status == "progress"
+    for queue in (expired, unowned):
+        assert db.get(TaskQueue, queue.id).status == "failed"
+        assert db.get(QueueTask, f"{queue.id}-1").status == "failed"
@@ -0,0 +1,98 @@
+import uuid
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.models import Notification
+from app.services import search
+from app.services.execution_log_store import create_execution_log
+
+
+def _search(client, q: str, **params) -> dict:
+    response = client.get("/api/search", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def test_fulltext_search_finds_tasks_notifications_and_logs(client, db, make_task):
+    task = make_task("重构登录模块", description="把 session 校验移到中间件")
+    make_task("无关任务")
+    db.add(Notification(
+        id=str(uuid.uuid4()), type="task-completion", title="登录模块已完成", content="内容", related_task_id=task.id
+    ))
+    create_execution_log(db, task.id, "completed", messages=[
+        {"type": "AssistantMessage", "text": "已将中间件中的 session 校验抽取为函数"},
+        {"type": "ResultMessage", "result": "完成"},
+    ])
+    db.commit()
+
+    data = _search(client, "登录模块")
+    assert data["fulltext"] is True
+    assert [hit["id"] for hit in data["tasks"]] == [task.id]
+    assert "<mark>登录模块</mark>" in data["tasks"][0]["snippet"]
+    assert len(data["notifications"]) == 1
+
+    logs = _search(client, "session 校验抽取", scope="logs")["execution_logs"]
+    assert [(hit["task_id"], hit["seq"]) for hit in logs] == [(task.id, 0)]
+    assert "<mark>session</mark>" in logs[0]["snippet"]
+
+
+def test_short_terms_fall_back_to_title_match(client, make_task):
+    task = make_task("修复 UI")
+    data = _search(client, "UI")
+    assert data["fulltext"] is False
+    assert [hit["id"] for hit in data["tasks"]] == [task.id]
+    assert data["execution_logs"] == []
+
+
+def test_search_filters_by_workspace_and_rejects_unknown_scope(client, make_task, workspace):
+    make_task("部署脚本", workspace_id=str(uuid.uuid4()))
+    assert _search(client, "部署脚本", workspace_id=workspace.id)["tasks"] == []
+    assert client.get("/api/search", params={"q": "部署脚本", "scope": "files"}).status_code == 400
+
+
+def test_list_endpoint_uses_index_and_updates_follow_source(client, db, workspace, make_task):
+    task = make_task("旧的标题")
+    task.title = "新的标题"
+    db.commit()
+
+    url = f"/api/workspaces/{workspace.id}/tasks"
+    assert client.get(url, params={"search": "旧的标题"}).json()["data"]["tasks"] == []
+    assert [t["id"] for t in client.get(url, params={"search": "新的标题"}).json()["data"]["tasks"]] == [task.id]
+
+
+def test_rebuild_restores_dropped_index_entries(client, db, make_task):
+    task = make_task("索引重建测试")
+    create_execution_log(db, task.id, "completed", messages=[{"type": "text", "text": "日志里的关键字"}])
+    db.commit()
+    db.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('delete-all')"))
+    db.execute(text(f"INSERT INTO {search.MESSAGE_INDEX}({search.MESSAGE_INDEX}) VALUES ('delete-all')"))
+    db.commit()
+    assert _search(client, "索引重建")["tasks"] == []
+
+    response = client.post("/api/search/rebuild")
+    assert response.status_code == 200
+    assert response.json()["data"]["indexes"] == list(search.SEARCH_INDEXES) + [search.MESSAGE_INDEX]
+    assert len(_search(client, "索引重建")["tasks"]) == 1
+    assert len(_search(client, "关键字", scope="logs")["execution_logs"]) == 1
+
+    assert client.post("/api/search/rebuild", json={"indexes": ["unknown_fts"]}).status_code == 400
+
+
+def test_vacuum_rebuilds_rowid_keyed_indexes(client, db, make_task):
+    tasks = [make_task(f"整理数据库 任务{i}") for i in range(4)]
+    for task in tasks[:2]:
+        db.delete(task)
+    db.add(Notification(id=str(uuid.uuid4()), type="task-completion", title="整理数据库 通知", content="内容"))
+    create_execution_log(db, tasks[3].id, "completed", messages=[{"type": "text", "text": "整理数据库 日志"}])
+    db.commit()
+    # 模拟 VACUUM 重新编号 rowid 后索引与源表不一致
+    db.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('delete-all')"))
+    db.commit()
+    assert _search(client, "整理数据库")["tasks"] == []
+
+    assert search.vacuum_database(engine) == list(search.SEARCH_INDEXES)
+    data = _search(client, "整理数据库")
+    assert sorted(hit["id"] for hit in data["tasks"]) == sorted(task.id for task in tasks[2:])
+    assert len(data["notifications"]) == 1
+    assert len(data["execution_logs"]) == 1
@@ -0,0 +1,78 @@
+import pytest
+
+from app.utils.message_stream import STREAM_OVERFLOW, StreamSubscriber
+
+
+def _text(i: int) -> tuple:
+    return ("task", (1, i), {"type": "text", "text": f"消息 {i}"})
+
+
+def _progress(i: int) -> tuple:
+    return ("task", (1, i), {"type": "progress", "progress": i})
+
+
+def _queued(subscriber: StreamSubscriber) -> list:
+    return [event_id for _, event_id, _ in subscriber._events]
+
+
+def test_drop_oldest_keeps_latest_events():
+    subscriber = StreamSubscriber(3, "drop_oldest")
+    for i in range(5):
+        subscriber.offer(_text(i))
+
+    assert _queued(subscriber) == [(1, 2), (1, 3), (1, 4)]
+    assert (subscriber.delivered, subscriber.dropped, subscriber.max_lag) == (5, 2, 3)
+
+
+def test_coalesce_drops_progress_before_content():
+    subscriber = StreamSubscriber(3, "coalesce")
+    subscriber.offer(_text(0))
+    subscriber.offer(_progress(1))
+    subscriber.offer(_text(2))
+    subscriber.offer(_text(3))
+
+    assert _queued(subscriber) == [(1, 0), (1, 2), (1, 3)]
+    assert (subscriber.dropped, subscriber.coalesced) == (1, 1)
+
+    # 没有进度消息时退化为丢弃最早的消息
+    subscriber.offer(_text(4))
+    assert _queued(subscriber) == [(1, 2), (1, 3), (1, 4)]
+    assert (subscriber.dropped, subscriber.coalesced) == (2, 1)
+
+
+@pytest.mark.anyio
+async def test_disconnect_clears_queue_and_notifies():
+    subscriber = StreamSubscriber(2, "disconnect")
+    for i in range(3):
+        subscriber.offer(_text(i))
+
+    assert subscriber.closed
+    assert subscriber.dropped == 3
+    _, _, message = await subscriber.get()
+    assert message["type"] == STREAM_OVERFLOW
+    subscriber.offer(_text(3))
+    assert subscriber.empty()
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_does_not_block_others(make_stream_manager, client):
+    manager = make_stream_manager(message_stream_subscriber_queue_size=2, message_stream_slow_consumer_policy="disconnect")
+    slow = await manager.subscribe("task")
+    fast = await manager.subscribe("task")
+    for i in range(3):
+        await manager.add_message("task", {"type": "text", "text": f"消息 {i}"}, event_id=(1, i))
+        if i < 2:
+            await fast.get()
+
+    assert slow.closed and not fast.closed
+    stats = client.get("/api/executor/stream-subscribers").json()["data"]
+    assert [(s["lag"], s["closed"]) for s in stats] == [(1, True), (1, False)]
+
+    manager.unsubscribe("task", slow)
+    overall = manager.stats()
+    assert (overall["subscribers"], overall["disconnected_subscribers"], overall["dropped_subscriber_messages"]) == (1, 1, 3)
+
+
+def test_unknown_policy_is_rejected(make_stream_manager):
+    with pytest.raises(ValueError):
+        make_stream_manager(message_stream_slow_consumer_policy="block")
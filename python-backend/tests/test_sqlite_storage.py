@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.database import configure_sqlite, engine, sqlite_pragmas
+from app.models import Task, TaskExecutionLog
+from app.services.db_writer import DatabaseWriter, DatabaseWriterStopped
+from app.services.execution_log_store import GroupCommitExecutionLogWriter, load_messages
+
+
+def _pragma(conn, name: str):
+    return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_profiles_select_pragmas():
+    assert sqlite_pragmas("default") == []
+    pragmas = sqlite_pragmas("performance")
+    assert "PRAGMA journal_mode=wal" in pragmas
+    assert "PRAGMA synchronous=normal" in pragmas
+
+
+def test_performance_pragmas_apply_to_every_connection(tmp_path):
+    tuned = create_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+    plain = create_engine(f"sqlite:///{tmp_path / 'plain.db'}")
+    configure_sqlite(tuned, "performance")
+    configure_sqlite(plain, "default")
+    try:
+        with tuned.connect() as conn:
+            assert (_pragma(conn, "journal_mode"), _pragma(conn, "synchronous")) == ("wal", 1)
+            assert _pragma(conn, "busy_timeout") == 5000
+            assert _pragma(conn, "temp_store") == 2
+        with plain.connect() as conn:
+            assert (_pragma(conn, "journal_mode"), _pragma(conn, "synchronous")) == ("delete", 2)
+        # 应用的引擎默认使用 performance 配置
+        with engine.connect() as conn:
+            assert _pragma(conn, "journal_mode") == "wal"
+    finally:
+        tuned.dispose()
+        plain.dispose()
+
+
+@pytest.fixture
+def writer():
+    database_writer = DatabaseWriter(batch_size=16, max_delay_ms=50, bind=engine)
+    database_writer.start()
+    yield database_writer
+    database_writer.stop()
+
+
+def _rename(session, task_id: str, title: str) -> str:
+    session.get(Task, task_id).title = title
+    return title
+
+
+def _fail(session):
+    raise ValueError("写入失败")
+
+
+@pytest.mark.anyio
+async def test_concurrent_writes_share_commits(writer, make_task):
+    tasks = [make_task() for _ in range(8)]
+    results = await asyncio.gather(*[writer.run(_rename, task.id, f"标题 {i}") for i, task in enumerate(tasks)])
+
+    assert results == [f"标题 {i}" for i in range(8)]
+    assert writer.jobs == 8
+    assert writer.commits < 8
+
+
+@pytest.mark.anyio
+async def test_failed_write_does_not_fail_its_batch(writer, db, make_task):
+    task = make_task()
+    results = await asyncio.gather(writer.run(_rename, task.id, "已提交"), writer.run(_fail), return_exceptions=True)
+
+    assert results[0] == "已提交"
+    assert isinstance(results[1], ValueError)
+    assert writer.failed == 1
+    db.expire_all()
+    assert db.get(Task, task.id).title == "已提交"
+
+
+def test_stopped_writer_rejects_writes():
+    with pytest.raises(DatabaseWriterStopped):
+        DatabaseWriter(bind=engine).submit(_fail)
+
+
+@pytest.mark.anyio
+async def test_group_commit_log_writers_keep_sequences(writer, db, make_task):
+    tasks = [make_task() for _ in range(3)]
+
+    async def execute(task):
+        log_writer = GroupCommitExecutionLogWriter(task.id, batch_size=2, flush_interval=60, writer=writer)
+        for i in range(5):
+            await log_writer.add({"type": "text", "text": f"{task.id} 消息 {i}"})
+        return await log_writer.finish("completed")
+
+    assert await asyncio.gather(*[execute(task) for task in tasks]) == [1, 1, 1]
+    for task in tasks:
+        execution_log = db.query(TaskExecutionLog).filter(TaskExecutionLog.task_id == task.id).one()
+        assert (execution_log.status, execution_log.message_count) == ("completed", 5)
+        assert [m["text"] for m in load_messages(db, execution_log)] == [f"{task.id} 消息 {i}" for i in range(5)]
+    assert writer.commits < writer.jobs
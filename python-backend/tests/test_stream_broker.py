@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from app.utils.message_stream import SUBSCRIPTION_UPDATED
+from conftest import wait_until
+
+
+@pytest.fixture
+async def processes(make_stream_manager, tmp_path):
+    """共用 sqlite 代理的两个消息流管理器，模拟两个进程；第一个为接口使用的实例"""
+    options = {
+        "message_broker": "sqlite",
+        "message_broker_sqlite_path": str(tmp_path / "stream.db"),
+        "message_broker_poll_interval_seconds": 0.01,
+    }
+    managers = [make_stream_manager(**options), make_stream_manager(**options)]
+    for manager in managers:
+        await manager.start()
+    yield managers
+    for manager in managers:
+        await manager.stop()
+
+
+@pytest.mark.anyio
+async def test_messages_reach_subscribers_in_other_process(processes):
+    api, worker = processes
+    subscriber = await api.subscribe("task")
+
+    await worker.add_message("task", {"type": "text", "text": "来自 worker"}, event_id=(1, 0), workspace_id="ws")
+    task_id, event_id, message = await asyncio.wait_for(subscriber.get(), timeout=2)
+    assert (task_id, event_id, message["text"]) == ("task", (1, 0), "来自 worker")
+
+    worker.finish_task("task")
+    await wait_until(lambda: api.stats()["finished_streams"] == 1)
+    worker.clear_task("task")
+    await wait_until(lambda: api.stats()["streams"] == 0)
+
+
+@pytest.mark.anyio
+async def test_put_is_forwarded_to_process_holding_connection(client, processes):
+    api, holder = processes
+    connection = holder.open_connection(task_ids=["task-a"])
+
+    response = client.put(f"/api/streams/{connection.connection_id}", json={"task_ids": ["task-b"]})
+    assert response.status_code == 200
+    assert response.json()["data"]["forwarded"] is True
+
+    _, _, message = await asyncio.wait_for(connection.get(), timeout=2)
+    assert message["type"] == SUBSCRIPTION_UPDATED
+    assert connection.task_ids == {"task-b"}
+    # 只有持有连接的进程生效
+    assert api.get_connection(connection.connection_id) is None
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from app.services.execution_log_store import create_execution_log, load_stream_events
+from app.utils.message_stream import format_event_id, parse_event_id
+
+
+def _messages(count: int, result: bool = True) -> list:
+    messages = [{"type": "AssistantMessage", "text": f"消息 {i}"} for i in range(count)]
+    if result:
+        messages[-1] = {"type": "ResultMessage", "result": "完成"}
+    return messages
+
+
+def _read_events(response) -> list:
+    """解析 SSE 响应，返回 [(事件 ID, 消息)]"""
+    events = []
+    for frame in response.text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines() if ": " in line and not line.startswith(":"))
+        if "data" in fields:
+            events.append((fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+def test_event_id_round_trip():
+    assert parse_event_id(format_event_id((3, 41))) == (3, 41)
+    for value in (None, "", "3", "a.b", "1.2.3"):
+        assert parse_event_id(value) is None
+
+
+@pytest.mark.anyio
+async def test_get_events_after_skips_delivered(make_stream_manager):
+    manager = make_stream_manager()
+    for i in range(3):
+        await manager.add_message("task", {"type": "text", "text": str(i)}, event_id=(2, i))
+    assert [event_id for event_id, _ in manager.get_events("task", after=(2, 0))] == [(2, 1), (2, 2)]
+    # 上一次执行的事件 ID 小于本次执行的所有事件
+    assert len(manager.get_events("task", after=(1, 99))) == 3
+
+
+def test_load_stream_events_reads_between_positions(db, make_task):
+    task = make_task()
+    create_execution_log(db, task.id, "completed", messages=_messages(3))
+    create_execution_log(db, task.id, "manual_check", messages=_messages(2, result=False))
+    create_execution_log(db, task.id, "running", status="running", messages=_messages(4, result=False))
+    db.commit()
+
+    events = load_stream_events(db, task.id, after=(1, 0))
+    # 非 Agent 执行的日志（第 2 次）不在消息流中
+    assert [event_id for event_id, _ in events] == [(1, 1), (1, 2), (3, 0), (3, 1), (3, 2), (3, 3)]
+    assert [event_id for event_id, _ in load_stream_events(db, task.id, after=(1, 2), before=(3, 2))] == [(3, 0), (3, 1)]
+
+
+def test_finished_task_replays_missed_events_from_log(client, db, make_task):
+    task = make_task(status="completed")
+    create_execution_log(db, task.id, "completed", messages=_messages(4))
+    db.commit()
+    url = f"/api/tasks/{task.id}/stream"
+
+    response = client.get(url, headers={"Last-Event-ID": "1.1"})
+    assert [event_id for event_id, _ in _read_events(response)] == ["1.2", "1.3"]
+    assert client.get(url, params={"after": "1.3"}).status_code == 204
+
+
+def test_running_task_replays_evicted_events_then_buffer(client, db, make_task, make_stream_manager):
+    manager = make_stream_manager(message_stream_buffer_size=2)
+    task = make_task(status="progress")
+    messages = _messages(5)
+    create_execution_log(db, task.id, "running", status="running", messages=messages)
+    db.commit()
+    for seq, message in enumerate(messages):
+        manager._add_local(task.id, message, (1, seq), None)
+
+    # 内存中只剩 1.3、1.4，1.1、1.2 从执行日志补发，之后在 ResultMessage 处结束
+    events = _read_events(client.get(f"/api/tasks/{task.id}/stream", headers={"Last-Event-ID": "1.0"}))
+    assert [event_id for event_id, _ in events] == ["1.1", "1.2", "1.3", "1.4"]
+    assert events[-1][1]["type"] == "ResultMessage"
+
+    # 首次连接从本次执行的第一条消息开始
+    events = _read_events(client.get(f"/api/tasks/{task.id}/stream"))
+    assert [event_id for event_id, _ in events] == ["1.0", "1.1", "1.2", "1.3", "1.4"]
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import update
+
+from app.database import AsyncSessionLocal
+from app.models import Task, Workspace
+from app.services.task_counters import recount_workspace_task_counters
+
+
+def _counts(db, workspace_id) -> tuple:
+    db.expire_all()
+    workspace = db.get(Workspace, workspace_id)
+    return (
+        workspace.pending_task_count,
+        workspace.progress_task_count,
+        workspace.completed_task_count,
+        workspace.failed_task_count
+    )
+
+
+def test_counters_follow_inserts_status_changes_and_deletes(db, workspace, make_task):
+    first = make_task()
+    second = make_task(status="progress")
+    assert _counts(db, workspace.id) == (1, 1, 0, 0)
+
+    first.status = "completed"
+    second.status = "failed"
+    db.commit()
+    assert _counts(db, workspace.id) == (0, 0, 1, 1)
+
+    db.delete(db.get(Task, first.id))
+    db.commit()
+    assert _counts(db, workspace.id) == (0, 0, 0, 1)
+
+
+def test_moving_a_task_updates_both_workspaces(db, workspace, make_task):
+    other = Workspace(id="other", name="其它", project_goal="测试")
+    db.add(other)
+    task = make_task()
+
+    task.workspace_id = other.id
+    db.commit()
+
+    assert _counts(db, workspace.id) == (0, 0, 0, 0)
+    assert _counts(db, other.id) == (1, 0, 0, 0)
+
+
+@pytest.mark.anyio
+async def test_async_sessions_maintain_counters(db, workspace, make_task):
+    task = make_task()
+    async with AsyncSessionLocal() as session:
+        (await session.get(Task, task.id)).status = "progress"
+        await session.commit()
+
+    assert _counts(db, workspace.id) == (0, 1, 0, 0)
+
+
+def test_api_reads_counters_and_recount_repairs_bulk_updates(client, db, workspace, make_task):
+    created = client.post(f"/api/workspaces/{workspace.id}/tasks", json={"title": "新任务"}).json()["data"]
+    client.put(f"/api/tasks/{created['id']}", json={"status": "completed"})
+    make_task()
+
+    detail = client.get(f"/api/workspaces/{workspace.id}").json()["data"]
+    assert (detail["active_tasks"], detail["completed_tasks"]) == (1, 1)
+    assert client.get(f"/api/workspaces/{workspace.id}/tasks?status=completed").json()["data"]["total"] == 1
+
+    # 绕过 ORM 的批量更新不会维护计数
+    db.execute(update(Task).values(status="failed").execution_options(synchronize_session=False))
+    db.commit()
+    assert _counts(db, workspace.id) == (1, 0, 1, 0)
+
+    assert client.post("/api/workspaces/task-counters/recount").json()["data"]["updated_workspaces"] == 1
+    assert _counts(db, workspace.id) == (0, 0, 0, 2)
+    assert recount_workspace_task_counters(db, workspace.id) == 1
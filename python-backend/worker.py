@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Axis 独立作业 worker 启动脚本
+从 execution_jobs 表中认领并执行任务，可与 API 服务分开部署、按需启动多个实例
+"""
+import asyncio
+import logging
+import signal
+
+from app.config import settings
+from app.database import init_db, async_engine
+from app.services.db_writer import db_writer
+from app.services.hook_delivery import hook_dispatcher
+from app.services.job_queue import job_worker
+from app.utils.message_stream import message_stream_manager
+import app.services.task_counters  # noqa: F401  注册工作区任务计数的维护事件
+
+
+async def main():
+    init_db()
+    if settings.sqlite_writer_enabled:
+        db_writer.start()
+    # 执行消息经消息代理转发给 API 进程的订阅者，并定期回收过期的消息流
+    await message_stream_manager.start()
+    hook_dispatcher.start()
+    job_worker.start()
+    print(f"Axis job worker {job_worker.worker_id} started")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await stop_event.wait()
+    print("Shutting down job worker...")
+    await job_worker.stop()
+    await hook_dispatcher.stop()
+    await message_stream_manager.stop()
+    db_writer.stop()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
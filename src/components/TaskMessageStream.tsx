@@ -44,12 +44,15 @@ const TaskMessageStream: React.FC<TaskMessageStreamProps> = ({ taskId, isRunning
       try {
         const response = await axios.get(`http://localhost:10101/api/tasks/${taskId}/execution-logs`);
         if (response.data.code === 200 && response.data.data && response.data.data.length > 0) {
-          // 获取最新的执行日志
+          // 列表只包含摘要，按执行次数获取最新一次的消息内容
           const latestLog = response.data.data[0];
+          const detailResponse = await axios.get(
+            `http://localhost:10101/api/tasks/${taskId}/execution-logs/${latestLog.execution_number}`
+          );
 
           // 解析消息内容
           try {
-            const parsedMessages = JSON.parse(latestLog.response_content);
+            const parsedMessages = JSON.parse(detailResponse.data.data.response_content);
             setMessages(parsedMessages);
           } catch (error) {
             console.error('解析历史消息失败:', error);
@@ -96,17 +99,28 @@ const TaskMessageStream: React.FC<TaskMessageStreamProps> = ({ taskId, isRunning
           return;
         }
 
+        // 消费过慢被服务端断开，浏览器会携带 Last-Event-ID 自动重连并补发缺失的消息
+        if (data.type === 'stream_overflow') {
+          return;
+        }
+
         // 添加消息到列表
         setMessages(prev => [...prev, data]);
+
+        // 任务执行结束，关闭连接（否则浏览器会自动重连）
+        if (data.type === 'ResultMessage') {
+          eventSource.close();
+          setIsConnected(false);
+        }
       } catch (error) {
         console.error('解析SSE消息失败:', error);
       }
     };
 
     eventSource.onerror = (error) => {
+      // 连接中断时浏览器会自动重连并携带 Last-Event-ID，服务端只补发断开期间缺失的消息
       console.error('SSE连接错误:', error);
       setIsConnected(false);
-      eventSource.close();
     };
 
     // 清理函数
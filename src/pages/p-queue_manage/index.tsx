@@ -297,9 +297,16 @@ const QueueManagePage: React.FC = () => {
   };
 
   // 打开执行日志模态框
-  const openExecutionLogModal = (log: any) => {
-    setSelectedLog(log);
-    setShowExecutionLogModal(true);
+  const openExecutionLogModal = async (log: any) => {
+    try {
+      // 列表只包含摘要，打开时再获取该次执行的消息内容
+      const response = await axios.get(`http://localhost:10101/api/tasks/${log.task_id}/execution-logs/${log.execution_number}`);
+      setSelectedLog(response.data.data);
+      setShowExecutionLogModal(true);
+    } catch (error) {
+      console.error('Failed to load execution log:', error);
+      alert('加载执行日志失败');
+    }
   };
 
   // 保存任务
@@ -798,14 +805,8 @@ const QueueManagePage: React.FC = () => {
                           <span className="text-xs text-textSecondary">{log.created_at}</span>
                         </div>
                         <div className="text-xs text-textSecondary line-clamp-2">
-                          {(() => {
-                            try {
-                              const messages = JSON.parse(log.response_content);
-                              return `${messages.length} 条消息`;
-                            } catch {
-                              return '点击查看详情';
-                            }
-                          })()}
+                          {log.message_count} 条消息
+                          {log.cost_usd ? ` · $${log.cost_usd.toFixed(4)}` : ''}
                         </div>
                       </div>
                     ))}
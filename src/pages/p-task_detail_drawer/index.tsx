@@ -105,9 +105,16 @@ const TaskDetailDrawer: React.FC = () => {
   };
 
   // 查看执行日志详情
-  const viewExecutionLog = (log: ExecutionLog) => {
-    setSelectedLog(log);
-    setShowExecutionLogModal(true);
+  const viewExecutionLog = async (log: ExecutionLog) => {
+    try {
+      // 列表只包含摘要，查看时再获取该次执行的消息内容
+      const response = await axios.get(`http://localhost:10101/api/tasks/${taskId}/execution-logs/${log.execution_number}`);
+      setSelectedLog(response.data.data);
+      setShowExecutionLogModal(true);
+    } catch (error) {
+      console.error('加载执行日志失败:', error);
+      showToast('加载执行日志失败', 'error');
+    }
   };
 
   // ESC键关闭抽屉
@@ -935,7 +942,7 @@ const TaskDetailDrawer: React.FC = () => {
                   <div className="bg-tertiary rounded-lg p-4 max-h-96 overflow-y-auto">
                     {(() => {
                       try {
-                        const messages = JSON.parse(selectedLog.response_content);
+                        const messages = JSON.parse(selectedLog.response_content || '[]');
                         return messages.map((msg: any, index: number) => {
                           let bgColor = 'bg-gray-50';
                           let icon = 'fa-info-circle';
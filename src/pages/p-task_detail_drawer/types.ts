@@ -37,9 +37,14 @@ export interface ExecutionLog {
   task_id: string;
   execution_number: number;
   response_type: string;
-  response_content: string;
+  response_content?: string;  // 列表接口只返回摘要，内容按执行次数单独获取
   status: string;
   created_at: string;
   updated_at: string;
+  thread_id?: string;
+  thread_number?: number;
+  message_count: number;
+  content_bytes: number;
+  cost_usd?: number | null;
 }
 
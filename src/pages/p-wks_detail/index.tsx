@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link, useNavigate, useSearchParams } from 'react-router-dom';
 import styles from './styles.module.css';
 import { getWorkspaceById, Workspace, updateWorkspace, WorkspaceUpdateInput } from '../../services/workspaceService';
@@ -26,12 +26,15 @@ interface ExecutionLog {
   task_id: string;
   execution_number: number;
   response_type: string;
-  response_content: string;
+  response_content?: string;  // 列表接口只返回摘要，内容按执行次数单独获取
   status: string;
   created_at: string;
   updated_at: string;
   thread_id?: string;
   thread_number?: number;
+  message_count: number;
+  content_bytes: number;
+  cost_usd?: number | null;
 }
 
 const WorkspaceDetailPage: React.FC = () => {
@@ -141,52 +144,54 @@ const WorkspaceDetailPage: React.FC = () => {
     }
   }, [currentWorkspaceId, currentPage, pageSize, sortField, sortOrder, searchTerm, statusFilter, priorityFilter, sourceFilter]);
 
-  // 订阅进行中任务的SSE流，实时更新进度
-  useEffect(() => {
-    const eventSources: EventSource[] = [];
-
-    // 找到所有进行中的任务
-    const progressTasks = tasks.filter(task => task.status === 'progress');
+  // 多路消息流中需要调用最新的 fetchTasks（依赖筛选和分页状态）
+  const fetchTasksRef = useRef<() => void>(() => {});
 
-    // 为每个进行中的任务订阅SSE流
-    progressTasks.forEach(task => {
-      const eventSource = new EventSource(`${API_BASE_URL}/tasks/${task.id}/stream`);
+  // 通过一个多路SSE连接订阅整个工作区的执行消息，实时更新进行中任务的进度
+  useEffect(() => {
+    if (!currentWorkspaceId) {
+      return;
+    }
 
-      eventSource.onmessage = (event) => {
-        try {
-          const message = JSON.parse(event.data);
+    const eventSource = new EventSource(
+      `${API_BASE_URL}/streams?workspace_ids=${encodeURIComponent(currentWorkspaceId)}`
+    );
 
-          // 如果消息包含进度信息，更新进度状态
-          if (message.progress !== undefined) {
-            setTaskProgress(prev => ({
-              ...prev,
-              [task.id]: message.progress
-            }));
-          }
+    eventSource.onmessage = (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        // 连接建立、消费过慢断开（浏览器会自动重连）等控制消息
+        if (!data.task_id) {
+          return;
+        }
 
-          // 如果任务结束（ResultMessage），刷新任务列表并关闭连接
-          if (message.type === 'ResultMessage') {
-            eventSource.close();
-            fetchTasks();
-          }
-        } catch (error) {
-          console.error('Error parsing SSE message:', error);
+        const message = data.message;
+        // 如果消息包含进度信息，更新进度状态
+        if (message.progress !== undefined) {
+          setTaskProgress(prev => ({
+            ...prev,
+            [data.task_id]: message.progress
+          }));
         }
-      };
 
-      eventSource.onerror = (error) => {
-        console.error('SSE connection error:', error);
-        eventSource.close();
-      };
+        // 任务结束（ResultMessage）时刷新任务列表
+        if (message.type === 'ResultMessage') {
+          fetchTasksRef.current();
+        }
+      } catch (error) {
+        console.error('Error parsing SSE message:', error);
+      }
+    };
 
-      eventSources.push(eventSource);
-    });
+    eventSource.onerror = (error) => {
+      // 连接中断时浏览器会自动重连
+      console.error('SSE connection error:', error);
+    };
 
-    // 清理函数：关闭所有EventSource连接
     return () => {
-      eventSources.forEach(es => es.close());
+      eventSource.close();
     };
-  }, [tasks]);
+  }, [currentWorkspaceId]);
 
   const fetchWorkspace = async () => {
     try {
@@ -223,6 +228,7 @@ const WorkspaceDetailPage: React.FC = () => {
       setLoading(false);
     }
   };
+  fetchTasksRef.current = fetchTasks;
 
   // 获取优先级文本
   const getPriorityText = (priority: string): string => {
@@ -426,12 +432,20 @@ const WorkspaceDetailPage: React.FC = () => {
   };
 
   // 从执行历史apply对话
-  const applyExecutionLog = (log: ExecutionLog) => {
+  const applyExecutionLog = async (summary: ExecutionLog) => {
+    let log: ExecutionLog;
+    try {
+      log = await fetchExecutionLogDetail(summary);
+    } catch (error) {
+      console.error('Failed to load execution log:', error);
+      showErrorMessage('加载执行日志失败');
+      return;
+    }
     try {
       // 解析response_content
-      const messages = JSON.parse(log.response_content);
+      const messages = JSON.parse(log.response_content || '[]');
       if (!Array.isArray(messages)) {
-        setChatMessages([{ role: 'assistant', content: log.response_content }]);
+        setChatMessages([{ role: 'assistant', content: log.response_content || '' }]);
         return;
       }
 
@@ -466,11 +480,11 @@ const WorkspaceDetailPage: React.FC = () => {
         }
       } else {
         // 如果没有提取到消息，使用原始内容
-        setChatMessages([{ role: 'assistant', content: log.response_content }]);
+        setChatMessages([{ role: 'assistant', content: log.response_content || '' }]);
       }
     } catch (e) {
       // 解析失败，直接作为文本添加
-      setChatMessages([{ role: 'assistant', content: log.response_content }]);
+      setChatMessages([{ role: 'assistant', content: log.response_content || '' }]);
     }
   };
 
@@ -509,10 +523,21 @@ const WorkspaceDetailPage: React.FC = () => {
     setShowExecutionLogModal(false);
   };
 
+  // 获取单次执行的消息内容（列表只包含摘要）
+  const fetchExecutionLogDetail = async (log: ExecutionLog): Promise<ExecutionLog> => {
+    const response = await axios.get(`${API_BASE_URL}/tasks/${log.task_id}/execution-logs/${log.execution_number}`);
+    return response.data.data;
+  };
+
   // 打开执行日志详情模态框
-  const openExecutionLogModal = (log: ExecutionLog) => {
-    setSelectedLog(log);
-    setShowExecutionLogModal(true);
+  const openExecutionLogModal = async (log: ExecutionLog) => {
+    try {
+      setSelectedLog(await fetchExecutionLogDetail(log));
+      setShowExecutionLogModal(true);
+    } catch (error) {
+      console.error('Failed to load execution log:', error);
+      showErrorMessage('加载执行日志失败');
+    }
   };
 
   // 关闭执行日志详情模态框
@@ -1456,14 +1481,8 @@ const WorkspaceDetailPage: React.FC = () => {
                           <span className="text-xs text-textSecondary">{log.created_at}</span>
                         </div>
                         <div className="text-xs text-textSecondary line-clamp-2">
-                          {(() => {
-                            try {
-                              const messages = JSON.parse(log.response_content);
-                              return `${messages.length} 条消息`;
-                            } catch {
-                              return '点击查看详情';
-                            }
-                          })()}
+                          {log.message_count} 条消息
+                          {log.cost_usd ? ` · $${log.cost_usd.toFixed(4)}` : ''}
                         </div>
                       </div>
                     ))}
@@ -1868,7 +1887,7 @@ const WorkspaceDetailPage: React.FC = () => {
               <div className="space-y-3">
                 {(() => {
                   try {
-                    const messages = JSON.parse(selectedLog.response_content);
+                    const messages = JSON.parse(selectedLog.response_content || '[]');
                     if (!Array.isArray(messages)) {
                       return (
                         <div className="p-3 bg-tertiary rounded-lg">